@@ -1,14 +1,40 @@
+import re
 import sys
+import html
+import time
+import argparse
+import os
+import json
+import gzip
+import queue
+import asyncio
+import math
+import shutil
 import sqlite3
-from datetime import date, datetime
-
-from PySide6.QtCore import Qt, QEasingCurve, QPropertyAnimation, QSize, QParallelAnimationGroup
-from PySide6.QtGui import QAction
+import tempfile
+import calendar
+import csv
+import hashlib
+import pathlib
+import threading
+import unicodedata
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+from datetime import date, datetime, timedelta
+
+from PySide6.QtCore import (
+    Qt, QEasingCurve, QPropertyAnimation, QSize, QParallelAnimationGroup, QRunnable, QThreadPool,
+    QObject, QTimer, Signal, QEvent, QUrl
+)
+from PySide6.QtGui import QAction, QColor, QPainter, QPen, QIcon, QImage, QImageReader, QPixmap, QDesktopServices
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QFrame, QLabel, QPushButton,
     QHBoxLayout, QVBoxLayout, QGridLayout, QTableWidget, QTableWidgetItem,
     QHeaderView, QDialog, QLineEdit, QComboBox, QMessageBox, QSpacerItem,
-    QSizePolicy, QStackedWidget, QAbstractItemView
+    QSizePolicy, QStackedWidget, QAbstractItemView, QFileDialog, QToolTip, QCheckBox, QListWidget,
+    QListWidgetItem, QStyle
 )
 
 # QtCharts pode não vir em algumas instalações. Tentamos importar.
@@ -18,6 +44,28 @@ try:
 except Exception:
     HAS_CHARTS = False
 
+# NumPy é opcional: sem ele o dashboard só não mostra as projeções.
+HAS_NUMPY = True
+try:
+    import numpy as np
+except Exception:
+    HAS_NUMPY = False
+
+# QtPdf (PySide6-Addons): sem ele comprovantes em PDF ficam sem miniatura.
+HAS_PDF = True
+try:
+    from PySide6.QtPdf import QPdfDocument
+except Exception:
+    HAS_PDF = False
+
+# openpyxl também: sem ele os relatórios saem só em HTML.
+HAS_XLSX = True
+try:
+    from openpyxl import Workbook
+    from openpyxl.chart import BarChart, Reference
+except Exception:
+    HAS_XLSX = False
+
 # ======================
 # TEMA
 # ======================
@@ -36,6 +84,15 @@ GREEN = "#35D07F"
 RED = "#FF4D4D"
 
 CATEGORIAS = ["Alimentação", "Transporte", "Contas", "Lazer", "Saúde", "Outros"]
+CATEGORIAS_RECEITA = ["Freelance", "Reembolso", "Venda", "Outros"]
+
+# regras de recorrência dos fixos
+FREQUENCIAS = {
+    "mensal": "Mensal",
+    "quinzenal": "Quinzenal",
+    "semanal": "Semanal",
+    "anual": "Anual",
+}
 
 
 # ======================
@@ -82,167 +139,4143 @@ PALETAS = {
 
 
 # ======================
-# BANCO
+# BANCO
+# ======================
+_CENTAVOS = "CAST(ROUND(valor * 100) AS INTEGER)"   # valor em centavos (mesma expressão do índice)
+
+DB_PATH = "gastos.db"      # ativar_perfil() aponta para o banco do perfil
+DB_LEGADO = "gastos.db"    # versões antigas gravavam na pasta em que o app era aberto
+_banco_local = threading.local()
+
+def caminho_banco() -> str:
+    """Banco desta thread: uma tarefa em segundo plano fica no perfil em que foi criada."""
+    return getattr(_banco_local, "caminho", None) or DB_PATH
+
+class Conexao(sqlite3.Connection):
+    """Conexão do app: `ao_confirmar` guarda o que só pode acontecer depois do commit."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ao_confirmar = []
+
+    def commit(self):
+        super().commit()
+        acoes, self.ao_confirmar = self.ao_confirmar, []
+        for acao in acoes:
+            acao()
+
+    def rollback(self):
+        super().rollback()
+        self.ao_confirmar = []
+
+def conectar():
+    return sqlite3.connect(caminho_banco(), factory=Conexao)
+
+def migrar_banco():
+    conn = conectar()
+    cur = conn.cursor()
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS gastos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        categoria TEXT,
+        valor REAL,
+        descricao TEXT,
+        data TEXT
+    )
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS config (
+        id INTEGER PRIMARY KEY,
+        salario REAL DEFAULT 0,
+        ultimo_mes TEXT DEFAULT ''
+    )
+    """)
+    # 1 só dentro da transação que move um ano para o arquivo (desliga os triggers de DELETE)
+    _garantir_coluna(cur, "config", "arquivando", "INTEGER DEFAULT 0")
+    # 0: meses passados sem fechamento são fechados ao abrir o app sem perguntar
+    _garantir_coluna(cur, "config", "confirmar_fechamento", "INTEGER DEFAULT 1")
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS fixos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        categoria TEXT,
+        valor REAL,
+        descricao TEXT,
+        ativo INTEGER DEFAULT 1
+    )
+    """)
+
+    # registra quais fixos já foram aplicados em cada mês (permite reexecutar sem duplicar)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS fixos_aplicados (
+        mes TEXT NOT NULL,
+        fixo_id INTEGER NOT NULL,
+        PRIMARY KEY (mes, fixo_id)
+    )
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS resumo (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        mes TEXT,
+        total REAL,
+        saldo REAL
+    )
+    """)
+
+    # garante unicidade do mês mesmo em bancos antigos
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_resumo_mes ON resumo(mes)")
+    # fechamentos apagados à mão no histórico: o fechamento automático não os refaz
+    cur.execute("CREATE TABLE IF NOT EXISTS fechamentos_apagados (mes TEXT PRIMARY KEY)")
+
+    cur.execute("INSERT OR IGNORE INTO config (id, salario, ultimo_mes) VALUES (1, 0, '')")
+
+    # coluna tema (paleta)
+    cur.execute("PRAGMA table_info(config)")
+    cols = [c[1] for c in cur.fetchall()]
+    if "tema" not in cols:
+        cur.execute("ALTER TABLE config ADD COLUMN tema TEXT DEFAULT 'original'")
+        cur.execute("UPDATE config SET tema='original' WHERE tema IS NULL OR tema=''")
+
+    # receitas extras (freelance, reembolso, venda...) — o salário continua em config
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS receitas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        categoria TEXT,
+        valor REAL,
+        descricao TEXT,
+        data TEXT
+    )
+    """)
+
+    _garantir_coluna(cur, "resumo", "receitas", "REAL DEFAULT 0")
+
+    # recorrência dos fixos (antes: sempre "todo mês no dia 01")
+    cur.execute("PRAGMA table_info(fixos)")
+    fixos_antigos = "inicio" not in [c[1] for c in cur.fetchall()]
+    _garantir_coluna(cur, "fixos", "frequencia", "TEXT DEFAULT 'mensal'")
+    _garantir_coluna(cur, "fixos", "inicio", "TEXT")
+    _garantir_coluna(cur, "fixos", "fim", "TEXT")
+    _garantir_coluna(cur, "fixos", "parcelas", "INTEGER")
+    _garantir_coluna(cur, "fixos", "gerado_ate", "TEXT")
+
+    # cada ocorrência de cada fixo; aplicado=0 são as pendentes
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS fixos_ocorrencias (
+        fixo_id INTEGER NOT NULL,
+        data TEXT NOT NULL,
+        parcela INTEGER,
+        aplicado INTEGER DEFAULT 0,
+        PRIMARY KEY (fixo_id, data)
+    )
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_ocorrencias_pendentes
+        ON fixos_ocorrencias(data) WHERE aplicado=0
+    """)
+
+    # impressão digital (data + valor + descrição normalizada) para achar duplicados
+    _garantir_coluna(cur, "gastos", "impressao", "INTEGER")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_gastos_impressao ON gastos(impressao)")
+    # cobre (data, valor): o total por dia do calendário sai só do índice
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_gastos_data_valor ON gastos(data, valor)")
+    # ordem da varredura de duplicados: lida em lotes curtos, sem ordenar a tabela a cada um
+    cur.execute(f"CREATE INDEX IF NOT EXISTS idx_gastos_centavos ON gastos({_CENTAVOS}, data)")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS gastos_duplicados (
+        gasto_id INTEGER PRIMARY KEY,
+        original_id INTEGER NOT NULL,
+        motivo TEXT,
+        ignorado INTEGER DEFAULT 0
+    )
+    """)
+
+    # FITID do banco (OFX): identifica a transação e impede importar duas vezes
+    _garantir_coluna(cur, "gastos", "fitid", "TEXT")
+    _garantir_coluna(cur, "receitas", "fitid", "TEXT")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_gastos_fitid ON gastos(fitid) WHERE fitid IS NOT NULL")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_receitas_fitid ON receitas(fitid) WHERE fitid IS NOT NULL")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_receitas_data ON receitas(data)")
+
+    # classificador de categorias (naive Bayes por palavra da descrição)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS classificador_tokens (
+        token TEXT NOT NULL,
+        categoria TEXT NOT NULL,
+        n INTEGER NOT NULL,
+        PRIMARY KEY (token, categoria)
+    ) WITHOUT ROWID
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS classificador_categorias (
+        categoria TEXT PRIMARY KEY,
+        docs INTEGER NOT NULL DEFAULT 0,
+        tokens INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+
+    if fixos_antigos:
+        # fixos antigos continuam do último mês aplicado (que já conta como lançado)
+        cur.execute("""
+            UPDATE fixos SET
+                frequencia = 'mensal',
+                inicio = COALESCE(
+                    (SELECT MAX(mes) FROM fixos_aplicados WHERE fixo_id = fixos.id),
+                    ?
+                ) || '-01'
+        """, (date.today().strftime("%Y-%m"),))
+        cur.execute("""
+            INSERT OR IGNORE INTO fixos_ocorrencias (fixo_id, data, aplicado)
+            SELECT fixo_id, mes || '-01', 1 FROM fixos_aplicados
+        """)
+
+    # saldo por mês + acumulado (patrimônio), mantido pelos triggers abaixo
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='saldo_mensal'")
+    saldo_novo = cur.fetchone() is None
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS saldo_mensal (
+        mes TEXT PRIMARY KEY,
+        salario REAL DEFAULT 0,
+        receitas REAL DEFAULT 0,
+        gastos REAL DEFAULT 0,
+        acumulado REAL DEFAULT 0,
+        versao INTEGER DEFAULT 0
+    )
+    """)
+    # versao: muda a cada escrita no mês (usada pelo cache do dashboard)
+    _garantir_coluna(cur, "saldo_mensal", "versao", "INTEGER DEFAULT 0")
+
+    for nome, sql in TRIGGERS_SALDO.items():
+        _garantir_trigger(cur, nome, sql)
+
+    if saldo_novo:
+        # bancos antigos: monta o saldo a partir do que já existe.
+        # Meses fechados guardam o salário da época (saldo + total).
+        cur.execute("""
+            INSERT INTO saldo_mensal (mes, salario, receitas, gastos)
+            SELECT m.mes,
+                   COALESCE(r.saldo + r.total, (SELECT salario FROM config WHERE id=1), 0),
+                   COALESCE((SELECT SUM(valor) FROM receitas WHERE substr(data, 1, 7) = m.mes), 0),
+                   COALESCE((SELECT SUM(valor) FROM gastos WHERE substr(data, 1, 7) = m.mes), 0)
+            FROM (
+                SELECT substr(data, 1, 7) AS mes FROM gastos
+                UNION SELECT substr(data, 1, 7) FROM receitas
+                UNION SELECT mes FROM resumo
+            ) m
+            LEFT JOIN resumo r ON r.mes = m.mes
+            WHERE m.mes IS NOT NULL
+        """)
+
+    # total por categoria e mês (comparativos sem varrer os gastos)
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='categoria_mensal'")
+    categoria_nova = cur.fetchone() is None
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS categoria_mensal (
+        mes TEXT NOT NULL,
+        categoria TEXT NOT NULL,
+        total REAL NOT NULL DEFAULT 0,
+        n INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (mes, categoria)
+    ) WITHOUT ROWID
+    """)
+    for nome, sql in TRIGGERS_CATEGORIA.items():
+        _garantir_trigger(cur, nome, sql)
+    if categoria_nova:
+        cur.execute("""
+            INSERT INTO categoria_mensal (mes, categoria, total, n)
+            SELECT substr(data, 1, 7), COALESCE(categoria, ''), SUM(COALESCE(valor, 0)), COUNT(*)
+            FROM gastos WHERE data IS NOT NULL
+            GROUP BY 1, 2
+        """)
+
+    # divisão de um gasto em outras categorias (o resto fica na categoria do gasto) e tags;
+    # data/valor são cópias do gasto (triggers), para os totais saírem só dos índices
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS gastos_divisoes (
+        id INTEGER PRIMARY KEY,
+        gasto_id INTEGER NOT NULL,
+        categoria TEXT NOT NULL,
+        valor REAL NOT NULL,
+        data TEXT
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_divisoes_gasto ON gastos_divisoes(gasto_id, categoria, valor)")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS tags (
+        id INTEGER PRIMARY KEY,
+        nome TEXT NOT NULL UNIQUE COLLATE NOCASE
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS gastos_tags (
+        gasto_id INTEGER NOT NULL,
+        tag_id INTEGER NOT NULL,
+        data TEXT,
+        valor REAL,
+        PRIMARY KEY (gasto_id, tag_id)
+    ) WITHOUT ROWID
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_gastos_tags_tag ON gastos_tags(tag_id, data, valor)")
+    for nome, sql in TRIGGERS_DIVISOES.items():
+        _garantir_trigger(cur, nome, sql)
+
+    # comprovantes: só o hash fica no banco; o arquivo vai para <banco>.anexos/ (um por conteúdo)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS anexos (
+        id INTEGER PRIMARY KEY,
+        gasto_id INTEGER NOT NULL,
+        hash TEXT NOT NULL,
+        nome TEXT,
+        bytes INTEGER,
+        criado_em TEXT,
+        UNIQUE (gasto_id, hash)
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_anexos_hash ON anexos(hash)")
+    for nome, sql in TRIGGERS_ANEXOS.items():
+        _garantir_trigger(cur, nome, sql)
+
+    # moeda do gasto: `valor` continua em reais (triggers e agregados não mudam);
+    # valor_original e taxa guardam o que foi cobrado na moeda e a cotação usada
+    _garantir_coluna(cur, "gastos", "moeda", "TEXT DEFAULT 'BRL'")
+    _garantir_coluna(cur, "gastos", "valor_original", "REAL")
+    _garantir_coluna(cur, "gastos", "taxa", "REAL")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_gastos_moeda ON gastos(moeda, data) WHERE moeda <> 'BRL'")
+    # cotações locais (reais por unidade da moeda, importadas de CSV): vale a do dia ou a anterior
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS cambio (
+        moeda TEXT NOT NULL,
+        data TEXT NOT NULL,
+        taxa REAL NOT NULL,
+        PRIMARY KEY (moeda, data)
+    ) WITHOUT ROWID
+    """)
+    # cotações que cada fechamento usou (cópia de cambio): o mês fechado não muda mais
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS fechamento_cambio (
+        mes TEXT NOT NULL,
+        moeda TEXT NOT NULL,
+        data TEXT NOT NULL,
+        taxa REAL NOT NULL,
+        PRIMARY KEY (mes, moeda, data)
+    ) WITHOUT ROWID
+    """)
+    for nome, sql in TRIGGERS_CAMBIO.items():
+        _garantir_trigger(cur, nome, sql)
+
+    # estatísticas móveis (Welford) por categoria e dos totais diários, mantidas por trigger
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='estatisticas_categoria'")
+    estatisticas_novas = cur.fetchone() is None
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS estatisticas_categoria (
+        categoria TEXT PRIMARY KEY,
+        n INTEGER NOT NULL DEFAULT 0,
+        media REAL NOT NULL DEFAULT 0,
+        m2 REAL NOT NULL DEFAULT 0
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS gastos_anomalias (
+        gasto_id INTEGER PRIMARY KEY,
+        motivo TEXT,
+        ignorado INTEGER DEFAULT 0
+    )
+    """)
+    for nome, sql in TRIGGERS_ESTATISTICA.items():
+        _garantir_trigger(cur, nome, sql)
+    if estatisticas_novas:
+        cur.execute("""
+            WITH x(k, v) AS (
+                SELECT COALESCE(categoria, ''), COALESCE(valor, 0) FROM gastos
+                UNION ALL
+                SELECT ?, SUM(COALESCE(valor, 0)) FROM gastos WHERE data IS NOT NULL GROUP BY data
+            ),
+            m AS (SELECT k, COUNT(*) AS n, AVG(v) AS media FROM x GROUP BY k)
+            INSERT INTO estatisticas_categoria (categoria, n, media, m2)
+            SELECT m.k, m.n, m.media, SUM((x.v - m.media) * (x.v - m.media))
+            FROM x JOIN m ON m.k = x.k
+            GROUP BY m.k
+        """, (CHAVE_DIA,))
+    cur.execute("INSERT OR IGNORE INTO estatisticas_categoria (categoria) VALUES (?)", (CHAVE_DIA,))
+
+    # orçamento mensal por categoria (vale para todos os meses)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS orcamentos (
+        categoria TEXT PRIMARY KEY,
+        limite REAL NOT NULL
+    )
+    """)
+
+    # histórico da manutenção (ANALYZE, optimize, vacuum...)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS manutencao_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        operacao TEXT NOT NULL,
+        inicio TEXT NOT NULL,
+        duracao_ms REAL,
+        detalhe TEXT
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_manutencao_operacao ON manutencao_log(operacao, inicio)")
+
+    # edições/exclusões em gastos desde a última sincronização do cache colunar
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS gastos_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        gasto_id INTEGER NOT NULL
+    )
+    """)
+    for nome, sql in TRIGGERS_LOG.items():
+        _garantir_trigger(cur, nome, sql)
+
+    # anos movidos para o arquivo (<banco>.arquivo/gastos_<ano>.db.gz)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS arquivos (
+        ano INTEGER PRIMARY KEY,
+        linhas INTEGER NOT NULL,
+        total REAL NOT NULL,
+        criado_em TEXT
+    )
+    """)
+
+    conn.commit()
+    conn.close()
+
+def _garantir_coluna(cur, tabela: str, coluna: str, ddl: str):
+    cur.execute(f"PRAGMA table_info({tabela})")
+    if coluna not in [c[1] for c in cur.fetchall()]:
+        cur.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {ddl}")
+
+def _garantir_trigger(cur, nome: str, sql: str):
+    """
+    Cria o trigger ou recria se a definição mudou no código.
+    (CREATE TRIGGER IF NOT EXISTS não atualiza triggers de bancos antigos.)
+    """
+    cur.execute("SELECT sql FROM sqlite_master WHERE type='trigger' AND name=?", (nome,))
+    row = cur.fetchone()
+    if row and " ".join(row[0].split()) == " ".join(sql.split()):
+        return
+    cur.execute(f"DROP TRIGGER IF EXISTS {nome}")
+    cur.execute(sql)
+
+# Mantém saldo_mensal em dia a cada escrita, inclusive de scripts externos.
+# O acumulado de um mês = soma de (salário + receitas - gastos) até ele,
+# então mexer num mês antigo só desloca os meses seguintes.
+_SE_NAO_ARQUIVANDO = "WHEN NOT COALESCE((SELECT arquivando FROM config WHERE id=1), 0)"
+
+TRIGGERS_SALDO = {
+    "trg_saldo_mensal_ins": """
+        CREATE TRIGGER trg_saldo_mensal_ins AFTER INSERT ON saldo_mensal
+        BEGIN
+            UPDATE saldo_mensal
+            SET acumulado = NEW.salario + NEW.receitas - NEW.gastos + COALESCE(
+                (SELECT acumulado FROM saldo_mensal WHERE mes < NEW.mes ORDER BY mes DESC LIMIT 1), 0)
+            WHERE mes = NEW.mes;
+            UPDATE saldo_mensal
+            SET acumulado = acumulado + NEW.salario + NEW.receitas - NEW.gastos
+            WHERE mes > NEW.mes;
+        END
+    """,
+    "trg_saldo_mensal_upd": """
+        CREATE TRIGGER trg_saldo_mensal_upd AFTER UPDATE OF salario, receitas, gastos ON saldo_mensal
+        BEGIN
+            UPDATE saldo_mensal
+            SET acumulado = acumulado
+                + (NEW.salario + NEW.receitas - NEW.gastos)
+                - (OLD.salario + OLD.receitas - OLD.gastos)
+            WHERE mes >= NEW.mes;
+        END
+    """,
+}
+for _tabela in ("gastos", "receitas"):
+    TRIGGERS_SALDO[f"trg_{_tabela}_saldo_ins"] = f"""
+        CREATE TRIGGER trg_{_tabela}_saldo_ins AFTER INSERT ON {_tabela}
+        BEGIN
+            INSERT OR IGNORE INTO saldo_mensal (mes, salario)
+            VALUES (substr(NEW.data, 1, 7), COALESCE((SELECT salario FROM config WHERE id=1), 0));
+            UPDATE saldo_mensal SET {_tabela} = {_tabela} + COALESCE(NEW.valor, 0), versao = versao + 1
+            WHERE mes = substr(NEW.data, 1, 7);
+        END
+    """
+    TRIGGERS_SALDO[f"trg_{_tabela}_saldo_del"] = f"""
+        CREATE TRIGGER trg_{_tabela}_saldo_del AFTER DELETE ON {_tabela} {_SE_NAO_ARQUIVANDO}
+        BEGIN
+            UPDATE saldo_mensal SET {_tabela} = {_tabela} - COALESCE(OLD.valor, 0), versao = versao + 1
+            WHERE mes = substr(OLD.data, 1, 7);
+        END
+    """
+    TRIGGERS_SALDO[f"trg_{_tabela}_saldo_upd"] = f"""
+        CREATE TRIGGER trg_{_tabela}_saldo_upd AFTER UPDATE OF valor, data ON {_tabela}
+        BEGIN
+            UPDATE saldo_mensal SET {_tabela} = {_tabela} - COALESCE(OLD.valor, 0), versao = versao + 1
+            WHERE mes = substr(OLD.data, 1, 7);
+            INSERT OR IGNORE INTO saldo_mensal (mes, salario)
+            VALUES (substr(NEW.data, 1, 7), COALESCE((SELECT salario FROM config WHERE id=1), 0));
+            UPDATE saldo_mensal SET {_tabela} = {_tabela} + COALESCE(NEW.valor, 0), versao = versao + 1
+            WHERE mes = substr(NEW.data, 1, 7);
+        END
+    """
+    # categoria/descrição não mexem no saldo, mas mudam o que a tela mostra
+    TRIGGERS_SALDO[f"trg_{_tabela}_versao_upd"] = f"""
+        CREATE TRIGGER trg_{_tabela}_versao_upd AFTER UPDATE OF categoria, descricao ON {_tabela}
+        BEGIN
+            UPDATE saldo_mensal SET versao = versao + 1 WHERE mes = substr(NEW.data, 1, 7);
+        END
+    """
+
+# categoria_mensal: soma e contagem por (mês, categoria), mantidas a cada escrita em gastos
+_CATEGORIA_SOMA = """
+            INSERT INTO categoria_mensal (mes, categoria, total, n)
+            VALUES (substr(NEW.data, 1, 7), COALESCE(NEW.categoria, ''), COALESCE(NEW.valor, 0), 1)
+            ON CONFLICT(mes, categoria) DO UPDATE SET total = total + excluded.total, n = n + 1;"""
+_CATEGORIA_SUBTRAI = """
+            UPDATE categoria_mensal SET total = total - COALESCE(OLD.valor, 0), n = n - 1
+            WHERE mes = substr(OLD.data, 1, 7) AND categoria = COALESCE(OLD.categoria, '');"""
+# estatisticas_categoria: Welford incremental (n, média, M2). Inclui/remove um valor por
+# UPDATE; do lado direito do SET tudo é o valor antigo da linha.
+CHAVE_DIA = "#dia"  # linha com as estatísticas dos totais diários
+
+def _welford_inclui(chave: str, x: str, cond: str = "1") -> str:
+    return f"""
+            UPDATE estatisticas_categoria SET
+                n = n + 1,
+                media = media + (({x}) - media) / (n + 1),
+                m2 = m2 + (({x}) - media) * (({x}) - media) * n / (n + 1.0)
+            WHERE categoria = {chave} AND {cond};"""
+
+def _welford_remove(chave: str, x: str, cond: str = "1") -> str:
+    return f"""
+            UPDATE estatisticas_categoria SET
+                n = n - 1,
+                media = CASE WHEN n > 1 THEN (media * n - ({x})) / (n - 1) ELSE 0 END,
+                m2 = CASE WHEN n > 1 THEN MAX(0, m2 - (({x}) - media) * (({x}) - media) * n / (n - 1.0)) ELSE 0 END
+            WHERE categoria = {chave} AND n > 0 AND {cond};"""
+
+_DIA = f"'{CHAVE_DIA}'"
+_DIA_NEW = "(SELECT SUM(COALESCE(valor, 0)) FROM gastos WHERE data = NEW.data)"
+_DIA_NEW_N = "(SELECT COUNT(*) FROM gastos WHERE data = NEW.data)"
+_DIA_OLD = "COALESCE((SELECT SUM(COALESCE(valor, 0)) FROM gastos WHERE data = OLD.data), 0)"
+_DIA_OLD_N = "(SELECT COUNT(*) FROM gastos WHERE data = OLD.data)"
+_CAT_NEW = "COALESCE(NEW.categoria, '')"
+_CAT_OLD = "COALESCE(OLD.categoria, '')"
+
+# o total do dia trocou de T_antes para T_depois: sai um valor da amostra, entra outro
+_DIA_ENTRA = (
+    _welford_remove(_DIA, f"{_DIA_NEW} - COALESCE(NEW.valor, 0)", f"NEW.data IS NOT NULL AND {_DIA_NEW_N} > 1")
+    + _welford_inclui(_DIA, _DIA_NEW, "NEW.data IS NOT NULL")
+)
+_DIA_SAI = (
+    _welford_remove(_DIA, f"{_DIA_OLD} + COALESCE(OLD.valor, 0)", "OLD.data IS NOT NULL")
+    + _welford_inclui(_DIA, _DIA_OLD, f"OLD.data IS NOT NULL AND {_DIA_OLD_N} > 0")
+)
+TRIGGERS_ESTATISTICA = {
+    "trg_gastos_estatistica_ins": f"""
+        CREATE TRIGGER trg_gastos_estatistica_ins AFTER INSERT ON gastos
+        BEGIN
+            INSERT OR IGNORE INTO estatisticas_categoria (categoria) VALUES ({_CAT_NEW});{_welford_inclui(_CAT_NEW, "COALESCE(NEW.valor, 0)")}{_DIA_ENTRA}
+        END
+    """,
+    "trg_gastos_estatistica_del": f"""
+        CREATE TRIGGER trg_gastos_estatistica_del AFTER DELETE ON gastos {_SE_NAO_ARQUIVANDO}
+        BEGIN{_welford_remove(_CAT_OLD, "COALESCE(OLD.valor, 0)")}{_DIA_SAI}
+        END
+    """,
+    "trg_gastos_estatistica_upd": f"""
+        CREATE TRIGGER trg_gastos_estatistica_upd AFTER UPDATE OF valor, data, categoria ON gastos
+        BEGIN{_welford_remove(_CAT_OLD, "COALESCE(OLD.valor, 0)")}
+            INSERT OR IGNORE INTO estatisticas_categoria (categoria) VALUES ({_CAT_NEW});{_welford_inclui(_CAT_NEW, "COALESCE(NEW.valor, 0)")}{_welford_remove(_DIA, f"{_DIA_NEW} - COALESCE(NEW.valor, 0) + COALESCE(OLD.valor, 0)", "NEW.data IS NOT NULL AND OLD.data = NEW.data")}{_welford_inclui(_DIA, _DIA_NEW, "NEW.data IS NOT NULL AND OLD.data = NEW.data")}{_DIA_SAI.replace("OLD.data IS NOT NULL", "OLD.data IS NOT NULL AND OLD.data IS NOT NEW.data")}{_DIA_ENTRA.replace("NEW.data IS NOT NULL", "NEW.data IS NOT NULL AND OLD.data IS NOT NEW.data")}
+        END
+    """,
+}
+
+TRIGGERS_CATEGORIA = {
+    "trg_gastos_categoria_ins": f"""
+        CREATE TRIGGER trg_gastos_categoria_ins AFTER INSERT ON gastos
+        BEGIN{_CATEGORIA_SOMA}
+        END
+    """,
+    "trg_gastos_categoria_del": f"""
+        CREATE TRIGGER trg_gastos_categoria_del AFTER DELETE ON gastos {_SE_NAO_ARQUIVANDO}
+        BEGIN{_CATEGORIA_SUBTRAI}
+        END
+    """,
+    "trg_gastos_categoria_upd": f"""
+        CREATE TRIGGER trg_gastos_categoria_upd AFTER UPDATE OF valor, data, categoria ON gastos
+        BEGIN{_CATEGORIA_SUBTRAI}{_CATEGORIA_SOMA}
+        END
+    """,
+}
+
+# Registra no gastos_log o que a marca d'água (id > hwm) do cache colunar não enxerga:
+# edições, exclusões e inserts com id abaixo do maior (id explícito). Os DELETEs do
+# arquivamento ficam de fora: a linha continua valendo para as análises.
+TRIGGERS_LOG = {
+    "trg_gastos_log_ins": """
+        CREATE TRIGGER trg_gastos_log_ins AFTER INSERT ON gastos
+        WHEN NEW.id < (SELECT MAX(id) FROM gastos)
+        BEGIN
+            INSERT INTO gastos_log (gasto_id) VALUES (NEW.id);
+        END
+    """,
+    "trg_gastos_log_del": f"""
+        CREATE TRIGGER trg_gastos_log_del AFTER DELETE ON gastos {_SE_NAO_ARQUIVANDO}
+        BEGIN
+            INSERT INTO gastos_log (gasto_id) VALUES (OLD.id);
+        END
+    """,
+    "trg_gastos_log_upd": """
+        CREATE TRIGGER trg_gastos_log_upd AFTER UPDATE OF id, valor, data, categoria ON gastos
+        BEGIN
+            INSERT INTO gastos_log (gasto_id) VALUES (NEW.id);
+            INSERT INTO gastos_log (gasto_id) SELECT OLD.id WHERE OLD.id <> NEW.id;
+        END
+    """,
+}
+
+# Divisões: cada parte sai da categoria do gasto (o "resto") e entra na própria, no mesmo
+# mês; categoria_mensal continua sendo a soma de tudo. Ao apagar um gasto (fora do
+# arquivamento) as partes e as tags vão junto; ao editar, acompanham data e valor.
+_PAI_NEW = "(SELECT COALESCE(categoria, '') FROM gastos WHERE id = NEW.gasto_id)"
+_PAI_OLD = "(SELECT COALESCE(categoria, '') FROM gastos WHERE id = OLD.gasto_id)"
+_PARTES = "(SELECT TOTAL(valor) FROM gastos_divisoes WHERE gasto_id = {id})"
+_DIVISAO_SOMA = """
+            UPDATE categoria_mensal SET total = total - NEW.valor
+            WHERE mes = substr(NEW.data, 1, 7) AND categoria = """ + _PAI_NEW + """;
+            INSERT INTO categoria_mensal (mes, categoria, total, n)
+            VALUES (substr(NEW.data, 1, 7), NEW.categoria, NEW.valor, 1)
+            ON CONFLICT(mes, categoria) DO UPDATE SET total = total + excluded.total, n = n + 1;
+            UPDATE saldo_mensal SET versao = versao + 1 WHERE mes = substr(NEW.data, 1, 7);"""
+_DIVISAO_SUBTRAI = """
+            UPDATE categoria_mensal SET total = total - OLD.valor, n = n - 1
+            WHERE mes = substr(OLD.data, 1, 7) AND categoria = OLD.categoria;
+            UPDATE saldo_mensal SET versao = versao + 1 WHERE mes = substr(OLD.data, 1, 7);"""
+
+TRIGGERS_DIVISOES = {
+    "trg_divisoes_categoria_ins": f"""
+        CREATE TRIGGER trg_divisoes_categoria_ins AFTER INSERT ON gastos_divisoes
+        BEGIN{_DIVISAO_SOMA}
+        END
+    """,
+    "trg_divisoes_categoria_del": f"""
+        CREATE TRIGGER trg_divisoes_categoria_del AFTER DELETE ON gastos_divisoes
+        WHEN EXISTS (SELECT 1 FROM gastos WHERE id = OLD.gasto_id)
+        BEGIN
+            UPDATE categoria_mensal SET total = total + OLD.valor
+            WHERE mes = substr(OLD.data, 1, 7) AND categoria = {_PAI_OLD};{_DIVISAO_SUBTRAI}
+        END
+    """,
+    # a parte do lado do gasto fica no mês/categoria atuais dele (a data muda antes, pelo gasto)
+    "trg_divisoes_categoria_upd": f"""
+        CREATE TRIGGER trg_divisoes_categoria_upd AFTER UPDATE OF valor, categoria, data ON gastos_divisoes
+        BEGIN
+            UPDATE categoria_mensal SET total = total + OLD.valor
+            WHERE mes = substr(NEW.data, 1, 7) AND categoria = {_PAI_NEW};{_DIVISAO_SUBTRAI}{_DIVISAO_SOMA}
+        END
+    """,
+    "trg_gastos_divisoes_upd": f"""
+        CREATE TRIGGER trg_gastos_divisoes_upd AFTER UPDATE OF data, categoria ON gastos
+        WHEN (OLD.data IS NOT NEW.data OR OLD.categoria IS NOT NEW.categoria)
+         AND EXISTS (SELECT 1 FROM gastos_divisoes WHERE gasto_id = NEW.id)
+        BEGIN
+            UPDATE categoria_mensal SET total = total + {_PARTES.format(id="NEW.id")}
+            WHERE mes = substr(OLD.data, 1, 7) AND categoria = COALESCE(OLD.categoria, '');
+            INSERT INTO categoria_mensal (mes, categoria, total, n)
+            SELECT substr(NEW.data, 1, 7), COALESCE(NEW.categoria, ''), -TOTAL(valor), 0
+            FROM gastos_divisoes WHERE gasto_id = NEW.id
+            ON CONFLICT(mes, categoria) DO UPDATE SET total = total + excluded.total;
+            UPDATE gastos_divisoes SET data = NEW.data WHERE gasto_id = NEW.id AND data IS NOT NEW.data;
+        END
+    """,
+    "trg_gastos_divisoes_del": f"""
+        CREATE TRIGGER trg_gastos_divisoes_del AFTER DELETE ON gastos {_SE_NAO_ARQUIVANDO}
+        BEGIN
+            UPDATE categoria_mensal SET total = total + {_PARTES.format(id="OLD.id")}
+            WHERE mes = substr(OLD.data, 1, 7) AND categoria = COALESCE(OLD.categoria, '');
+            UPDATE categoria_mensal SET
+                total = total - (SELECT TOTAL(valor) FROM gastos_divisoes
+                                 WHERE gasto_id = OLD.id AND categoria = categoria_mensal.categoria),
+                n = n - (SELECT COUNT(*) FROM gastos_divisoes
+                         WHERE gasto_id = OLD.id AND categoria = categoria_mensal.categoria)
+            WHERE mes = substr(OLD.data, 1, 7)
+              AND categoria IN (SELECT categoria FROM gastos_divisoes WHERE gasto_id = OLD.id);
+            DELETE FROM gastos_divisoes WHERE gasto_id = OLD.id;
+            DELETE FROM gastos_tags WHERE gasto_id = OLD.id;
+        END
+    """,
+    "trg_gastos_tags_upd": """
+        CREATE TRIGGER trg_gastos_tags_upd AFTER UPDATE OF valor, data ON gastos
+        WHEN OLD.valor IS NOT NEW.valor OR OLD.data IS NOT NEW.data
+        BEGIN
+            UPDATE gastos_tags SET valor = NEW.valor, data = NEW.data WHERE gasto_id = NEW.id;
+        END
+    """,
+    "trg_gastos_tags_ins": """
+        CREATE TRIGGER trg_gastos_tags_ins AFTER INSERT ON gastos_tags
+        BEGIN
+            UPDATE saldo_mensal SET versao = versao + 1 WHERE mes = substr(NEW.data, 1, 7);
+        END
+    """,
+    "trg_gastos_tags_del": """
+        CREATE TRIGGER trg_gastos_tags_del AFTER DELETE ON gastos_tags
+        BEGIN
+            UPDATE saldo_mensal SET versao = versao + 1 WHERE mes = substr(OLD.data, 1, 7);
+        END
+    """,
+}
+
+# Comprovantes somem com o gasto (fora do arquivamento) e mudam o que o dashboard mostra.
+# O arquivo em .anexos/ só sai na manutenção, quando nenhum gasto usa mais o hash.
+TRIGGERS_ANEXOS = {
+    "trg_gastos_anexos_del": f"""
+        CREATE TRIGGER trg_gastos_anexos_del AFTER DELETE ON gastos {_SE_NAO_ARQUIVANDO}
+        BEGIN
+            DELETE FROM anexos WHERE gasto_id = OLD.id;
+        END
+    """,
+    "trg_anexos_versao_ins": """
+        CREATE TRIGGER trg_anexos_versao_ins AFTER INSERT ON anexos
+        BEGIN
+            UPDATE saldo_mensal SET versao = versao + 1
+            WHERE mes = (SELECT substr(data, 1, 7) FROM gastos WHERE id = NEW.gasto_id);
+        END
+    """,
+    "trg_anexos_versao_del": """
+        CREATE TRIGGER trg_anexos_versao_del AFTER DELETE ON anexos
+        BEGIN
+            UPDATE saldo_mensal SET versao = versao + 1
+            WHERE mes = (SELECT substr(data, 1, 7) FROM gastos WHERE id = OLD.gasto_id);
+        END
+    """,
+}
+
+# Apagar um fechamento reabre o mês: as cotações voltam a valer para ele.
+TRIGGERS_CAMBIO = {
+    "trg_resumo_cambio_del": """
+        CREATE TRIGGER trg_resumo_cambio_del AFTER DELETE ON resumo
+        BEGIN
+            DELETE FROM fechamento_cambio WHERE mes = OLD.mes;
+        END
+    """,
+}
+
+# índice numérico do mês (ano*12 + mês): as janelas RANGE contam meses de calendário, não linhas
+_IDX_MES = "(CAST(substr(mes, 1, 4) AS INTEGER) * 12 + CAST(substr(mes, 6, 2) AS INTEGER))"
+
+# As leituras do app num lugar só: tests/test_planos.py confere o plano
+# (EXPLAIN QUERY PLAN) e o tempo de cada uma num banco grande de teste.
+# Meses e dias são sempre faixas em `data` (>= início, < fim): LIKE não usa índice.
+# Ficam de fora só as montadas na hora (listas IN, bancos anexados por ano, tabelas
+# temporárias) e as cargas completas de propósito (classificador, cache colunar).
+CONSULTAS = {
+    "saldo_mes": "SELECT salario, receitas, gastos, versao FROM saldo_mensal WHERE mes=?",
+    "versao_mes": "SELECT versao FROM saldo_mensal WHERE mes=?",
+    "gastos_mes": """
+        SELECT id, categoria, valor, data,
+               (SELECT hash FROM anexos WHERE gasto_id = gastos_historico.id LIMIT 1),
+               moeda, valor_original
+        FROM gastos_historico
+        WHERE data >= ? AND data < ? ORDER BY data DESC, id DESC
+    """,
+    "gastos_mes_api": """
+        SELECT id, categoria, valor, descricao, data, moeda, valor_original FROM gastos_historico
+        WHERE data >= ? AND data < ? ORDER BY data, id
+    """,
+    "gastos_por_dia": """
+        SELECT data, SUM(valor), COUNT(*) FROM gastos_historico
+        WHERE data >= ? AND data < ?
+        GROUP BY data
+    """,
+    "gastos_do_dia": "SELECT id, categoria, descricao, valor FROM gastos_historico WHERE data=? ORDER BY valor DESC, id",
+    "soma_do_dia": "SELECT COALESCE(SUM(valor), 0) FROM gastos WHERE data=?",
+    "gasto_por_id": "SELECT id, categoria, valor, descricao, data, moeda, valor_original FROM gastos WHERE id=?",
+    "classificacao_por_id": "SELECT categoria, descricao FROM gastos WHERE id=?",
+    "cambio_por_gasto": "SELECT moeda, valor_original, taxa FROM gastos WHERE id=?",
+    "taxa_em": "SELECT taxa FROM cambio WHERE moeda=? AND data<=? ORDER BY data DESC LIMIT 1",
+    "taxa_fechada": "SELECT taxa FROM fechamento_cambio WHERE mes=? AND moeda=? AND data<=? ORDER BY data DESC LIMIT 1",
+    # as-of join: para cada gasto, a última cotação até o dia (busca no PK de cambio)
+    "a_reconverter": """
+        SELECT id, valor, ROUND(valor_original * nova, 2), nova FROM (
+            SELECT g.id, g.valor, g.valor_original, g.taxa,
+                   (SELECT c.taxa FROM cambio c WHERE c.moeda = g.moeda AND c.data <= g.data
+                    ORDER BY c.data DESC LIMIT 1) AS nova
+            FROM gastos g
+            WHERE g.moeda <> 'BRL' AND g.moeda = ? AND g.data >= ? AND g.valor_original IS NOT NULL
+              AND substr(g.data, 1, 7) NOT IN (SELECT mes FROM resumo)
+        )
+        WHERE nova IS NOT NULL AND nova IS NOT taxa
+    """,
+    "duplicado_por_impressao": "SELECT id FROM gastos WHERE impressao=? AND id IS NOT ? LIMIT 1",
+    # meses passados sem fechamento: todos do primeiro mês com dados até o anterior ao atual
+    # (vazios inclusive), menos os que a pessoa apagou do histórico
+    "meses_pendentes": """
+        WITH RECURSIVE seq(mes) AS (
+            SELECT MIN(mes) FROM (
+                SELECT MIN(mes) AS mes FROM saldo_mensal UNION ALL SELECT MIN(mes) FROM resumo
+            )
+            UNION ALL
+            SELECT strftime('%Y-%m', mes || '-01', '+1 month') FROM seq WHERE mes < ?
+        )
+        SELECT m.mes,
+               COALESCE(s.salario, (SELECT salario FROM config WHERE id=1), 0) AS salario,
+               COALESCE(s.receitas, 0) AS receitas, COALESCE(s.gastos, 0) AS gastos
+        FROM seq m
+        LEFT JOIN saldo_mensal s ON s.mes = m.mes
+        WHERE m.mes < ?
+          AND m.mes NOT IN (SELECT mes FROM resumo WHERE mes IS NOT NULL)
+          AND m.mes NOT IN (SELECT mes FROM fechamentos_apagados)
+        ORDER BY m.mes
+    """,
+    "receitas_mes": """
+        SELECT id, categoria, valor, data FROM receitas
+        WHERE data >= ? AND data < ? ORDER BY data DESC, id DESC
+    """,
+    "anomalias_mes": """
+        SELECT g.id, g.data, g.categoria, g.valor, a.motivo
+        FROM gastos_anomalias a JOIN gastos g ON g.id = a.gasto_id
+        WHERE a.ignorado=0 AND g.data >= ? AND g.data < ?
+        ORDER BY g.data DESC, g.id DESC
+    """,
+    "orcamentos_mes": """
+        SELECT o.categoria, o.limite, COALESCE(c.total, 0)
+        FROM orcamentos o
+        LEFT JOIN categoria_mensal c ON c.mes = ? AND c.categoria = o.categoria
+        ORDER BY o.categoria
+    """,
+    "orcamento_categoria": """
+        SELECT o.limite, COALESCE(c.total, 0)
+        FROM orcamentos o
+        LEFT JOIN categoria_mensal c ON c.mes = substr(?, 1, 7) AND c.categoria = o.categoria
+        WHERE o.categoria = ?
+    """,
+    "anexos_por_gasto": "SELECT id, hash, nome, bytes FROM anexos WHERE gasto_id=? ORDER BY id",
+    "divisoes_por_gasto": "SELECT categoria, valor FROM gastos_divisoes WHERE gasto_id=? ORDER BY id",
+    "tags_por_gasto": """
+        SELECT t.nome FROM gastos_tags gt JOIN tags t ON t.id = gt.tag_id
+        WHERE gt.gasto_id=? ORDER BY t.nome
+    """,
+    # um SEARCH por tag em idx_gastos_tags_tag (tag_id, data, valor): não lê os gastos
+    "totais_tags": """
+        SELECT t.nome, TOTAL(gt.valor), COUNT(*)
+        FROM tags t JOIN gastos_tags gt ON gt.tag_id = t.id AND gt.data >= ? AND gt.data < ?
+        GROUP BY t.id
+        ORDER BY 2 DESC
+    """,
+    "ocorrencias_periodo": """
+        SELECT o.data, f.categoria, f.valor, f.descricao, o.aplicado
+        FROM fixos_ocorrencias o JOIN fixos f ON f.id = o.fixo_id
+        WHERE o.data BETWEEN ? AND ? AND f.ativo=1
+        ORDER BY o.data
+    """,
+    # anos antes do mês dado com todos os meses de gasto fechados, pelos agregados;
+    # só a contagem desce em gastos, e pela faixa do índice de data
+    "anos_arquivaveis": """
+        WITH anos AS (
+            SELECT substr(mes, 1, 4) AS ano, SUM(gastos) AS total
+            FROM saldo_mensal
+            WHERE mes < ?
+            GROUP BY ano
+            HAVING SUM(gastos <> 0 AND mes NOT IN (SELECT mes FROM resumo)) = 0
+        )
+        SELECT ano, n, total FROM (
+            SELECT ano, total,
+                   (SELECT COUNT(*) FROM gastos WHERE data >= ano || '-01-01' AND data < (ano + 1) || '-01-01') AS n
+            FROM anos
+            WHERE ano NOT IN (SELECT ano FROM arquivos)
+        )
+        WHERE n > 0
+        ORDER BY ano
+    """,
+    "anos_arquivados": "SELECT ano, linhas, total FROM arquivos ORDER BY ano",
+    "ano_arquivado": "SELECT 1 FROM arquivos WHERE ano=?",
+    # configuração: uma linha só (id=1)
+    "config_salario": "SELECT salario FROM config WHERE id=1",
+    "config_tema": "SELECT tema FROM config WHERE id=1",
+    "config_confirmar_fechamento": "SELECT confirmar_fechamento FROM config WHERE id=1",
+    # saldos e fechamentos (saldo_mensal e resumo têm uma linha por mês)
+    "saldo_mes_api": "SELECT salario, receitas, gastos, acumulado FROM saldo_mensal WHERE mes=?",
+    "acumulado_ate": "SELECT acumulado FROM saldo_mensal WHERE mes <= ? ORDER BY mes DESC LIMIT 1",
+    "resumo_mes": "SELECT total, saldo FROM resumo WHERE mes=?",
+    "total_fechamentos": "SELECT TOTAL(total) FROM resumo",
+    "fechamentos_recentes": "SELECT mes, total, saldo FROM resumo ORDER BY mes DESC LIMIT ?",  # -1: todos
+    "fechamentos_grafico": "SELECT mes, total FROM resumo ORDER BY mes",
+    # de um banco anexado como {banco} (resumo_consolidado)
+    "saldo_consolidado": """
+        SELECT ?, TOTAL(salario), TOTAL(receitas), TOTAL(gastos),
+               (SELECT acumulado FROM {banco}.saldo_mensal WHERE mes <= ? ORDER BY mes DESC LIMIT 1)
+        FROM {banco}.saldo_mensal WHERE mes = ?
+    """,
+    # janelas sobre os agregados; meses sem registro contam como zero
+    "comparativo_mensal": f"""
+        SELECT mes, gastos, ano_anterior, media_3, media_12 FROM (
+            SELECT mes, gastos,
+                   SUM(gastos) OVER (ORDER BY idx RANGE BETWEEN 12 PRECEDING AND 12 PRECEDING) AS ano_anterior,
+                   SUM(gastos) OVER (ORDER BY idx RANGE BETWEEN 2 PRECEDING AND CURRENT ROW) / 3.0 AS media_3,
+                   SUM(gastos) OVER (ORDER BY idx RANGE BETWEEN 11 PRECEDING AND CURRENT ROW) / 12.0 AS media_12
+            FROM (SELECT mes, gastos, {_IDX_MES} AS idx FROM saldo_mensal)
+        )
+        ORDER BY mes DESC
+        LIMIT ?
+    """,
+    # (12 meses antes, mês, mês): as janelas olham no máximo um ano para trás
+    "comparativo_categorias": f"""
+        SELECT categoria, total, participacao, anterior, media_3_ant, ano_anterior FROM (
+            SELECT mes, categoria, total,
+                   total / NULLIF(SUM(total) OVER (PARTITION BY mes), 0) AS participacao,
+                   SUM(total) OVER w_1 AS anterior,
+                   SUM(total) OVER w_3 / 3.0 AS media_3_ant,
+                   SUM(total) OVER w_12 AS ano_anterior
+            FROM (
+                SELECT mes, categoria, total, {_IDX_MES} AS idx FROM categoria_mensal
+                WHERE mes >= ? AND mes <= ? AND n > 0
+            )
+            WINDOW
+                w_1 AS (PARTITION BY categoria ORDER BY idx RANGE BETWEEN 1 PRECEDING AND 1 PRECEDING),
+                w_3 AS (PARTITION BY categoria ORDER BY idx RANGE BETWEEN 3 PRECEDING AND 1 PRECEDING),
+                w_12 AS (PARTITION BY categoria ORDER BY idx RANGE BETWEEN 12 PRECEDING AND 12 PRECEDING)
+        )
+        WHERE mes = ?
+        ORDER BY total DESC
+    """,
+    # relatórios anuais
+    "anos_com_saldo": "SELECT DISTINCT CAST(substr(mes, 1, 4) AS INTEGER) FROM saldo_mensal ORDER BY 1",
+    "saldo_mensal_periodo": """
+        SELECT mes, salario, receitas, gastos, acumulado FROM saldo_mensal
+        WHERE mes >= ? AND mes < ? ORDER BY mes
+    """,
+    "categoria_mensal_periodo": """
+        SELECT mes, categoria, total, n FROM categoria_mensal
+        WHERE mes >= ? AND mes < ? ORDER BY mes, categoria
+    """,
+    "categorias_periodo": """
+        SELECT categoria, SUM(total), SUM(n) FROM categoria_mensal
+        WHERE mes >= ? AND mes < ? GROUP BY categoria HAVING SUM(total) > 0 ORDER BY 2 DESC
+    """,
+    # projeções: meses anteriores a ? com os fixos já lançados em cada um
+    # (as ocorrências entram pela PK (fixo_id, data), fixo a fixo)
+    "series_mensais": """
+        SELECT CAST(substr(s.mes, 6, 2) AS INTEGER), s.salario, s.receitas, s.gastos, COALESCE(fx.total, 0)
+        FROM saldo_mensal s
+        LEFT JOIN (
+            SELECT substr(o.data, 1, 7) AS mes, SUM(COALESCE(CAST(f.valor AS REAL), 0)) AS total
+            FROM fixos f CROSS JOIN fixos_ocorrencias o ON o.fixo_id = f.id
+            WHERE o.aplicado=1 AND o.data < ?
+            GROUP BY 1
+        ) fx ON fx.mes = s.mes
+        WHERE s.mes < ?
+        ORDER BY s.mes
+    """,
+    # fixos (tabela pequena: uma linha por regra)
+    "fixos_lista": "SELECT id, categoria, valor, ativo, frequencia, inicio, fim, parcelas FROM fixos ORDER BY id DESC",
+    "fixos_api": """
+        SELECT id, categoria, valor, descricao, ativo, frequencia, inicio, fim, parcelas
+        FROM fixos ORDER BY id
+    """,
+    "fixo_ativo": "SELECT ativo FROM fixos WHERE id=?",
+    "fixos_valores": "SELECT categoria, CAST(valor AS REAL) FROM fixos",
+    "fixos_a_expandir": """
+        SELECT id, frequencia, inicio, fim, parcelas, gerado_ate FROM fixos
+        WHERE ativo=1 AND inicio IS NOT NULL AND (gerado_ate IS NULL OR gerado_ate < ?)
+    """,
+    # duplicados: CROSS JOIN fixa a ordem, os suspeitos guiam e gastos entra pelo id
+    # (com JOIN o ORDER BY levava o planner a percorrer gastos inteiro pelo índice de data)
+    "duplicados_pendentes": """
+        SELECT g.id, g.data, g.valor, g.descricao, d.original_id, d.motivo
+        FROM gastos_duplicados d CROSS JOIN gastos g ON g.id = d.gasto_id
+        WHERE d.ignorado=0
+        ORDER BY g.data DESC, g.id DESC
+    """,
+    "contar_duplicados": """
+        SELECT COUNT(*) FROM gastos_duplicados d CROSS JOIN gastos g ON g.id = d.gasto_id
+        WHERE d.ignorado=0
+    """,
+    "sem_impressao": "SELECT id, data, valor, descricao FROM gastos WHERE impressao IS NULL LIMIT ?",
+    "primeiro_com_impressao": "SELECT id FROM gastos WHERE impressao=? AND id<>? ORDER BY id LIMIT 1",
+    # importação de extrato: o que já existia antes dela (id <= maior id de antes)
+    "maior_id_gastos": "SELECT COALESCE(MAX(id), 0) FROM gastos",
+    "maior_id_receitas": "SELECT COALESCE(MAX(id), 0) FROM receitas",
+    "importado_por_impressao": "SELECT id FROM gastos WHERE impressao=? AND id<=? LIMIT 1",
+    "gasto_por_fitid": "SELECT 1 FROM gastos WHERE fitid=?",
+    "receita_importada": "SELECT 1 FROM receitas WHERE data=? AND valor=? AND descricao=? AND id<=? LIMIT 1",
+    # gasto a gasto
+    "valor_data_por_id": "SELECT valor, data FROM gastos WHERE id=?",
+    "total_divisoes": "SELECT TOTAL(valor) FROM gastos_divisoes WHERE gasto_id=?",
+    "partes_gasto": """
+        SELECT categoria, SUM(v) FROM (
+            SELECT COALESCE(categoria, '') AS categoria,
+                   valor - (SELECT TOTAL(valor) FROM gastos_divisoes WHERE gasto_id = gastos.id) AS v
+            FROM gastos WHERE id = ?
+            UNION ALL
+            SELECT categoria, valor FROM gastos_divisoes WHERE gasto_id = ?
+        ) GROUP BY categoria
+    """,
+    "estatisticas_categoria": "SELECT n, media, m2 FROM estatisticas_categoria WHERE categoria=?",
+    "orcamentos": "SELECT categoria, limite FROM orcamentos",
+    "anexo_por_hash": "SELECT 1 FROM anexos WHERE hash=? LIMIT 1",
+    # moedas distintas pulando pelo PK de cambio (moeda, data): uma busca por moeda
+    "moedas_com_cotacao": """
+        WITH RECURSIVE m(moeda) AS (
+            SELECT MIN(moeda) FROM cambio
+            UNION ALL
+            SELECT (SELECT MIN(moeda) FROM cambio WHERE moeda > m.moeda) FROM m WHERE m.moeda IS NOT NULL
+        )
+        SELECT moeda FROM m WHERE moeda IS NOT NULL
+    """,
+    "ultimas_manutencoes": "SELECT operacao, MAX(inicio) FROM manutencao_log GROUP BY operacao",
+}
+
+def faixa_mes(mes: str):
+    """'2024-03' -> ('2024-03-01', '2024-04-01'): parâmetros das consultas por mês."""
+    return f"{mes}-01", f"{somar_mes(mes, 1)}-01"
+
+def obter_salario():
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(CONSULTAS["config_salario"])
+    v = cur.fetchone()[0] or 0
+    conn.close()
+    return float(v)
+
+def salvar_salario(v: float):
+    """
+    Salva o salário e aplica no mês atual.
+    Meses anteriores mantêm o salário que tinham (o acumulado não muda para trás).
+    """
+    mes = date.today().strftime("%Y-%m")
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute("UPDATE config SET salario=? WHERE id=1", (v,))
+    cur.execute("INSERT OR IGNORE INTO saldo_mensal (mes, salario) VALUES (?, ?)", (mes, v))
+    cur.execute("UPDATE saldo_mensal SET salario=?, versao = versao + 1 WHERE mes=?", (v, mes))
+    conn.commit()
+    conn.close()
+
+def obter_saldo_mes(mes: str):
+    """Retorna (salario, receitas, gastos) do mês, sem varrer os lançamentos."""
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(CONSULTAS["saldo_mes"], (mes,))
+    row = cur.fetchone()
+    conn.close()
+    if not row:
+        return obter_salario(), 0.0, 0.0
+    return float(row[0] or 0), float(row[1] or 0), float(row[2] or 0)
+
+def fechar_mes(mes: str = None) -> dict:
+    """
+    Fecha o mês (padrão: o atual): lança os fixos vencidos e grava total/saldo/receitas
+    em resumo. Regra única para a janela e para a API.
+    """
+    aplicar_fixos_automaticos()
+    mes = mes or datetime.now().strftime("%Y-%m")
+    salario, receitas, total = obter_saldo_mes(mes)
+    saldo = salario + receitas - total
+
+    conn = conectar()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            INSERT INTO resumo (mes, total, saldo, receitas)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(mes)
+            DO UPDATE SET total=excluded.total, saldo=excluded.saldo, receitas=excluded.receitas
+        """, (mes, total, saldo, receitas))
+    except sqlite3.OperationalError:
+        cur.execute(
+            "INSERT OR REPLACE INTO resumo (mes, total, saldo, receitas) VALUES (?, ?, ?, ?)",
+            (mes, total, saldo, receitas)
+        )
+    _congelar_cambio(cur, [mes])
+    cur.execute("DELETE FROM fechamentos_apagados WHERE mes=?", (mes,))
+    conn.commit()
+    conn.close()
+    return {"mes": mes, "total": total, "saldo": saldo, "receitas": receitas, "salario": salario}
+
+def _congelar_cambio(cur, meses):
+    """
+    Copia para fechamento_cambio as cotações que cada mês usou (as do mês e a vigente
+    no dia 01, de cada moeda com gasto): importações seguintes não reconvertem esses
+    gastos e edições no mês fechado usam a cópia.
+    """
+    marcas = ",".join("?" * len(meses))
+    cur.execute(f"DELETE FROM fechamento_cambio WHERE mes IN ({marcas})", meses)
+    cur.execute(f"""
+        INSERT INTO fechamento_cambio (mes, moeda, data, taxa)
+        SELECT m.mes, c.moeda, c.data, c.taxa
+        FROM (
+            SELECT DISTINCT substr(data, 1, 7) AS mes, moeda FROM gastos
+            WHERE moeda <> 'BRL' AND data >= ? AND data < ?
+        ) m
+        JOIN cambio c ON c.moeda = m.moeda
+            AND c.data < date(m.mes || '-01', '+1 month')
+            AND c.data >= COALESCE(
+                (SELECT MAX(data) FROM cambio WHERE moeda = m.moeda AND data <= m.mes || '-01'), m.mes || '-01')
+        WHERE m.mes IN ({marcas})
+    """, (faixa_mes(min(meses))[0], faixa_mes(max(meses))[1], *meses))
+
+def meses_pendentes() -> list:
+    """
+    [(mes, salario, receitas, gastos)] dos meses anteriores ao atual que nunca foram
+    fechados (o app ficou sem abrir na virada, ou a pessoa esqueceu), em ordem.
+    """
+    atual = datetime.now().strftime("%Y-%m")
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(CONSULTAS["meses_pendentes"], (atual, atual))
+    rows = [(m, float(s), float(r), float(g)) for m, s, r, g in cur.fetchall()]
+    conn.close()
+    return rows
+
+def fechar_meses_pendentes(meses=None) -> list:
+    """
+    Fecha de uma vez os meses pendentes (ou só os de `meses` que ainda estão pendentes):
+    lança os fixos vencidos antes, depois um INSERT ... SELECT em resumo a partir de
+    saldo_mensal e o congelamento do câmbio, numa transação só. Retorna os meses fechados.
+    """
+    aplicar_fixos_automaticos()
+    atual = datetime.now().strftime("%Y-%m")
+    conn = conectar()
+    cur = conn.cursor()
+    try:
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute(CONSULTAS["meses_pendentes"], (atual, atual))
+        pendentes = [r[0] for r in cur.fetchall() if meses is None or r[0] in meses]
+        if pendentes:
+            marcas = ",".join("?" * len(pendentes))
+            cur.execute(f"""
+                INSERT INTO resumo (mes, total, saldo, receitas)
+                SELECT mes, gastos, salario + receitas - gastos, receitas
+                FROM ({CONSULTAS["meses_pendentes"]})
+                WHERE mes IN ({marcas})
+            """, (atual, atual, *pendentes))
+            _congelar_cambio(cur, pendentes)
+        conn.commit()
+    finally:
+        conn.close()
+    return pendentes
+
+def confirmar_fechamento() -> bool:
+    """Perguntar antes de fechar os meses pendentes ao abrir o app (config.confirmar_fechamento)."""
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(CONSULTAS["config_confirmar_fechamento"])
+    row = cur.fetchone()
+    conn.close()
+    return bool(row[0]) if row and row[0] is not None else True
+
+def salvar_confirmar_fechamento(confirmar: bool):
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute("UPDATE config SET confirmar_fechamento=? WHERE id=1", (int(confirmar),))
+    conn.commit()
+    conn.close()
+
+def obter_acumulado(mes: str) -> float:
+    """Saldo acumulado (patrimônio) até o mês, inclusive."""
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(CONSULTAS["acumulado_ate"], (mes,))
+    row = cur.fetchone()
+    conn.close()
+    return float(row[0] or 0) if row else 0.0
+
+
+def somar_mes(mes: str, n: int) -> str:
+    """'2024-01' + (-1) -> '2023-12'"""
+    a, m = int(mes[:4]), int(mes[5:7])
+    idx = a * 12 + (m - 1) + n
+    return f"{idx // 12:04d}-{idx % 12 + 1:02d}"
+
+def carregar_mes(mes: str) -> dict:
+    """
+    Tudo que o dashboard mostra de um mês, lido numa única transação de leitura
+    (a versão bate com as linhas lidas).
+    """
+    conn = conectar()
+    cur = conn.cursor()
+    arquivado = bool(anexar_arquivos(cur, [int(mes[:4])]))  # ATTACH não pode ficar dentro do BEGIN
+    cur.execute("BEGIN")
+    cur.execute(CONSULTAS["saldo_mes"], (mes,))
+    sm = cur.fetchone()
+    cur.execute(CONSULTAS["gastos_mes"], faixa_mes(mes))
+    rows = cur.fetchall()
+    if not sm:
+        cur.execute(CONSULTAS["config_salario"])
+        sm = (cur.fetchone()[0] or 0, 0, 0, None)
+    conn.rollback()
+    conn.close()
+    return {
+        "mes": mes,
+        "rows": rows,
+        "salario": float(sm[0] or 0),
+        "receitas": float(sm[1] or 0),
+        "gastos": float(sm[2] or 0),
+        "versao": sm[3],
+        "arquivado": arquivado,
+    }
+
+def versao_mes(mes: str):
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(CONSULTAS["versao_mes"], (mes,))
+    row = cur.fetchone()
+    conn.close()
+    return row[0] if row else None
+
+def comparativo_mensal(limite: int = 24):
+    """
+    [(mes, gastos, mesmo_mes_ano_anterior, media_3m, media_12m)], do mais recente para trás.
+    Janelas sobre saldo_mensal (um registro por mês); meses sem registro contam como zero.
+    """
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(CONSULTAS["comparativo_mensal"], (limite,))
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def comparativo_categorias(mes: str):
+    """
+    [(categoria, total, participacao, mes_anterior, media_3m_anteriores, ano_anterior)] do mês.
+    Uma consulta só, com janelas sobre o último ano de categoria_mensal.
+    """
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(CONSULTAS["comparativo_categorias"], (somar_mes(mes, -12), mes, mes))
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def gastos_por_dia(ano: int) -> dict:
+    """
+    {'YYYY-MM-DD': (total, quantidade)} do ano. Com NumPy sai do cache colunar
+    (bincount, sem descompactar anos arquivados); senão um GROUP BY por faixa
+    em idx_gastos_data_valor.
+    """
+    colunas = obter_colunas()
+    if colunas is not None:
+        inicio = date(ano, 1, 1)
+        totais, qtds = colunas.totais_por_dia(inicio, date(ano + 1, 1, 1))
+        return {
+            (inicio + timedelta(days=i)).isoformat(): (float(totais[i]), int(qtds[i]))
+            for i in np.flatnonzero(qtds).tolist()
+        }
+    conn = conectar()
+    cur = conn.cursor()
+    anexar_arquivos(cur, [ano])
+    cur.execute(CONSULTAS["gastos_por_dia"], (f"{ano:04d}-01-01", f"{ano + 1:04d}-01-01"))
+    dias = {d: (float(t or 0), n) for d, t, n in cur}
+    conn.close()
+    return dias
+
+def gastos_do_dia(dia: str):
+    conn = conectar()
+    cur = conn.cursor()
+    anexar_arquivos(cur, [int(dia[:4])])
+    cur.execute(CONSULTAS["gastos_do_dia"], (dia,))
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def obter_tema() -> str:
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(CONSULTAS["config_tema"])
+    row = cur.fetchone()
+    conn.close()
+    return (row[0] if row and row[0] else "original")
+
+def salvar_tema(nome: str):
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute("UPDATE config SET tema=? WHERE id=1", (nome,))
+    conn.commit()
+    conn.close()
+
+def _somar_meses(d: date, n: int, dia: int) -> date:
+    idx = d.year * 12 + (d.month - 1) + n
+    a, m = idx // 12, idx % 12 + 1
+    return date(a, m, min(dia, calendar.monthrange(a, m)[1]))
+
+def ocorrencias_da_regra(frequencia: str, inicio: date, fim=None, parcelas=None):
+    """
+    Gera as datas de uma regra, em ordem: (data, nº da ocorrência começando em 1).
+    Infinita se não tiver fim nem parcelas — quem chama decide até onde ir.
+    """
+    n = 0
+    while True:
+        if frequencia == "semanal":
+            d = inicio + timedelta(days=7 * n)
+        elif frequencia == "quinzenal":
+            d = inicio + timedelta(days=14 * n)
+        elif frequencia == "anual":
+            d = _somar_meses(inicio, 12 * n, inicio.day)
+        else:
+            d = _somar_meses(inicio, n, inicio.day)
+        n += 1
+        if parcelas and n > parcelas:
+            return
+        if fim and d > fim:
+            return
+        yield d, n
+
+def expandir_ocorrencias(cur, ate: date):
+    """
+    Gera (de forma preguiçosa) as ocorrências dos fixos ativos até `ate`.
+    - Cada fixo guarda em gerado_ate até onde já foi expandido: nada é gerado duas vezes.
+    - INSERT OR IGNORE na PK (fixo_id, data) deixa tudo idempotente.
+    """
+    ate_iso = ate.isoformat()
+    cur.execute(CONSULTAS["fixos_a_expandir"], (ate_iso,))
+    novas = []
+    expandidos = []
+    for fid, freq, ini, fim, parcelas, gerado_ate in cur.fetchall():
+        try:
+            ini_d = date.fromisoformat(ini)
+            fim_d = date.fromisoformat(fim) if fim else None
+        except ValueError:
+            continue
+        for d, n in ocorrencias_da_regra(freq or "mensal", ini_d, fim_d, parcelas):
+            if d > ate:
+                break
+            if gerado_ate and d.isoformat() <= gerado_ate:
+                continue
+            novas.append((fid, d.isoformat(), n if parcelas else None))
+        expandidos.append((ate_iso, fid))
+
+    cur.executemany("INSERT OR IGNORE INTO fixos_ocorrencias (fixo_id, data, parcela) VALUES (?,?,?)", novas)
+    cur.executemany("UPDATE fixos SET gerado_ate=? WHERE id=?", expandidos)
+    return len(novas)
+
+def ocorrencias_periodo(inicio: date, fim: date):
+    """
+    Ocorrências de fixos ativos no período (já lançadas ou não):
+    [(data, categoria, valor, descricao, aplicado)]. Expande o que faltar.
+    """
+    conn = conectar()
+    cur = conn.cursor()
+    expandir_ocorrencias(cur, fim)
+    conn.commit()
+    cur.execute(CONSULTAS["ocorrencias_periodo"], (inicio.isoformat(), fim.isoformat()))
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def aplicar_fixos_automaticos() -> int:
+    """
+    Lança todas as ocorrências de fixos vencidas até hoje SEM duplicar.
+    - Pode ser executado quantas vezes quiser.
+    - Se o app ficar meses fechado, tudo o que venceu entra de uma vez
+      (um INSERT ... SELECT sobre as ocorrências pendentes).
+    - Retorna quantos gastos foram lançados.
+    """
+    hoje = date.today()
+    hoje_iso = hoje.isoformat()
+    hoje_mes = hoje.strftime("%Y-%m")
+
+    conn = conectar()
+    cur = conn.cursor()
+
+    # garante migração mínima (para bancos antigos)
+    try:
+        cur.execute("SELECT ultimo_mes, (SELECT gerado_ate FROM fixos LIMIT 1) FROM config WHERE id=1")
+        row = cur.fetchone()
+        _ = (row[0] if row else "")
+    except sqlite3.OperationalError:
+        conn.close()
+        migrar_banco()
+        conn = conectar()
+        cur = conn.cursor()
+
+    expandir_ocorrencias(cur, hoje)
+
+    pendentes = """
+        FROM fixos_ocorrencias o JOIN fixos f ON f.id = o.fixo_id
+        WHERE o.aplicado=0 AND o.data <= ? AND f.ativo=1
+    """
+    cur.execute(f"""
+        INSERT INTO gastos (categoria, valor, descricao, data)
+        SELECT f.categoria,
+               COALESCE(CAST(f.valor AS REAL), 0),
+               COALESCE(f.descricao, '') || CASE
+                   WHEN f.parcelas THEN ' (' || o.parcela || '/' || f.parcelas || ')'
+                   ELSE ''
+               END,
+               o.data
+        {pendentes}
+        ORDER BY o.data, o.fixo_id
+    """, (hoje_iso,))
+    aplicados = cur.rowcount
+
+    if aplicados:
+        # fixo que também chegou por importação/lançamento manual fica sinalizado
+        preencher_impressoes(cur, motivo="fixo igual a um gasto já lançado")
+        # fixos_aplicados segue registrando o mês (compatibilidade com bancos/scripts antigos)
+        cur.execute(f"""
+            INSERT OR IGNORE INTO fixos_aplicados (mes, fixo_id)
+            SELECT substr(o.data, 1, 7), o.fixo_id {pendentes}
+        """, (hoje_iso,))
+        cur.execute("""
+            UPDATE fixos_ocorrencias SET aplicado=1
+            WHERE aplicado=0 AND data <= ?
+              AND fixo_id IN (SELECT id FROM fixos WHERE ativo=1)
+        """, (hoje_iso,))
+
+    # ainda mantemos ultimo_mes só como referência visual (não é mais o "bloqueio")
+    cur.execute("UPDATE config SET ultimo_mes=? WHERE id=1 AND ultimo_mes IS NOT ?", (hoje_mes, hoje_mes))
+
+    conn.commit()
+    conn.close()
+    return aplicados
+
+def descrever_regra(frequencia: str, inicio: str, fim: str = None, parcelas: int = None) -> str:
+    txt = FREQUENCIAS.get(frequencia or "mensal", "Mensal")
+    try:
+        ini = date.fromisoformat(inicio)
+    except (TypeError, ValueError):
+        ini = None
+    if ini and (frequencia or "mensal") == "mensal":
+        txt += f" (dia {ini.day:02d})"
+    elif ini and frequencia == "anual":
+        txt += f" ({ini:%d/%m})"
+    if parcelas:
+        txt = f"{parcelas}x • {txt}"
+    elif fim:
+        txt += f" até {br_date(fim)}"
+    return txt
+
+# ======================
+# DUPLICADOS
+# ======================
+_NAO_ALFANUM = re.compile(r"[\W_]+")
+
+def normalizar_descricao(desc: str) -> str:
+    """'  Padaria São João-123 ' -> 'padaria sao joao 123'"""
+    txt = desc or ""
+    if not txt.isascii():
+        txt = unicodedata.normalize("NFKD", txt)
+        txt = "".join(ch for ch in txt if not unicodedata.combining(ch))
+    return " ".join(_NAO_ALFANUM.sub(" ", txt.lower()).split())
+
+def impressao_gasto(data: str, valor: float, descricao: str) -> int:
+    """Hash de 64 bits de (data, valor em centavos, descrição normalizada)."""
+    chave = f"{data}|{round(float(valor or 0) * 100)}|{normalizar_descricao(descricao)}"
+    return int.from_bytes(hashlib.blake2b(chave.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+def procurar_duplicado(cur, data: str, valor: float, descricao: str, ignorar_id=None):
+    """Id de um gasto idêntico (mesma impressão), via índice. None se não houver."""
+    cur.execute(CONSULTAS["duplicado_por_impressao"], (impressao_gasto(data, valor, descricao), ignorar_id))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+def inserir_gasto(cur, categoria: str, valor: float, descricao: str, data: str, treinar: bool = True,
+                  moeda: str = "BRL", fitid: str = None) -> int:
+    """
+    Insere um gasto com a impressão digital já calculada.
+    treinar=False para lançamentos cuja categoria não foi escolhida por uma pessoa (importação).
+    Em outra moeda, `valor` é o cobrado nela e vai para reais pela cotação do dia (ValueError sem cotação).
+    """
+    # carregado antes de escrever: o primeiro treino usa outra conexão e esperaria este lock
+    clf = obter_classificador() if treinar else None
+    impressao = impressao_gasto(data, valor, descricao)
+    valor, original, taxa = converter(cur, moeda, valor, data)
+    # avaliado antes do INSERT: as estatísticas ainda não contam este gasto
+    motivos = avaliar_anomalia(cur, categoria, valor, data)
+    cur.execute(
+        "INSERT INTO gastos (categoria, valor, descricao, data, impressao, moeda, valor_original, taxa, fitid)"
+        " VALUES (?,?,?,?,?,?,?,?,?)",
+        (categoria, valor, descricao, data, impressao, moeda, original, taxa, fitid)
+    )
+    gasto_id = cur.lastrowid
+    if motivos:
+        cur.execute("INSERT OR REPLACE INTO gastos_anomalias (gasto_id, motivo) VALUES (?, ?)", (gasto_id, "; ".join(motivos)))
+    if clf is not None:
+        clf.treinar(cur, descricao, categoria)
+    return gasto_id
+
+def atualizar_gasto(cur, gasto_id: int, categoria: str, valor: float, descricao: str, data: str, moeda: str = "BRL",
+                    divisoes=None):
+    """
+    Grava a edição do gasto. As partes da divisão (as atuais, ou `divisoes` se o chamador
+    vai trocá-las em seguida) precisam caber no novo valor: ValueError antes do UPDATE.
+    """
+    clf = obter_classificador()  # antes do UPDATE, como em inserir_gasto
+    impressao = impressao_gasto(data, valor, descricao)
+    valor, original, taxa = converter(cur, moeda, valor, data)
+    if divisoes is None:
+        cur.execute(CONSULTAS["total_divisoes"], (gasto_id,))
+        partes = cur.fetchone()[0]
+    else:
+        partes = sum(v for _, v in divisoes)
+    if partes and partes > valor - 0.005:
+        raise ValueError(f"As partes somam mais que o gasto ({money(valor)}): a categoria principal fica sem nada.")
+    cur.execute(CONSULTAS["classificacao_por_id"], (gasto_id,))
+    antigo = cur.fetchone()
+    cur.execute("""
+        UPDATE gastos
+        SET categoria=?, valor=?, descricao=?, data=?, impressao=?, moeda=?, valor_original=?, taxa=?
+        WHERE id=?
+    """, (categoria, valor, descricao, data, impressao, moeda, original, taxa, gasto_id))
+    if antigo and (antigo[0], antigo[1] or "") != (categoria, descricao or ""):
+        clf.treinar(cur, antigo[1], antigo[0], peso=-1)
+        clf.treinar(cur, descricao, categoria)
+
+def remover_gasto(cur, gasto_id: int):
+    clf = obter_classificador()  # antes do DELETE, como em inserir_gasto
+    cur.execute(CONSULTAS["classificacao_por_id"], (gasto_id,))
+    antigo = cur.fetchone()
+    cur.execute("DELETE FROM gastos WHERE id=?", (gasto_id,))
+    if antigo:
+        clf.treinar(cur, antigo[1], antigo[0], peso=-1)
+
+def preencher_impressoes(cur, motivo: str = None, lote: int = 5000) -> int:
+    """
+    Calcula a impressão de gastos que ainda não têm (fixos, bancos antigos, scripts).
+    Com `motivo`, também sinaliza os que batem com um gasto já existente.
+    """
+    total = 0
+    while True:
+        cur.execute(CONSULTAS["sem_impressao"], (lote,))
+        rows = cur.fetchall()
+        if not rows:
+            return total
+        novos = [(impressao_gasto(dt, val, desc), gid) for gid, dt, val, desc in rows]
+        cur.executemany("UPDATE gastos SET impressao=? WHERE id=?", novos)
+        if motivo:
+            for imp, gid in novos:
+                cur.execute(CONSULTAS["primeiro_com_impressao"], (imp, gid))
+                row = cur.fetchone()
+                if row and row[0] < gid:
+                    cur.execute(
+                        "INSERT OR IGNORE INTO gastos_duplicados (gasto_id, original_id, motivo) VALUES (?,?,?)",
+                        (gid, row[0], motivo)
+                    )
+        total += len(rows)
+
+def _descricoes_parecidas(a: str, b: str) -> bool:
+    ta, tb = set(normalizar_descricao(a).split()), set(normalizar_descricao(b).split())
+    if not ta or not tb:
+        return True
+    return len(ta & tb) / len(ta | tb) >= 0.5
+
+def _lotes_por_valor(cur, lote: int):
+    """
+    (id, data, centavos, descricao) de todos os gastos em ordem de (centavos, data, id),
+    lidos em lotes de `lote` pelo índice idx_gastos_centavos (paginação por chave).
+    Entre um lote e outro nenhum lock fica preso: o app grava normalmente durante a varredura.
+    Gastos sem data ficam de fora: não entram na comparação e travariam a chave.
+    """
+    chave = (-(1 << 62), "", -1)
+    while True:
+        cur.execute(f"""
+            SELECT id, data, {_CENTAVOS}, descricao FROM gastos
+            WHERE data IS NOT NULL
+              AND {_CENTAVOS} >= ? AND ({_CENTAVOS} > ? OR data > ? OR (data = ? AND id > ?))
+            ORDER BY {_CENTAVOS}, data, id
+            LIMIT ?
+        """, (chave[0], chave[0], chave[1], chave[1], chave[2], lote))
+        ultima = None
+        for ultima in cur:  # sem fetchall: memória de uma linha por vez
+            yield ultima
+        if ultima is None:
+            return
+        gid, dt, centavos, _ = ultima
+        chave = (centavos, dt, gid)
+
+def verificar_duplicados(dias: int = 3, lote: int = 5000) -> int:
+    """
+    Varredura completa (rodar em segundo plano): mesmo valor, datas a até `dias`
+    de distância e descrições parecidas. Percorre os gastos ordenados por valor
+    guardando só a janela atual — memória constante.
+    Só as gravações abrem transação (curtas); a leitura vai em lotes sem lock de escrita.
+    Retorna quantos novos suspeitos foram sinalizados.
+    """
+    conn = conectar()
+    cur = conn.cursor()
+    preencher_impressoes(cur)
+    cur.execute("""
+        DELETE FROM gastos_duplicados
+        WHERE gasto_id NOT IN (SELECT id FROM gastos) OR original_id NOT IN (SELECT id FROM gastos)
+    """)
+    conn.commit()
+
+    janela = deque()
+    achados = []
+    for gid, dt, centavos, desc in _lotes_por_valor(conn.cursor(), lote):
+        try:
+            d = date.fromisoformat(dt)
+        except (TypeError, ValueError):
+            continue
+        while janela and (janela[0][2] != centavos or (d - janela[0][1]).days > dias):
+            janela.popleft()
+        for oid, od, _, odesc in janela:
+            if _descricoes_parecidas(desc, odesc):
+                motivo = "idêntico" if od == d and normalizar_descricao(desc) == normalizar_descricao(odesc) \
+                    else f"mesmo valor, {(d - od).days} dia(s) de diferença"
+                achados.append((gid, oid, motivo))
+                break
+        janela.append((gid, d, centavos, desc))
+
+    antes = conn.total_changes
+    cur.executemany(
+        "INSERT OR IGNORE INTO gastos_duplicados (gasto_id, original_id, motivo) VALUES (?,?,?)",
+        achados
+    )
+    novos = conn.total_changes - antes
+    conn.commit()
+    conn.close()
+    return novos
+
+def contar_duplicados() -> int:
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(CONSULTAS["contar_duplicados"])
+    n = cur.fetchone()[0]
+    conn.close()
+    return n
+
+# ======================
+# CLASSIFICADOR
+# ======================
+def tokens_descricao(desc: str, normalizada: bool = False):
+    """Palavras úteis da descrição + a descrição inteira (acerta de cara lojas já vistas)."""
+    norm = desc if normalizada else normalizar_descricao(desc)
+    if not norm:
+        return []
+    toks = [t for t in norm.split() if len(t) > 1 and not t.isdigit()]
+    return toks + ["=" + norm]
+
+class ClassificadorCategorias:
+    """
+    Naive Bayes multinomial: descrição -> categoria.
+    - Contagens ficam no banco (classificador_tokens/classificador_categorias)
+      e numa cópia em memória para classificar rápido.
+    - treinar() ajusta as duas a cada inserção/edição/remoção (peso +1/-1);
+      a cópia em memória só muda quando a transação do chamador é confirmada.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.tokens = {}      # token -> {categoria: n}
+        self.docs = {}        # categoria -> nº de gastos
+        self.total_tok = {}   # categoria -> nº de tokens
+
+    def carregar(self):
+        conn = conectar()
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM classificador_categorias")
+        if cur.fetchone()[0] == 0:
+            self._treinar_tudo(cur)
+            conn.commit()
+        with self._lock:
+            self.tokens.clear()
+            self.docs.clear()
+            self.total_tok.clear()
+            cur.execute("SELECT categoria, docs, tokens FROM classificador_categorias")
+            for cat, docs, ntok in cur:
+                self.docs[cat] = docs
+                self.total_tok[cat] = ntok
+            cur.execute("SELECT token, categoria, n FROM classificador_tokens")
+            for tok, cat, n in cur:
+                self.tokens.setdefault(tok, {})[cat] = n
+        conn.close()
+        return self
+
+    def _treinar_tudo(self, cur):
+        """Primeira execução: aprende com todos os gastos já lançados (contagem em memória, gravação em lote)."""
+        tokens, docs, ntok = {}, {}, {}
+        leitura = cur.connection.cursor()
+        leitura.execute("SELECT categoria, descricao FROM gastos WHERE categoria IS NOT NULL")
+        for cat, desc in leitura:
+            toks = tokens_descricao(desc)
+            if not toks:
+                continue
+            docs[cat] = docs.get(cat, 0) + 1
+            ntok[cat] = ntok.get(cat, 0) + len(toks)
+            for t in toks:
+                tokens[(t, cat)] = tokens.get((t, cat), 0) + 1
+        cur.executemany(
+            "INSERT INTO classificador_tokens (token, categoria, n) VALUES (?,?,?)",
+            [(t, c, n) for (t, c), n in tokens.items()]
+        )
+        cur.executemany(
+            "INSERT INTO classificador_categorias (categoria, docs, tokens) VALUES (?,?,?)",
+            [(c, docs[c], ntok[c]) for c in docs]
+        )
+
+    def treinar(self, cur, descricao: str, categoria: str, peso: int = 1):
+        toks = tokens_descricao(descricao)
+        if not toks or not categoria:
+            return
+        cur.execute("""
+            INSERT INTO classificador_categorias (categoria, docs, tokens) VALUES (?,?,?)
+            ON CONFLICT(categoria) DO UPDATE SET docs = docs + excluded.docs, tokens = tokens + excluded.tokens
+        """, (categoria, peso, peso * len(toks)))
+        cur.executemany("""
+            INSERT INTO classificador_tokens (token, categoria, n) VALUES (?,?,?)
+            ON CONFLICT(token, categoria) DO UPDATE SET n = n + excluded.n
+        """, [(t, categoria, peso) for t in toks])
+        if peso < 0:
+            cur.execute(
+                f"DELETE FROM classificador_tokens WHERE categoria=? AND token IN ({','.join('?' * len(toks))}) AND n <= 0",
+                (categoria, *toks)
+            )
+
+        pendentes = getattr(cur.connection, "ao_confirmar", None)
+        if pendentes is None:  # conexão sem commit observável (scripts): aplica já
+            self._aplicar(toks, categoria, peso)
+        else:
+            pendentes.append(lambda: self._aplicar(toks, categoria, peso))
+
+    def _aplicar(self, toks, categoria: str, peso: int):
+        with self._lock:
+            self.docs[categoria] = self.docs.get(categoria, 0) + peso
+            self.total_tok[categoria] = self.total_tok.get(categoria, 0) + peso * len(toks)
+            for t in toks:
+                por_cat = self.tokens.setdefault(t, {})
+                n = por_cat.get(categoria, 0) + peso
+                if n > 0:
+                    por_cat[categoria] = n
+                else:
+                    por_cat.pop(categoria, None)
+                    if not por_cat:
+                        del self.tokens[t]
+
+    def classificar(self, descricao: str, categorias=None, normalizada: bool = False):
+        """(categoria, confiança 0..1) ou (None, 0.0) se não houver pista."""
+        toks = tokens_descricao(descricao, normalizada)
+        with self._lock:
+            conhecidos = [self.tokens[t] for t in toks if t in self.tokens]
+            cats = [c for c in (categorias or self.docs) if self.docs.get(c, 0) > 0]
+            if not conhecidos or not cats:
+                return None, 0.0
+            vocab = max(len(self.tokens), 1)
+            total_docs = sum(self.docs[c] for c in cats)
+            k = len(conhecidos)
+            # log P(c) + soma log((n+1)/den): o termo do denominador é igual para todo token,
+            # e log(0+1)=0 — então só as categorias que aparecem no token somam algo.
+            scores = {
+                c: math.log(self.docs[c] / total_docs) - k * math.log(self.total_tok.get(c, 0) + vocab)
+                for c in cats
+            }
+            for por_cat in conhecidos:
+                for c, n in por_cat.items():
+                    if c in scores:
+                        scores[c] += math.log(n + 1)
+        melhor = max(scores, key=scores.get)
+        # softmax só para ter uma noção de confiança
+        m = scores[melhor]
+        soma = sum(math.exp(v - m) for v in scores.values())
+        return melhor, 1.0 / soma
+
+    def classificar_lote(self, descricoes, categorias=None):
+        """Para importações: descrições repetidas (muito comum em extratos) são calculadas uma vez."""
+        memo = {}
+        out = []
+        for d in descricoes:
+            chave = normalizar_descricao(d)
+            if chave not in memo:
+                memo[chave] = self.classificar(chave, categorias, normalizada=True)
+            out.append(memo[chave])
+        return out
+
+_classificadores = {}
+_classificadores_lock = threading.Lock()
+
+def obter_classificador() -> ClassificadorCategorias:
+    """Um classificador por banco, carregado na primeira vez que for usado."""
+    with _classificadores_lock:
+        clf = _classificadores.get(caminho_banco())
+        if clf is None:
+            clf = ClassificadorCategorias().carregar()
+            _classificadores[caminho_banco()] = clf
+        return clf
+
+# ======================
+# IMPORTAÇÃO (OFX/QIF)
+# ======================
+_TAG_OFX = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+def _encoding_ofx(path: str) -> str:
+    with open(path, "rb") as f:
+        cab = f.read(4096)
+    m = re.search(rb'encoding="([^"]+)"', cab)
+    if m:
+        return m.group(1).decode("ascii", "ignore") or "utf-8"
+    if re.search(rb"ENCODING:\s*UTF-?8", cab, re.I):
+        return "utf-8"
+    return "cp1252"  # OFX SGML dos bancos brasileiros (CHARSET:1252)
+
+def _valor_extrato(txt: str) -> float:
+    """'-1.234,56', '-1,234.56', '-12,5', '+30.00' -> float"""
+    t = txt.strip().replace(" ", "")
+    if "," in t and "." in t:
+        if t.rfind(",") > t.rfind("."):
+            t = t.replace(".", "").replace(",", ".")
+        else:
+            t = t.replace(",", "")
+    else:
+        t = t.replace(",", ".")
+    return float(t)
+
+def _data_qif(txt: str) -> str:
+    """QIF dos bancos daqui vem DD/MM/AAAA; aceita também DD/MM'AA e DD-MM-AA."""
+    partes = re.split(r"[/'\-.]", txt.strip())
+    d, m, a = (int(x) for x in partes[:3])
+    if a < 100:
+        a += 2000 if a < 70 else 1900
+    return date(a, m, d).isoformat()
+
+def _descricao_extrato(nome: str, memo: str) -> str:
+    nome, memo = (nome or "").strip(), (memo or "").strip()
+    if nome and memo and normalizar_descricao(memo) not in normalizar_descricao(nome):
+        return f"{nome} - {memo}"
+    return nome or memo
+
+def ler_ofx(path: str, bloco: int = 64 * 1024):
+    """
+    Lê OFX (SGML 1.x ou XML 2.x) em blocos, sem montar a árvore do arquivo.
+    Gera dicts: data, valor (negativo = saída), descricao, fitid, cartao, moeda.
+    A moeda é a CURDEF do extrato, ou a de <CURRENCY> da transação (o valor vem nela);
+    <ORIGCURRENCY> é só informativo (o valor já está na CURDEF).
+    """
+    with open(path, "r", encoding=_encoding_ofx(path), errors="replace") as f:
+        resto = ""
+        trn = None
+        conta = ""
+        cartao = False
+        moeda = MOEDA_BASE
+        agregado = None   # CURRENCY ou ORIGCURRENCY aberto dentro da transação
+
+        def fechar(t):
+            try:
+                return {
+                    "data": date(int(t["DTPOSTED"][:4]), int(t["DTPOSTED"][4:6]), int(t["DTPOSTED"][6:8])).isoformat(),
+                    "valor": _valor_extrato(t["TRNAMT"]),
+                    "descricao": _descricao_extrato(t.get("NAME"), t.get("MEMO")),
+                    "fitid": f"{conta}:{t['FITID']}" if t.get("FITID") else None,
+                    "cartao": cartao,
+                    "moeda": t.get("MOEDA") or moeda,
+                }
+            except (KeyError, ValueError):
+                return None  # transação incompleta: ignora
+
+        while True:
+            pedaco = f.read(bloco)
+            buf = resto + pedaco
+            corte = buf.rfind("<") if pedaco else len(buf)
+            if corte < 0:
+                resto = buf
+                continue
+            resto = buf[corte:]
+            for fechamento, tag, texto in _TAG_OFX.findall(buf[:corte]):
+                tag = tag.upper()
+                if not fechamento:
+                    if tag == "STMTTRN":
+                        if trn:
+                            r = fechar(trn)  # SGML malformado sem </STMTTRN>
+                            if r:
+                                yield r
+                        trn = {}
+                        agregado = None
+                    elif tag == "CCSTMTRS":
+                        cartao = True
+                    elif tag == "STMTRS":
+                        cartao = False
+                    elif tag == "ACCTID":
+                        conta = texto.strip()
+                    elif tag == "CURDEF" and trn is None:
+                        moeda = texto.strip().upper() or MOEDA_BASE
+                    elif tag in ("CURRENCY", "ORIGCURRENCY"):
+                        agregado = tag
+                    elif tag == "CURSYM" and trn is not None:
+                        if agregado == "CURRENCY":
+                            trn["MOEDA"] = texto.strip().upper()
+                    elif trn is not None and texto.strip():
+                        trn[tag] = html.unescape(texto.strip())
+                elif tag == "STMTTRN" and trn is not None:
+                    r = fechar(trn)
+                    if r:
+                        yield r
+                    trn = None
+            if not pedaco:
+                break
+
+def _linha_qif(bruta: bytes) -> str:
+    """UTF-8 se for válido; senão cp1252 (QIF de banco brasileiro). Decide linha a linha."""
+    try:
+        linha = bruta.decode("utf-8")
+    except UnicodeDecodeError:
+        linha = bruta.decode("cp1252", errors="replace")
+    return linha.rstrip("\r\n").lstrip("\ufeff")
+
+def ler_qif(path: str):
+    """Lê QIF linha a linha. Mesmo formato de saída de ler_ofx (sem fitid)."""
+    with open(path, "rb") as f:
+        cartao = False
+        reg = {}
+        for bruta in f:
+            linha = _linha_qif(bruta)
+            if not linha:
+                continue
+            if linha.startswith("!"):
+                cartao = linha.lower().startswith("!type:ccard")
+                continue
+            cod, val = linha[0], linha[1:]
+            if cod == "^":
+                try:
+                    yield {
+                        "data": _data_qif(reg["D"]),
+                        "valor": _valor_extrato(reg.get("T") or reg["U"]),
+                        "descricao": _descricao_extrato(reg.get("P"), reg.get("M")),
+                        "fitid": None,
+                        "cartao": cartao,
+                        "moeda": MOEDA_BASE,
+                    }
+                except (KeyError, ValueError, IndexError):
+                    pass
+                reg = {}
+            else:
+                reg[cod] = val
+
+def importar_extrato(path: str, lote: int = 1000) -> dict:
+    """
+    Importa OFX/QIF: saídas viram gastos (categoria pelo classificador), entradas viram receitas.
+    - Grava em transações de `lote` linhas: memória limitada mesmo em extratos de anos.
+    - FITID repetido é ignorado (índice único). Sem FITID (QIF), a impressão digital
+      igual a um gasto que já existia antes da importação também é ignorada.
+    - Em extratos de cartão, créditos (pagamento da fatura/estorno) não são receita.
+    - Gastos entram por inserir_gasto (anomalias, câmbio). Lançamentos em ano arquivado
+      ou em moeda sem cotação ficam de fora e são contados (reimportar depois não duplica).
+    """
+    leitor = ler_qif if path.lower().endswith(".qif") else ler_ofx
+    clf = obter_classificador()
+    cont = {"gastos": 0, "receitas": 0, "duplicados": 0, "ignorados": 0, "arquivados": 0, "sem_cotacao": 0}
+
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(CONSULTAS["maior_id_gastos"])
+    max_antes = cur.fetchone()[0]
+    cur.execute(CONSULTAS["maior_id_receitas"])
+    max_receitas_antes = cur.fetchone()[0]
+    cur.execute(CONSULTAS["anos_arquivados"])
+    arquivados = {str(a) for a, _, _ in cur.fetchall()}
+
+    def gravar(trns):
+        fora = [t for t in trns if t["data"][:4] in arquivados]
+        cont["arquivados"] += len(fora)
+        trns = [t for t in trns if t["data"][:4] not in arquivados]
+        saidas = [t for t in trns if t["valor"] < 0]
+        cats = clf.classificar_lote([t["descricao"] for t in saidas], CATEGORIAS)
+        for t, (cat, conf) in zip(saidas, cats):
+            valor = -t["valor"]
+            imp = impressao_gasto(t["data"], valor, t["descricao"])
+            cur.execute(CONSULTAS["importado_por_impressao"], (imp, max_antes))
+            igual = cur.fetchone()
+            if igual and not t["fitid"]:
+                cont["duplicados"] += 1
+                continue
+            if t["fitid"] and cur.execute(CONSULTAS["gasto_por_fitid"], (t["fitid"],)).fetchone():
+                cont["duplicados"] += 1
+                continue
+            try:
+                gasto_id = inserir_gasto(
+                    cur, (cat if cat and conf >= 0.4 else "Outros"), valor, t["descricao"], t["data"],
+                    treinar=False, moeda=t["moeda"], fitid=t["fitid"]
+                )
+            except ValueError:
+                cont["sem_cotacao"] += 1
+                continue
+            cont["gastos"] += 1
+            if igual:
+                cur.execute(
+                    "INSERT OR IGNORE INTO gastos_duplicados (gasto_id, original_id, motivo) VALUES (?,?,?)",
+                    (gasto_id, igual[0], "importado igual a um gasto já lançado")
+                )
+
+        for t in trns:
+            if t["valor"] <= 0:
+                continue
+            if t["cartao"]:
+                cont["ignorados"] += 1
+                continue
+            try:
+                # receitas não guardam moeda: entram já em reais
+                t["valor"] = converter(cur, t["moeda"], t["valor"], t["data"])[0]
+            except ValueError:
+                cont["sem_cotacao"] += 1
+                continue
+            if not t["fitid"]:
+                cur.execute(
+                    CONSULTAS["receita_importada"], (t["data"], t["valor"], t["descricao"], max_receitas_antes)
+                )
+                if cur.fetchone():
+                    cont["duplicados"] += 1
+                    continue
+            cur.execute(
+                "INSERT OR IGNORE INTO receitas (categoria, valor, descricao, data, fitid) VALUES (?,?,?,?,?)",
+                ("Outros", t["valor"], t["descricao"], t["data"], t["fitid"])
+            )
+            if cur.rowcount:
+                cont["receitas"] += 1
+            else:
+                cont["duplicados"] += 1
+        conn.commit()
+
+    try:
+        pendentes = []
+        for t in leitor(path):
+            pendentes.append(t)
+            if len(pendentes) >= lote:
+                gravar(pendentes)
+                pendentes = []
+        if pendentes:
+            gravar(pendentes)
+    finally:
+        conn.close()
+    return cont
+
+# ======================
+# ANOMALIAS
+# ======================
+LIMIAR_Z = 3.0
+MIN_AMOSTRAS = 8  # antes disso a média/desvio ainda não dizem muito
+
+def _zscore(stats, x: float):
+    if not stats or stats[0] < MIN_AMOSTRAS:
+        return None
+    n, media, m2 = stats
+    variancia = m2 / (n - 1)
+    if variancia <= 0:
+        return None
+    return (x - media) / math.sqrt(variancia)
+
+def avaliar_anomalia(cur, categoria: str, valor: float, data: str):
+    """
+    Motivos (lista, vazia se normal) para um gasto que AINDA vai ser inserido:
+    - valor muitos desvios acima da média da categoria;
+    - o gasto faz o total do dia passar a ser atípico.
+    Só leituras por PK e a faixa do dia em idx_gastos_data_valor.
+    """
+    motivos = []
+    cur.execute(CONSULTAS["estatisticas_categoria"], (categoria or "",))
+    stats = cur.fetchone()
+    z = _zscore(stats, valor)
+    if z is not None and z >= LIMIAR_Z:
+        motivos.append(f"{z:.1f} desvios acima da média de {categoria} ({money(stats[1])})")
+
+    cur.execute(CONSULTAS["soma_do_dia"], (data,))
+    antes = float(cur.fetchone()[0])
+    cur.execute(CONSULTAS["estatisticas_categoria"], (CHAVE_DIA,))
+    stats = cur.fetchone()
+    z_depois = _zscore(stats, antes + valor)
+    if z_depois is not None and z_depois >= LIMIAR_Z:
+        z_antes = _zscore(stats, antes) if antes else None
+        # o dia só é sinalizado no gasto que o tornou atípico
+        if z_antes is None or z_antes < LIMIAR_Z:
+            motivos.append(f"dia atípico: {money(antes + valor)} em {br_date(data)}")
+    return motivos
+
+def anomalias_mes(mes: str):
+    """[(gasto_id, data, categoria, valor, motivo)] ainda não ignoradas."""
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(CONSULTAS["anomalias_mes"], faixa_mes(mes))
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def ignorar_anomalia(gasto_id: int):
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute("UPDATE gastos_anomalias SET ignorado=1 WHERE gasto_id=?", (gasto_id,))
+    conn.commit()
+    conn.close()
+
+# ======================
+# ORÇAMENTOS
+# ======================
+LIMIARES_ORCAMENTO = (0.8, 1.0)
+
+def obter_orcamentos() -> dict:
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(CONSULTAS["orcamentos"])
+    d = {cat: float(lim) for cat, lim in cur.fetchall()}
+    conn.close()
+    return d
+
+def salvar_orcamentos(limites: dict):
+    """{categoria: limite}; limite vazio/zero remove o orçamento da categoria."""
+    conn = conectar()
+    cur = conn.cursor()
+    for cat, lim in limites.items():
+        if lim and lim > 0:
+            cur.execute("""
+                INSERT INTO orcamentos (categoria, limite) VALUES (?, ?)
+                ON CONFLICT(categoria) DO UPDATE SET limite = excluded.limite
+            """, (cat, lim))
+        else:
+            cur.execute("DELETE FROM orcamentos WHERE categoria=?", (cat,))
+    conn.commit()
+    conn.close()
+
+def orcamentos_mes(mes: str):
+    """[(categoria, limite, gasto)]: um acesso por PK em categoria_mensal por orçamento."""
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(CONSULTAS["orcamentos_mes"], (mes,))
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def verificar_orcamento(cur, categoria: str, data: str, delta: float):
+    """
+    Chamada logo depois de uma escrita que somou `delta` ao gasto da categoria no mês.
+    O total já está em categoria_mensal (trigger), então são só dois acessos por PK.
+    Retorna o aviso do maior limiar cruzado (80% / 100%) ou None.
+    """
+    if delta <= 0:
+        return None
+    cur.execute(CONSULTAS["orcamento_categoria"], (data, categoria))
+    row = cur.fetchone()
+    if not row or row[0] <= 0:
+        return None
+    limite, atual = float(row[0]), float(row[1])
+    antes = atual - delta
+    cruzados = [l for l in LIMIARES_ORCAMENTO if antes < l * limite <= atual]
+    if not cruzados:
+        return None
+    if cruzados[-1] >= 1.0:
+        return f"{categoria}: orçamento de {money(limite)} estourado em {data[:7]} (gasto {money(atual)})."
+    return f"{categoria}: {atual / limite:.0%} do orçamento de {money(limite)} usado em {data[:7]}."
+
+# ======================
+# DIVISÕES E TAGS
+# ======================
+def ler_tags(texto: str):
+    """'viagem, Praia ,viagem' -> ['viagem', 'Praia'] (sem repetir, ignorando maiúsculas)."""
+    tags, vistas = [], set()
+    for t in (texto or "").split(","):
+        t = " ".join(t.split())
+        if t and t.lower() not in vistas:
+            vistas.add(t.lower())
+            tags.append(t)
+    return tags
+
+def obter_divisoes(cur, gasto_id: int):
+    """[(categoria, valor)] das partes do gasto."""
+    cur.execute(CONSULTAS["divisoes_por_gasto"], (gasto_id,))
+    return [(cat, float(val)) for cat, val in cur.fetchall()]
+
+def salvar_divisoes(cur, gasto_id: int, divisoes):
+    """
+    Troca as partes do gasto por `divisoes` [(categoria, valor)]. A categoria do gasto
+    fica com o resto, que precisa sobrar (ValueError se as partes cobrirem o valor todo).
+    Os triggers mantêm categoria_mensal.
+    """
+    cur.execute(CONSULTAS["valor_data_por_id"], (gasto_id,))
+    row = cur.fetchone()
+    if not row:
+        return
+    valor, data = float(row[0] or 0), row[1]
+    if any(v <= 0 for _, v in divisoes):
+        raise ValueError("Cada parte precisa de um valor positivo.")
+    if divisoes and sum(v for _, v in divisoes) > valor - 0.005:
+        raise ValueError(f"As partes somam mais que o gasto ({money(valor)}): a categoria principal fica sem nada.")
+    if obter_divisoes(cur, gasto_id) == [(c, round(float(v), 2)) for c, v in divisoes]:
+        return
+    cur.execute("DELETE FROM gastos_divisoes WHERE gasto_id=?", (gasto_id,))
+    cur.executemany(
+        "INSERT INTO gastos_divisoes (gasto_id, categoria, valor, data) VALUES (?, ?, ?, ?)",
+        [(gasto_id, c, round(float(v), 2), data) for c, v in divisoes]
+    )
+
+def obter_tags(cur, gasto_id: int):
+    cur.execute(CONSULTAS["tags_por_gasto"], (gasto_id,))
+    return [nome for (nome,) in cur.fetchall()]
+
+def salvar_tags(cur, gasto_id: int, nomes):
+    """Troca as tags do gasto; tags novas são criadas (o nome não diferencia maiúsculas)."""
+    cur.executemany("INSERT OR IGNORE INTO tags (nome) VALUES (?)", [(n,) for n in nomes])
+    marcas = ",".join("?" * len(nomes))
+    cur.execute(
+        f"DELETE FROM gastos_tags WHERE gasto_id=? AND tag_id NOT IN (SELECT id FROM tags WHERE nome IN ({marcas}))",
+        (gasto_id, *nomes)
+    )
+    if nomes:
+        cur.execute(f"""
+            INSERT OR IGNORE INTO gastos_tags (gasto_id, tag_id, data, valor)
+            SELECT g.id, t.id, g.data, g.valor FROM gastos g, tags t
+            WHERE g.id=? AND t.nome IN ({marcas})
+        """, (gasto_id, *nomes))
+
+def partes_gasto(cur, gasto_id: int) -> dict:
+    """{categoria: valor} que o gasto soma em cada categoria (resto + partes)."""
+    cur.execute(CONSULTAS["partes_gasto"], (gasto_id, gasto_id))
+    return {cat: float(v or 0) for cat, v in cur.fetchall()}
+
+def totais_tags(mes: str):
+    """[(tag, total, lançamentos)] do mês, do maior para o menor."""
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(CONSULTAS["totais_tags"], faixa_mes(mes))
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+# ======================
+# CÂMBIO (gastos em outras moedas)
+# ======================
+MOEDA_BASE = "BRL"
+MOEDAS = {"BRL": "R$", "USD": "US$", "EUR": "€"}   # símbolos; outras moedas aparecem pelo código
+
+def moedas_disponiveis(cur):
+    """As moedas conhecidas e as que já têm cotação importada."""
+    cur.execute(CONSULTAS["moedas_com_cotacao"])
+    return list(MOEDAS) + sorted(m for (m,) in cur.fetchall() if m not in MOEDAS)
+
+def taxa_cambio(cur, moeda: str, data: str) -> float:
+    """
+    Reais por unidade de `moeda` em `data`: a cotação do dia ou a última antes dele.
+    Em mês fechado valem as cotações congeladas no fechamento. ValueError se não houver cotação.
+    """
+    if moeda == MOEDA_BASE:
+        return 1.0
+    cur.execute(CONSULTAS["taxa_fechada"], (data[:7], moeda, data))
+    row = cur.fetchone() or cur.execute(CONSULTAS["taxa_em"], (moeda, data)).fetchone()
+    if not row:
+        raise ValueError(f"Sem cotação de {moeda} até {br_date(data)}. Importe as cotações em Câmbio.")
+    return float(row[0])
+
+def converter(cur, moeda: str, valor: float, data: str):
+    """-> (valor em reais, valor original, taxa); em reais os dois últimos são None."""
+    if moeda == MOEDA_BASE:
+        return valor, None, None
+    taxa = taxa_cambio(cur, moeda, data)
+    return round(valor * taxa, 2), valor, taxa
+
+def _numero_br(texto: str) -> float:
+    """'5,1234' ou '5.1234' (ou '1.234,56') -> float."""
+    texto = texto.strip()
+    if "," in texto:
+        texto = texto.replace(".", "").replace(",", ".")
+    return float(texto)
+
+def ler_cambio_csv(path: str):
+    """
+    CSV moeda;data;taxa (ou separado por vírgula) -> ([(moeda, data ISO, taxa)], linhas ignoradas).
+    Aceita cabeçalho, datas AAAA-MM-DD ou DD/MM/AAAA e vírgula decimal.
+    """
+    cotacoes, ignoradas = [], 0
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        amostra = f.readline()
+        f.seek(0)
+        for i, campos in enumerate(csv.reader(f, delimiter=";" if ";" in amostra else ",")):
+            if not any(c.strip() for c in campos):
+                continue
+            try:
+                moeda, dt, taxa = (c.strip() for c in campos[:3])
+                dt = iso_date(dt) if "/" in dt else date.fromisoformat(dt).isoformat()
+                taxa = _numero_br(taxa)
+            except ValueError:
+                if i:  # a primeira pode ser o cabeçalho
+                    ignoradas += 1
+                continue
+            moeda = moeda.upper()
+            if taxa <= 0 or not re.fullmatch(r"[A-Z]{3}", moeda) or moeda == MOEDA_BASE:
+                ignoradas += 1
+                continue
+            cotacoes.append((moeda, dt, taxa))
+    return cotacoes, ignoradas
+
+def reconverter_gastos(cur, desde: dict) -> int:
+    """
+    Reconverte os gastos em outra moeda dos meses abertos a partir de `desde`
+    {moeda: primeira data com cotação nova}. A cotação de cada gasto sai de um as-of join
+    (CONSULTAS["a_reconverter"], índice parcial de gastos + PK de cambio) e a gravação
+    é um UPDATE só; os triggers mantêm os agregados. As divisões acompanham a proporção.
+    """
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS reconversao (id INTEGER PRIMARY KEY, antigo REAL, valor REAL, taxa REAL)")
+    cur.execute("DELETE FROM temp.reconversao")
+    for moeda, data in desde.items():
+        cur.execute("INSERT INTO temp.reconversao (id, antigo, valor, taxa) " + CONSULTAS["a_reconverter"], (moeda, data))
+    cur.execute("SELECT COUNT(*) FROM temp.reconversao")
+    n = cur.fetchone()[0]
+    if n:
+        cur.execute("""
+            UPDATE gastos_divisoes SET valor = ROUND(valor * (
+                SELECT r.valor / r.antigo FROM temp.reconversao r WHERE r.id = gastos_divisoes.gasto_id
+            ), 2)
+            WHERE gasto_id IN (SELECT id FROM temp.reconversao WHERE antigo > 0)
+        """)
+        cur.execute("""
+            UPDATE gastos SET
+                valor = (SELECT r.valor FROM temp.reconversao r WHERE r.id = gastos.id),
+                taxa = (SELECT r.taxa FROM temp.reconversao r WHERE r.id = gastos.id)
+            WHERE id IN (SELECT id FROM temp.reconversao)
+        """)
+    cur.execute("DELETE FROM temp.reconversao")
+    return n
+
+def importar_cambio(path: str) -> dict:
+    """
+    Importa cotações de um CSV (sem rede) e, na mesma transação, reconverte os gastos
+    dos meses abertos que passam a ter outra cotação. Meses fechados não mudam.
+    """
+    cotacoes, ignoradas = ler_cambio_csv(path)
+    desde = {}
+    for moeda, dt, _ in cotacoes:
+        desde[moeda] = min(desde.get(moeda, dt), dt)
+
+    conn = conectar()
+    cur = conn.cursor()
+    try:
+        cur.executemany("INSERT OR REPLACE INTO cambio (moeda, data, taxa) VALUES (?, ?, ?)", cotacoes)
+        reconvertidos = reconverter_gastos(cur, desde)
+        conn.commit()
+    finally:
+        conn.close()
+    return {"cotacoes": len(cotacoes), "ignoradas": ignoradas, "moedas": sorted(desde), "reconvertidos": reconvertidos}
+
+# ======================
+# ANEXOS (comprovantes)
+# ======================
+ANEXOS_BLOCO = 1 << 20                      # leitura/cópia em blocos de 1 MB
+ANEXOS_CARENCIA = timedelta(hours=1)        # arquivo sem gasto mais novo que isso fica (commit em andamento)
+MINIATURA_PX = 96
+MINIATURAS_BYTES = 32 * 1024 * 1024         # teto da pasta de miniaturas (LRU por data de uso)
+MINIATURAS_MEMORIA = 256                    # miniaturas prontas guardadas na memória
+FILTRO_ANEXOS = "Comprovantes (*.jpg *.jpeg *.png *.webp *.bmp *.gif *.pdf);;Todos os arquivos (*)"
+
+def pasta_anexos(caminho: str = None) -> str:
+    return (caminho or caminho_banco()) + ".anexos"
+
+def pasta_miniaturas(caminho: str = None) -> str:
+    return (caminho or caminho_banco()) + ".miniaturas"
+
+def caminho_blob(hash_: str, caminho: str = None) -> str:
+    """.anexos/ab/cdef...: duas letras de prefixo para nenhuma pasta ficar gigante."""
+    return os.path.join(pasta_anexos(caminho), hash_[:2], hash_[2:])
+
+def guardar_blob(origem: str) -> dict:
+    """
+    Copia o arquivo para o repositório calculando o sha256 na mesma passada.
+    Conteúdo que já existe não é copiado de novo. -> {"hash", "nome", "bytes"}
+    """
+    pasta = pasta_anexos()
+    os.makedirs(pasta, exist_ok=True)
+    h = hashlib.sha256()
+    n = 0
+    fd, tmp = tempfile.mkstemp(dir=pasta, suffix=".tmp")
+    try:
+        with open(origem, "rb") as f, os.fdopen(fd, "wb") as dst:
+            while True:
+                bloco = f.read(ANEXOS_BLOCO)
+                if not bloco:
+                    break
+                h.update(bloco)
+                dst.write(bloco)
+                n += len(bloco)
+        hash_ = h.hexdigest()
+        destino = caminho_blob(hash_)
+        if os.path.exists(destino):
+            os.remove(tmp)
+            os.utime(destino)  # a carência da limpeza conta a partir do uso mais recente
+        else:
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            os.replace(tmp, destino)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return {"hash": hash_, "nome": os.path.basename(origem), "bytes": n}
+
+def registrar_anexos(cur, gasto_id: int, blobs):
+    """Liga ao gasto os arquivos já guardados por guardar_blob (o mesmo conteúdo duas vezes vira um só)."""
+    agora = datetime.now().isoformat(timespec="seconds")
+    cur.executemany(
+        "INSERT OR IGNORE INTO anexos (gasto_id, hash, nome, bytes, criado_em) VALUES (?, ?, ?, ?, ?)",
+        [(gasto_id, b["hash"], b["nome"], b["bytes"], agora) for b in blobs]
+    )
+
+def listar_anexos(cur, gasto_id: int):
+    """[(id, hash, nome, bytes)] dos comprovantes do gasto."""
+    cur.execute(CONSULTAS["anexos_por_gasto"], (gasto_id,))
+    return cur.fetchall()
+
+def remover_anexo(cur, anexo_id: int):
+    """Desliga o comprovante do gasto; o arquivo sai depois, na limpeza, se ninguém mais usar."""
+    cur.execute("DELETE FROM anexos WHERE id=?", (anexo_id,))
+
+def abrir_anexo(hash_: str, nome: str) -> str:
+    """Cópia temporária com o nome original (o repositório não guarda extensão) para abrir no app do sistema."""
+    destino = os.path.join(tempfile.gettempdir(), f"virtum_{hash_[:12]}_{os.path.basename(nome or 'anexo')}")
+    if not os.path.exists(destino):
+        shutil.copyfile(caminho_blob(hash_), destino)
+    return destino
+
+def _hashes_em_backups() -> set:
+    """Comprovantes citados pelos backups mantidos: restaurar um deles não pode achar o arquivo apagado."""
+    hashes = set()
+    for backup in listar_backups():
+        try:
+            conn = conectar_leitura(backup)
+            try:
+                hashes.update(h for (h,) in conn.execute("SELECT DISTINCT hash FROM anexos"))
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            continue  # backup de antes dos comprovantes (ou ilegível): não cita nenhum
+    return hashes
+
+def limpar_anexos(carencia: timedelta = ANEXOS_CARENCIA) -> dict:
+    """
+    Apaga do repositório os arquivos que nenhum gasto usa mais (e os .tmp abandonados).
+    Os .anexos/ ficam fora do backup, então o que algum backup mantido ainda cita fica também.
+    """
+    pasta = pasta_anexos()
+    removidos = liberados = 0
+    if not os.path.isdir(pasta):
+        return {"removidos": 0, "bytes": 0}
+    limite = time.time() - carencia.total_seconds()
+    em_backups = _hashes_em_backups()
+    conn = conectar()
+    cur = conn.cursor()
+    for prefixo in os.scandir(pasta):
+        if prefixo.is_file() and prefixo.name.endswith(".tmp") and prefixo.stat().st_mtime < limite:
+            os.remove(prefixo.path)
+            continue
+        if not prefixo.is_dir() or len(prefixo.name) != 2:
+            continue
+        for arq in os.scandir(prefixo.path):
+            st = arq.stat()
+            hash_ = prefixo.name + arq.name
+            if st.st_mtime >= limite or hash_ in em_backups:
+                continue
+            cur.execute(CONSULTAS["anexo_por_hash"], (hash_,))
+            if cur.fetchone() is None:
+                os.remove(arq.path)
+                removidos += 1
+                liberados += st.st_size
+    conn.close()
+    return {"removidos": removidos, "bytes": liberados}
+
+def gerar_miniatura(blob: str, destino: str, px: int = MINIATURA_PX) -> QImage:
+    """
+    Miniatura PNG de uma imagem (decodificada já reduzida) ou da 1ª página de um PDF.
+    Só usa QImage: pode rodar fora da thread da UI. Formato desconhecido -> QImage nula.
+    """
+    with open(blob, "rb") as f:
+        pdf = f.read(5) == b"%PDF-"
+    if pdf:
+        if not HAS_PDF:
+            return QImage()
+        doc = QPdfDocument()
+        doc.load(blob)
+        if doc.pageCount() < 1:
+            return QImage()
+        tam = doc.pagePointSize(0).toSize().scaled(px, px, Qt.KeepAspectRatio)
+        img = doc.render(0, tam)
+        doc.close()
+    else:
+        leitor = QImageReader(blob)
+        leitor.setAutoTransform(True)
+        tam = leitor.size()
+        if tam.isValid():
+            leitor.setScaledSize(tam.scaled(px, px, Qt.KeepAspectRatio))
+        img = leitor.read()
+    if img.isNull():
+        return img
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    tmp = destino + ".tmp"
+    img.save(tmp, "PNG")
+    os.replace(tmp, destino)
+    return img
+
+class _SinaisMiniatura(QObject):
+    concluida = Signal(str, QImage)
+
+class _GerarMiniatura(QRunnable):
+    def __init__(self, dono, hash_: str, caminho: str):
+        super().__init__()
+        self.dono = dono
+        self.hash = hash_
+        self.caminho = caminho
+        self.sinais = _SinaisMiniatura()
+        self.sinais.concluida.connect(dono._concluida)
+
+    def run(self):
+        destino = os.path.join(pasta_miniaturas(self.caminho), f"{self.hash}.png")
+        img = QImage()
+        try:
+            if os.path.exists(destino):
+                os.utime(destino)  # LRU: data de uso
+                img = QImage(destino)
+            else:
+                img = gerar_miniatura(caminho_blob(self.hash, self.caminho), destino)
+                if not img.isNull():
+                    self.dono._gravou(self.caminho, os.path.getsize(destino))
+        except OSError:
+            pass  # arquivo sumiu ou pasta sem permissão: fica sem miniatura
+        self.sinais.concluida.emit(self.hash, img)
+
+class Miniaturas(QObject):
+    """
+    Miniaturas dos comprovantes, sob demanda:
+    - memória: LRU de QPixmap (MINIATURAS_MEMORIA);
+    - disco: <banco>.miniaturas/<hash>.png, podada pela data de uso acima de MINIATURAS_BYTES;
+    - o que falta é gerado no QThreadPool e avisado por `pronta(hash)`.
+    """
+    pronta = Signal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._memoria = OrderedDict()   # hash -> QPixmap (None: não dá para gerar)
+        self._pendentes = set()
+        self._bytes = {}                # pasta -> bytes em disco (estimativa; recontada ao podar)
+        self._lock = threading.Lock()
+
+    def obter(self, hash_: str):
+        """QPixmap pronta, ou None (e a geração é pedida em segundo plano)."""
+        if hash_ in self._memoria:
+            self._memoria.move_to_end(hash_)
+            return self._memoria[hash_]
+        if hash_ not in self._pendentes:
+            self._pendentes.add(hash_)
+            QThreadPool.globalInstance().start(_GerarMiniatura(self, hash_, caminho_banco()))
+        return None
+
+    def _concluida(self, hash_: str, img: QImage):
+        self._pendentes.discard(hash_)
+        self._memoria[hash_] = QPixmap.fromImage(img) if not img.isNull() else None
+        while len(self._memoria) > MINIATURAS_MEMORIA:
+            self._memoria.popitem(last=False)
+        if not img.isNull():
+            self.pronta.emit(hash_)
+
+    def _gravou(self, caminho: str, n: int):
+        """Chamado pelas threads do pool a cada miniatura nova gravada."""
+        pasta = pasta_miniaturas(caminho)
+        with self._lock:
+            if pasta not in self._bytes:
+                self._bytes[pasta] = sum(e.stat().st_size for e in os.scandir(pasta) if e.is_file())
+            else:
+                self._bytes[pasta] += n
+            if self._bytes[pasta] > MINIATURAS_BYTES:
+                self._bytes[pasta] = podar_miniaturas(pasta)
+
+def podar_miniaturas(pasta: str, limite: int = MINIATURAS_BYTES) -> int:
+    """Apaga as menos usadas até ficar em 80% do limite. -> bytes que ficaram"""
+    arquivos = sorted(
+        ((e.stat().st_mtime, e.stat().st_size, e.path) for e in os.scandir(pasta) if e.is_file()),
+        reverse=True
+    )
+    total = 0
+    for _, tam, caminho in arquivos:
+        if total + tam > limite * 0.8:
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+            continue
+        total += tam
+    return total
+
+# ======================
+# ARQUIVO (anos fechados)
+# ======================
+def pasta_arquivo() -> str:
+    return caminho_banco() + ".arquivo"
+
+def _arquivo_ano(ano: int) -> str:
+    return os.path.join(pasta_arquivo(), f"gastos_{ano}.db.gz")
+
+def _cache_arquivo(ano: int) -> str:
+    """Cópia descompactada (temporária) do ano; refeita quando o .gz muda."""
+    chave = hashlib.blake2b(os.path.abspath(caminho_banco()).encode(), digest_size=6).hexdigest()
+    pasta = os.path.join(tempfile.gettempdir(), "virtum_arquivo", chave)
+    os.makedirs(pasta, exist_ok=True)
+    return os.path.join(pasta, f"gastos_{ano}.db")
+
+def _descompactar(origem: str, destino: str):
+    tmp = f"{destino}.{threading.get_ident()}.tmp"  # o prefetch pode descompactar em paralelo
+    with gzip.open(origem, "rb") as fi, open(tmp, "wb") as fo:
+        shutil.copyfileobj(fi, fo, 1 << 20)
+    os.replace(tmp, destino)
+
+def anexar_arquivos(cur, anos) -> list:
+    """
+    ATTACH dos anos arquivados pedidos (cópia descompactada) e cria a view temporária
+    gastos_historico = gastos do banco + gastos desses anos. Sem nada arquivado
+    a view é só o banco principal. Precisa rodar fora de transação.
+    """
+    anos = sorted(set(anos))
+    arquivados = []
+    if anos:
+        cur.execute(f"SELECT ano FROM arquivos WHERE ano IN ({','.join('?' * len(anos))})", anos)
+        arquivados = [r[0] for r in cur.fetchall()]
+    anexados = {r[1] for r in cur.execute("PRAGMA database_list")}
+
+    colunas = "id, categoria, valor, descricao, data, moeda, valor_original"
+    partes = [f"SELECT {colunas} FROM main.gastos"]
+    for ano in arquivados:
+        nome = f"arq_{ano}"
+        if nome not in anexados:
+            gz, local = _arquivo_ano(ano), _cache_arquivo(ano)
+            if not os.path.exists(gz):
+                continue
+            if not os.path.exists(local) or os.path.getmtime(local) < os.path.getmtime(gz):
+                _descompactar(gz, local)
+            cur.execute("ATTACH DATABASE ? AS " + nome, (local,))
+        cur.execute(f"PRAGMA {nome}.table_info(gastos)")
+        if "moeda" in [c[1] for c in cur.fetchall()]:
+            partes.append(f"SELECT {colunas} FROM {nome}.gastos")
+        else:  # arquivado antes das moedas: tudo em reais
+            partes.append(f"SELECT id, categoria, valor, descricao, data, 'BRL', NULL FROM {nome}.gastos")
+    cur.execute("DROP VIEW IF EXISTS temp.gastos_historico")
+    cur.execute("CREATE TEMP VIEW gastos_historico AS " + " UNION ALL ".join(partes))
+    return arquivados
+
+def conectar_historico(anos):
+    """Conexão com os anos arquivados pedidos já anexados (para consultas históricas)."""
+    conn = conectar()
+    anexar_arquivos(conn.cursor(), anos)
+    return conn
+
+def anos_arquivaveis():
+    """
+    [(ano, linhas, total)] de anos anteriores ao atual com gastos no banco principal
+    e todos os meses fechados (um resumo para cada mês com gasto).
+    """
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(CONSULTAS["anos_arquivaveis"], (f"{date.today().year}-01",))
+    rows = [(int(a), n, float(t or 0)) for a, n, t in cur.fetchall()]
+    conn.close()
+    return rows
+
+def anos_arquivados():
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(CONSULTAS["anos_arquivados"])
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def mes_arquivado(mes: str) -> bool:
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(CONSULTAS["ano_arquivado"], (int(mes[:4]),))
+    r = cur.fetchone() is not None
+    conn.close()
+    return r
+
+def arquivar_ano(ano: int) -> dict:
+    """
+    Move os gastos de um ano fechado para <banco>.arquivo/gastos_<ano>.db.gz.
+    1) copia (ou junta, se o ano já tinha arquivo) para um banco separado;
+    2) compacta e troca o .gz de forma atômica;
+    3) só então apaga do banco principal, com os triggers de DELETE desligados:
+       saldo_mensal, categoria_mensal e as estatísticas continuam valendo para o ano.
+    Se parar no meio, rodar de novo não duplica nada (INSERT OR REPLACE por id).
+    """
+    if ano not in [a for a, _, _ in anos_arquivaveis()]:
+        raise ValueError(f"{ano} não pode ser arquivado (ano atual ou com meses sem fechamento).")
+    inicio, fim = f"{ano:04d}-01-01", f"{ano + 1:04d}-01-01"
+    os.makedirs(pasta_arquivo(), exist_ok=True)
+    gz = _arquivo_ano(ano)
+    trabalho = gz[:-3] + ".tmp"
+    if os.path.exists(trabalho):
+        os.remove(trabalho)
+    if os.path.exists(gz):
+        _descompactar(gz, trabalho)
+
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute("ATTACH DATABASE ? AS arq", (trabalho,))
+    cur.execute("PRAGMA main.table_info(gastos)")
+    colunas = [(c[1], c[2]) for c in cur.fetchall()]
+    cur.execute("PRAGMA arq.table_info(gastos)")
+    existentes = {c[1] for c in cur.fetchall()}
+    if not existentes:
+        defs = ", ".join("id INTEGER PRIMARY KEY" if n == "id" else f"{n} {t}" for n, t in colunas)
+        cur.execute(f"CREATE TABLE arq.gastos ({defs})")
+        cur.execute("CREATE INDEX arq.idx_gastos_data_valor ON gastos(data, valor)")
+    else:
+        for n, t in colunas:
+            if n not in existentes:
+                cur.execute(f"ALTER TABLE arq.gastos ADD COLUMN {n} {t}")
+    nomes = ", ".join(n for n, _ in colunas)
+    cur.execute(
+        f"INSERT OR REPLACE INTO arq.gastos ({nomes}) SELECT {nomes} FROM main.gastos WHERE data >= ? AND data < ?",
+        (inicio, fim)
+    )
+    movidos = cur.rowcount
+    cur.execute("SELECT COUNT(*), COALESCE(SUM(valor), 0) FROM arq.gastos")
+    linhas, total = cur.fetchone()
+    conn.commit()
+    cur.execute("DETACH DATABASE arq")
+
+    with open(trabalho, "rb") as fi, gzip.open(gz + ".tmp", "wb", compresslevel=9) as fo:
+        shutil.copyfileobj(fi, fo, 1 << 20)
+    os.replace(gz + ".tmp", gz)
+    os.remove(trabalho)
+
+    cur.execute("UPDATE config SET arquivando=1 WHERE id=1")
+    cur.execute("""
+        DELETE FROM gastos_anomalias WHERE gasto_id IN (SELECT id FROM gastos WHERE data >= ? AND data < ?)
+    """, (inicio, fim))
+    cur.execute("""
+        DELETE FROM gastos_duplicados WHERE gasto_id IN (SELECT id FROM gastos WHERE data >= ? AND data < ?)
+    """, (inicio, fim))
+    cur.execute("DELETE FROM gastos WHERE data >= ? AND data < ?", (inicio, fim))
+    cur.execute("UPDATE config SET arquivando=0 WHERE id=1")
+    cur.execute("""
+        INSERT INTO arquivos (ano, linhas, total, criado_em) VALUES (?, ?, ?, ?)
+        ON CONFLICT(ano) DO UPDATE SET linhas=excluded.linhas, total=excluded.total, criado_em=excluded.criado_em
+    """, (ano, linhas, total, datetime.now().isoformat(timespec="seconds")))
+    # as linhas do dashboard desses meses agora vêm do arquivo
+    cur.execute("UPDATE saldo_mensal SET versao = versao + 1 WHERE mes >= ? AND mes < ?", (inicio[:7], fim[:7]))
+    conn.commit()
+    # o ano já está arquivado: um VACUUM barrado (outra conexão com lock) vira só aviso
+    aviso = None
+    try:
+        cur.execute("VACUUM")
+    except sqlite3.Error as e:
+        aviso = f"O espaço no disco não foi devolvido agora ({e}); a manutenção devolve depois."
+    conn.close()
+    return {"ano": ano, "movidos": movidos, "linhas": linhas, "bytes": os.path.getsize(gz), "aviso": aviso}
+
+# ======================
+# BACKUP
+# ======================
+BACKUPS_MANTIDOS = 7
+BACKUP_INTERVALO = timedelta(hours=24)
+BACKUP_REINICIOS = 3
+
+class _BackupReiniciando(Exception):
+    pass
+
+def pasta_backups() -> str:
+    return caminho_banco() + ".backups"
+
+def listar_backups():
+    """Caminhos dos backups, do mais novo para o mais antigo (o nome tem a data)."""
+    pasta = pasta_backups()
+    if not os.path.isdir(pasta):
+        return []
+    nomes = sorted((n for n in os.listdir(pasta) if n.startswith("gastos_") and n.endswith(".db")), reverse=True)
+    return [os.path.join(pasta, n) for n in nomes]
+
+def ultimo_backup():
+    """datetime do backup mais recente (ou None)."""
+    backups = listar_backups()
+    return datetime.fromtimestamp(os.path.getmtime(backups[0])) if backups else None
+
+def backup_vencido() -> bool:
+    ult = ultimo_backup()
+    return ult is None or datetime.now() - ult >= BACKUP_INTERVALO
+
+def fazer_backup(manter: int = BACKUPS_MANTIDOS, paginas: int = 256, pausa: float = 0.005) -> dict:
+    """
+    Cópia online do banco com a API de backup do SQLite, `paginas` por passo:
+    entre um passo e outro o banco fica livre para gravações (a UI não trava).
+    A cópia só entra na pasta depois de passar no integrity_check; mantém os
+    `manter` mais recentes. Os anos arquivados (.arquivo/) e os comprovantes (.anexos/,
+    que nunca mudam depois de gravados) são arquivos à parte e ficam fora da cópia.
+    """
+    os.makedirs(pasta_backups(), exist_ok=True)
+    destino = os.path.join(pasta_backups(), f"gastos_{datetime.now():%Y%m%d_%H%M%S}.db")
+    tmp = destino + ".tmp"
+    estado = {"passos": 0, "restantes": None, "reinicios": 0}
+
+    def progresso(status, restantes, total):
+        estado["passos"] += 1
+        # outra conexão gravou no meio: o SQLite recomeça a cópia do zero
+        if estado["restantes"] is not None and restantes > estado["restantes"]:
+            estado["reinicios"] += 1
+            if estado["reinicios"] > BACKUP_REINICIOS:
+                raise _BackupReiniciando()
+        estado["restantes"] = restantes
+
+    src = conectar()
+    dst = sqlite3.connect(tmp)
+    try:
+        try:
+            src.backup(dst, pages=paginas, progress=progresso, sleep=pausa)
+        except _BackupReiniciando:
+            # com gravações contínuas o passo a passo nunca termina: copia num passo só
+            # (as gravações esperam alguns milissegundos pelo lock, dentro do timeout)
+            src.backup(dst, pages=-1)
+        resultado = dst.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        dst.close()
+        src.close()
+    if resultado != "ok":
+        os.remove(tmp)
+        raise RuntimeError(f"Backup inválido (integrity_check: {resultado})")
+    os.replace(tmp, destino)
+
+    removidos = 0
+    for antigo in listar_backups()[manter:]:
+        os.remove(antigo)
+        removidos += 1
+    return {
+        "arquivo": destino, "bytes": os.path.getsize(destino),
+        "passos": estado["passos"], "reinicios": estado["reinicios"], "removidos": removidos,
+    }
+
+# ======================
+# PERFIS (um banco por perfil)
+# ======================
+PERFIL_PADRAO = "pessoal"
+PERFIS_QUENTES = 3   # perfis recentes que mantêm cache dos meses e conexão abertos
+_perfil_ativo = None
+_perfis_migrados = set()
+
+def pasta_dados() -> str:
+    """Pasta de dados do usuário; não depende de onde o app foi aberto."""
+    if os.environ.get("VIRTUM_DADOS"):
+        return os.environ["VIRTUM_DADOS"]
+    if sys.platform == "win32":
+        return os.path.join(os.environ.get("APPDATA") or os.path.expanduser("~"), "VirtumFinance")
+    if sys.platform == "darwin":
+        return os.path.expanduser("~/Library/Application Support/VirtumFinance")
+    base = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    return os.path.join(base, "virtum-finance")
+
+def pasta_perfis() -> str:
+    return os.path.join(pasta_dados(), "perfis")
+
+def caminho_perfil(slug: str) -> str:
+    return os.path.join(pasta_perfis(), f"{slug}.db")
+
+def _registro_perfis() -> str:
+    return os.path.join(pasta_dados(), "perfis.json")
+
+def _ler_perfis() -> dict:
+    try:
+        with open(_registro_perfis(), encoding="utf-8") as f:
+            reg = json.load(f)
+    except (FileNotFoundError, ValueError):
+        reg = {}
+    reg.setdefault("perfis", {})
+    reg.setdefault("ultimo", None)
+    return reg
+
+def _gravar_perfis(reg: dict):
+    tmp = _registro_perfis() + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(reg, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, _registro_perfis())
+
+def _copiar_banco(origem: str, destino: str):
+    """Cópia consistente (backup API: pega o WAL junto) e atômica."""
+    tmp = destino + ".tmp"
+    src = sqlite3.connect(origem)
+    dst = sqlite3.connect(tmp)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+    os.replace(tmp, destino)
+
+def preparar_perfis():
+    """
+    Garante a pasta de perfis. Na primeira vez, o gastos.db antigo (pasta atual)
+    é copiado para o perfil padrão junto com o arquivo de anos fechados;
+    o original fica onde está.
+    """
+    os.makedirs(pasta_perfis(), exist_ok=True)
+    reg = _ler_perfis()
+    if reg["perfis"] or any(f.endswith(".db") for f in os.listdir(pasta_perfis())):
+        return
+    destino = caminho_perfil(PERFIL_PADRAO)
+    if os.path.exists(DB_LEGADO) and not os.path.exists(destino):
+        _copiar_banco(DB_LEGADO, destino)
+        if os.path.isdir(DB_LEGADO + ".arquivo"):
+            shutil.copytree(DB_LEGADO + ".arquivo", destino + ".arquivo", dirs_exist_ok=True)
+        reg["legado"] = os.path.abspath(DB_LEGADO)
+    reg["perfis"][PERFIL_PADRAO] = "Pessoal"
+    reg["ultimo"] = PERFIL_PADRAO
+    _gravar_perfis(reg)
+
+def listar_perfis():
+    """[(slug, nome)]: os do registro e qualquer .db colocado à mão na pasta."""
+    nomes = dict(_ler_perfis()["perfis"])
+    if os.path.isdir(pasta_perfis()):
+        for f in os.listdir(pasta_perfis()):
+            if f.endswith(".db"):
+                nomes.setdefault(f[:-3], f[:-3])
+    return sorted(nomes.items(), key=lambda p: normalizar_descricao(p[1]))
+
+def criar_perfil(nome: str) -> str:
+    nome = (nome or "").strip()
+    slug = normalizar_descricao(nome).replace(" ", "-")
+    if not slug:
+        raise ValueError("Informe um nome para o perfil.")
+    if slug in dict(listar_perfis()):
+        raise ValueError(f"Já existe um perfil chamado '{nome}'.")
+    reg = _ler_perfis()
+    reg["perfis"][slug] = nome
+    _gravar_perfis(reg)
+    return slug
+
+def perfil_ativo():
+    return _perfil_ativo
+
+def ativar_perfil(slug: str = None) -> str:
+    """
+    Aponta DB_PATH para o banco do perfil (sem slug: o último usado).
+    A migração roda uma vez por banco neste processo.
+    """
+    global DB_PATH, _perfil_ativo
+    preparar_perfis()
+    reg = _ler_perfis()
+    perfis = dict(listar_perfis())
+    if slug is None:
+        slug = reg["ultimo"] if reg["ultimo"] in perfis else next(iter(perfis), PERFIL_PADRAO)
+    elif slug not in perfis:
+        raise ValueError(f"Perfil desconhecido: {slug}")
+
+    DB_PATH = caminho_perfil(slug)
+    _perfil_ativo = slug
+    if DB_PATH not in _perfis_migrados:
+        migrar_banco()
+        _perfis_migrados.add(DB_PATH)
+    if reg["ultimo"] != slug:
+        reg["ultimo"] = slug
+        _gravar_perfis(reg)
+    return slug
+
+def resumo_consolidado(mes: str):
+    """
+    O mês em todos os perfis: cada banco entra por ATTACH e uma consulta
+    UNION ALL lê o saldo_mensal de todos de uma vez.
+    -> [(perfil, salario, receitas, gastos, saldo, acumulado)]
+    """
+    perfis = [(s, n) for s, n in listar_perfis() if os.path.exists(caminho_perfil(s))]
+    conn = sqlite3.connect(":memory:")
+    limite = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)  # 10 por padrão: lotes só acima disso
+    linhas = []
+    for i in range(0, len(perfis), limite):
+        lote = perfis[i:i + limite]
+        partes, params = [], []
+        for j, (slug, nome) in enumerate(lote):
+            conn.execute(f"ATTACH DATABASE ? AS p{j}", (caminho_perfil(slug),))
+            if not conn.execute(f"SELECT 1 FROM p{j}.sqlite_master WHERE name='saldo_mensal'").fetchone():
+                continue  # perfil criado e nunca aberto
+            partes.append(CONSULTAS["saldo_consolidado"].format(banco=f"p{j}"))
+            params += [nome, mes, mes]
+        if partes:
+            linhas += conn.execute(" UNION ALL ".join(partes), params).fetchall()
+        for j in range(len(lote)):
+            conn.execute(f"DETACH DATABASE p{j}")
+    conn.close()
+    return [
+        (nome, sal, rec, gas, sal + rec - gas, float(acum or 0))
+        for nome, sal, rec, gas, acum in linhas
+    ]
+
+# ======================
+# RELATÓRIOS ANUAIS (HTML/XLSX, em paralelo)
+# ======================
+RELATORIO_VERSAO = 1   # mudou o layout: sobe o número e todos os anos são refeitos
+MESES_CURTOS = ["Jan", "Fev", "Mar", "Abr", "Mai", "Jun", "Jul", "Ago", "Set", "Out", "Nov", "Dez"]
+COR_ENTRADA, COR_GASTO, COR_BARRA = "#1E9E68", "#D94141", "#6C63FF"
+
+def pasta_relatorios(caminho: str = None) -> str:
+    return (caminho or caminho_banco()) + ".relatorios"
+
+def conectar_leitura(caminho: str):
+    """Conexão só de leitura (URI mode=ro): os processos do pool não travam o app."""
+    uri = pathlib.Path(os.path.abspath(caminho)).as_uri() + "?mode=ro"
+    return sqlite3.connect(uri, uri=True)
+
+def anos_relatorio(caminho: str = None):
+    conn = conectar_leitura(caminho or caminho_banco())
+    anos = [a for (a,) in conn.execute(CONSULTAS["anos_com_saldo"])]
+    conn.close()
+    return anos
+
+def chave_relatorio(cur, ano: int, perfil: str) -> str:
+    """
+    Hash do conteúdo dos agregados do ano (saldo_mensal + categoria_mensal).
+    Mesmo hash = mesmo relatório: o arquivo em disco é reaproveitado.
+    """
+    inicio, fim = f"{ano}-01", f"{ano + 1}-01"
+    h = hashlib.blake2b(f"{RELATORIO_VERSAO}|{perfil}|{ano}".encode(), digest_size=10)
+    cur.execute(CONSULTAS["saldo_mensal_periodo"], (inicio, fim))
+    h.update(repr(cur.fetchall()).encode())
+    cur.execute(CONSULTAS["categoria_mensal_periodo"], (inicio, fim))
+    h.update(repr(cur.fetchall()).encode())
+    return h.hexdigest()
+
+def _arquivos_relatorio(caminho: str, ano: int, chave: str) -> dict:
+    base = os.path.join(pasta_relatorios(caminho), f"relatorio_{ano}_{chave}")
+    return {"html": base + ".html", "xlsx": base + ".xlsx"}
+
+def _svg_barras_mes(meses) -> str:
+    """Entradas x gastos por mês (SVG inline: imprime nítido e não depende de Qt no processo filho)."""
+    larg, alt, topo, base = 720, 240, 12, 24
+    maximo = max([max(m["entradas"], m["gastos"]) for m in meses] + [1])
+    passo = larg / 12
+    barra = passo * 0.34
+    partes = [f'<svg viewBox="0 0 {larg} {alt}" width="100%" xmlns="http://www.w3.org/2000/svg">']
+    for i, m in enumerate(meses):
+        x = i * passo + passo * 0.14
+        for j, (v, cor) in enumerate(((m["entradas"], COR_ENTRADA), (m["gastos"], COR_GASTO))):
+            h = (alt - topo - base) * max(v, 0) / maximo
+            partes.append(
+                f'<rect x="{x + j * barra:.1f}" y="{alt - base - h:.1f}" width="{barra:.1f}" height="{h:.1f}" '
+                f'fill="{cor}"><title>{html.escape(money(v))}</title></rect>'
+            )
+        partes.append(
+            f'<text x="{i * passo + passo / 2:.1f}" y="{alt - 6}" font-size="11" text-anchor="middle" '
+            f'fill="#555">{MESES_CURTOS[i]}</text>'
+        )
+    partes.append(f'<line x1="0" y1="{alt - base}" x2="{larg}" y2="{alt - base}" stroke="#bbb"/></svg>')
+    return "".join(partes)
+
+def _svg_categorias(categorias) -> str:
+    linha, rotulo, larg = 22, 150, 720
+    alt = max(linha * len(categorias), linha)
+    maximo = max([t for _, t, _ in categorias] + [1])
+    partes = [f'<svg viewBox="0 0 {larg} {alt}" width="100%" xmlns="http://www.w3.org/2000/svg">']
+    for i, (cat, total, _) in enumerate(categorias):
+        y = i * linha
+        w = (larg - rotulo - 110) * total / maximo
+        partes.append(
+            f'<text x="{rotulo - 8}" y="{y + 15}" font-size="12" text-anchor="end" fill="#333">{html.escape(cat)}</text>'
+            f'<rect x="{rotulo}" y="{y + 4}" width="{w:.1f}" height="{linha - 8}" rx="3" fill="{COR_BARRA}"/>'
+            f'<text x="{rotulo + w + 6:.1f}" y="{y + 15}" font-size="11" fill="#555">{html.escape(money(total))}</text>'
+        )
+    partes.append("</svg>")
+    return "".join(partes)
+
+def _html_relatorio(perfil: str, ano: int, meses, categorias) -> str:
+    entradas = sum(m["entradas"] for m in meses)
+    gastos = sum(m["gastos"] for m in meses)
+    acumulado = next((m["acumulado"] for m in reversed(meses) if m["acumulado"] is not None), 0.0)
+    total_cat = sum(t for _, t, _ in categorias) or 1
+
+    linhas_mes = "".join(
+        f"<tr><td>{MESES_CURTOS[i]}</td><td>{money(m['salario'])}</td><td>{money(m['receitas'])}</td>"
+        f"<td>{money(m['gastos'])}</td><td>{money(m['entradas'] - m['gastos'])}</td>"
+        f"<td>{money(m['acumulado']) if m['acumulado'] is not None else '—'}</td></tr>"
+        for i, m in enumerate(meses)
+    )
+    linhas_cat = "".join(
+        f"<tr><td>{html.escape(cat)}</td><td>{money(total)}</td><td>{n}</td><td>{100 * total / total_cat:.1f}%</td></tr>"
+        for cat, total, n in categorias
+    )
+    return f"""<!DOCTYPE html>
+<html lang="pt-BR"><head><meta charset="utf-8"><title>Relatório {ano} • {html.escape(perfil)}</title>
+<style>
+  body {{ font-family: "Segoe UI", Arial, sans-serif; color: #222; margin: 32px; }}
+  h1 {{ margin: 0; }} h2 {{ margin-top: 28px; }}
+  .sub {{ color: #777; margin-bottom: 18px; }}
+  .cards {{ display: flex; gap: 12px; }}
+  .card {{ flex: 1; border: 1px solid #ddd; border-radius: 8px; padding: 10px 14px; }}
+  .card b {{ display: block; font-size: 16pt; }}
+  table {{ border-collapse: collapse; width: 100%; }}
+  th, td {{ padding: 5px 8px; border-bottom: 1px solid #eee; text-align: right; }}
+  th:first-child, td:first-child {{ text-align: left; }}
+  .legenda span {{ display: inline-block; width: 10px; height: 10px; margin: 0 4px 0 12px; }}
+  @media print {{ body {{ margin: 12mm; }} h2 {{ break-after: avoid; }} }}
+</style></head><body>
+<h1>Relatório {ano}</h1>
+<div class="sub">{html.escape(perfil)} • gerado em {datetime.now():%d/%m/%Y %H:%M}</div>
+<div class="cards">
+  <div class="card">Entradas<b>{money(entradas)}</b></div>
+  <div class="card">Gastos<b>{money(gastos)}</b></div>
+  <div class="card">Saldo do ano<b>{money(entradas - gastos)}</b></div>
+  <div class="card">Acumulado<b>{money(acumulado)}</b></div>
+</div>
+<h2>Mês a mês</h2>
+<div class="legenda"><span style="background:{COR_ENTRADA}"></span>Entradas<span style="background:{COR_GASTO}"></span>Gastos</div>
+{_svg_barras_mes(meses)}
+<table><tr><th>Mês</th><th>Salário</th><th>Receitas</th><th>Gastos</th><th>Saldo</th><th>Acumulado</th></tr>
+{linhas_mes}</table>
+<h2>Categorias</h2>
+{_svg_categorias(categorias)}
+<table><tr><th>Categoria</th><th>Total</th><th>Lançamentos</th><th>%</th></tr>
+{linhas_cat}</table>
+</body></html>
+"""
+
+def _xlsx_relatorio(destino: str, ano: int, meses, categorias):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Meses"
+    ws.append(["Mês", "Salário", "Receitas", "Gastos", "Saldo", "Acumulado"])
+    for i, m in enumerate(meses):
+        ws.append([MESES_CURTOS[i], m["salario"], m["receitas"], m["gastos"], m["entradas"] - m["gastos"], m["acumulado"]])
+    graf = BarChart()
+    graf.title = f"Gastos {ano}"
+    graf.add_data(Reference(ws, min_col=4, min_row=1, max_row=13), titles_from_data=True)
+    graf.set_categories(Reference(ws, min_col=1, min_row=2, max_row=13))
+    ws.add_chart(graf, "H2")
+
+    wc = wb.create_sheet("Categorias")
+    wc.append(["Categoria", "Total", "Lançamentos"])
+    for linha in categorias:
+        wc.append(list(linha))
+    tmp = destino + ".tmp"
+    wb.save(tmp)
+    os.replace(tmp, destino)
+
+def gerar_relatorio_ano(caminho: str, perfil: str, ano: int, chave: str, xlsx: bool) -> dict:
+    """Roda num processo do pool: abre a própria conexão (só leitura) e grava os arquivos do ano."""
+    conn = conectar_leitura(caminho)
+    cur = conn.cursor()
+    cur.execute(CONSULTAS["saldo_mensal_periodo"], (f"{ano}-01", f"{ano + 1}-01"))
+    por_mes = {mes: (sal, rec, gas, acum) for mes, sal, rec, gas, acum in cur.fetchall()}
+    cur.execute(CONSULTAS["categorias_periodo"], (f"{ano}-01", f"{ano + 1}-01"))
+    categorias = [(cat, float(total), int(n)) for cat, total, n in cur.fetchall()]
+    conn.close()
+
+    meses = []
+    for m in range(1, 13):
+        sal, rec, gas, acum = por_mes.get(f"{ano}-{m:02d}", (0, 0, 0, None))
+        sal, rec, gas = float(sal or 0), float(rec or 0), float(gas or 0)
+        meses.append({
+            "salario": sal, "receitas": rec, "gastos": gas, "entradas": sal + rec,
+            "acumulado": float(acum) if acum is not None else None,
+        })
+
+    pasta = pasta_relatorios(caminho)
+    os.makedirs(pasta, exist_ok=True)
+    arquivos = _arquivos_relatorio(caminho, ano, chave)
+    tmp = arquivos["html"] + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(_html_relatorio(perfil, ano, meses, categorias))
+    os.replace(tmp, arquivos["html"])
+    if xlsx and HAS_XLSX:
+        _xlsx_relatorio(arquivos["xlsx"], ano, meses, categorias)
+
+    # versões antigas do mesmo ano (outro hash) saem da pasta
+    atuais = {os.path.basename(a) for a in arquivos.values()}
+    for nome in os.listdir(pasta):
+        if nome.startswith(f"relatorio_{ano}_") and nome not in atuais:
+            os.remove(os.path.join(pasta, nome))
+    return {"perfil": perfil, "ano": ano, "html": arquivos["html"], "gerado": True}
+
+def gerar_relatorios(anos=None, perfis=None, xlsx: bool = False, processos: int = None):
+    """
+    Relatórios anuais de um ou mais perfis (padrão: o ativo, todos os anos).
+    Os anos cujo hash não mudou saem do cache; o resto é distribuído num
+    ProcessPoolExecutor, um ano por tarefa.
+    """
+    if perfis is None:
+        alvos = [(caminho_banco(), dict(listar_perfis()).get(perfil_ativo(), "Virtum Finance"))]
+    else:
+        nomes = dict(listar_perfis())
+        alvos = [(caminho_perfil(p), nomes.get(p, p)) for p in perfis]
+
+    resultados, pendentes = [], []
+    for caminho, perfil in alvos:
+        if not os.path.exists(caminho):
+            continue
+        conn = conectar_leitura(caminho)
+        cur = conn.cursor()
+        cur.execute(CONSULTAS["anos_com_saldo"])
+        existentes = [a for (a,) in cur.fetchall()]
+        for ano in (existentes if anos is None else [a for a in anos if a in existentes]):
+            chave = chave_relatorio(cur, ano, perfil)
+            arquivos = _arquivos_relatorio(caminho, ano, chave)
+            if os.path.exists(arquivos["html"]) and (not (xlsx and HAS_XLSX) or os.path.exists(arquivos["xlsx"])):
+                resultados.append({"perfil": perfil, "ano": ano, "html": arquivos["html"], "gerado": False})
+            else:
+                pendentes.append((caminho, perfil, ano, chave, xlsx))
+        conn.close()
+
+    if pendentes:
+        # spawn: o app tem threads (Qt, pool); fork copiaria locks no meio do caminho
+        workers = min(len(pendentes), processos or os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futuros = [pool.submit(gerar_relatorio_ano, *p) for p in pendentes]
+            resultados += [f.result() for f in futuros]
+    return sorted(resultados, key=lambda r: (r["perfil"], r["ano"]))
+
+# ======================
+# COLUNAS (cache colunar de gastos, NumPy + mmap)
+# ======================
+COLUNAS_VERSAO = 1
+COLUNAS_TIPOS = {"id": "<i8", "data": "<i4", "valor": "<f8", "categoria": "<i2"}
+COLUNAS_LOTE = 50_000
+COLUNAS_PODA_LOG = 1000     # linhas já aplicadas no gastos_log antes de apagá-las
+_SQL_DIA = "COALESCE(CAST(julianday(data) - 2440587.5 AS INTEGER), -2147483648)"  # dias desde 1970-01-01
+
+class ColunasGastos:
+    """
+    Cópia colunar de gastos em arquivos mapeados na memória (<banco>.colunas/):
+    id (int64), data (int32, dias desde 1970-01-01), valor (float64) e categoria (int16,
+    índice em meta["categorias"]). As análises são varreduras vetorizadas sobre o mmap,
+    sem montar listas de tuplas no heap do Python.
+    - Linhas novas entram pela marca d'água (id > hwm); edições e exclusões pelo gastos_log.
+    - Exclusões viram lápide (categoria = -1); a reconstrução as descarta.
+    - Linhas arquivadas continuam aqui: as análises enxergam o histórico inteiro sem descompactar.
+    """
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self.pasta = caminho + ".colunas"
+        self.meta = None
+        self.cols = {}
+        self._lock = threading.Lock()
+
+    def _arquivo(self, nome: str) -> str:
+        return os.path.join(self.pasta, f"{nome}.bin")
+
+    def _mapear(self, capacidade: int):
+        self.cols = {
+            nome: np.memmap(self._arquivo(nome), dtype=tipo, mode="r+", shape=(capacidade,))
+            for nome, tipo in COLUNAS_TIPOS.items()
+        }
+
+    def _redimensionar(self, capacidade: int):
+        """Aumenta os arquivos (o mapeamento antigo é solto antes: no Windows não dá para mexer com ele aberto)."""
+        for col in self.cols.values():
+            col.flush()
+        self.cols = {}
+        for nome, tipo in COLUNAS_TIPOS.items():
+            with open(self._arquivo(nome), "ab") as f:
+                f.truncate(capacidade * np.dtype(tipo).itemsize)
+        self._mapear(capacidade)
+        self.meta["capacidade"] = capacidade
+
+    def _gravar_meta(self):
+        for col in self.cols.values():
+            col.flush()
+        tmp = os.path.join(self.pasta, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, ensure_ascii=False)
+        os.replace(tmp, os.path.join(self.pasta, "meta.json"))
+
+    def _abrir(self) -> bool:
+        try:
+            with open(os.path.join(self.pasta, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("versao") != COLUNAS_VERSAO:
+                return False
+            self.meta = meta
+            self._mapear(meta["capacidade"])
+            return True
+        except (OSError, ValueError, KeyError):
+            self.meta, self.cols = None, {}
+            return False
+
+    def _anexar(self, lote):
+        """Acrescenta linhas (id, dia, valor, categoria) no fim, crescendo os arquivos em dobro."""
+        n, k = self.meta["n"], len(lote)
+        if n + k > self.meta["capacidade"]:
+            cap = self.meta["capacidade"]
+            while cap < n + k:
+                cap *= 2
+            self._redimensionar(cap)
+        cats = self.meta["categorias"]
+        indice = {c: i for i, c in enumerate(cats)}
+        for *_, cat in lote:
+            if (cat or "") not in indice:
+                indice[cat or ""] = len(cats)
+                cats.append(cat or "")
+        self.cols["id"][n:n + k] = np.fromiter((r[0] for r in lote), np.int64, k)
+        self.cols["data"][n:n + k] = np.fromiter((r[1] for r in lote), np.int32, k)
+        self.cols["valor"][n:n + k] = np.fromiter((r[2] or 0 for r in lote), np.float64, k)
+        self.cols["categoria"][n:n + k] = np.fromiter((indice[r[3] or ""] for r in lote), np.int16, k)
+        self.meta["n"] = n + k
+        self.meta["hwm"] = max(self.meta["hwm"], int(lote[-1][0]))
+
+    def _reconstruir(self, cur):
+        """Relê tudo (banco + anos arquivados) em lotes."""
+        self.cols = {}
+        os.makedirs(self.pasta, exist_ok=True)
+        cur.execute("SELECT ano FROM arquivos")
+        anexar_arquivos(cur, [r[0] for r in cur.fetchall()])
+        cur.execute("SELECT COUNT(*) FROM gastos_historico")
+        capacidade = max(1024, 1 << int(cur.fetchone()[0] * 1.25).bit_length())
+        for nome, tipo in COLUNAS_TIPOS.items():
+            with open(self._arquivo(nome), "wb") as f:
+                f.truncate(capacidade * np.dtype(tipo).itemsize)
+        self._mapear(capacidade)
+        self.meta = {"versao": COLUNAS_VERSAO, "n": 0, "capacidade": capacidade, "hwm": 0, "categorias": []}
+
+        cur.execute("BEGIN")
+        self.meta["seq"] = _sequencia(cur, "gastos_log")
+        cur.execute(f"SELECT id, {_SQL_DIA}, valor, categoria FROM gastos_historico ORDER BY id")
+        while True:
+            lote = cur.fetchmany(COLUNAS_LOTE)
+            if not lote:
+                break
+            self._anexar(lote)
+        self.meta["hwm"] = max(self.meta["hwm"], _sequencia(cur, "gastos"))
+        cur.execute("COMMIT")
+        self._gravar_meta()
+
+    def sincronizar(self):
+        """Traz o cache para o estado atual do banco (barato quando nada mudou)."""
+        with self._lock:
+            conn = conectar_leitura(self.caminho)
+            cur = conn.cursor()
+            try:
+                if self.meta is None and not self._abrir():
+                    self._reconstruir(cur)
+                    return
+                cur.execute("BEGIN")
+                seq = _sequencia(cur, "gastos_log")
+                # sequências menores que as do cache: o banco foi trocado (restauração de backup)
+                if seq < self.meta["seq"] or _sequencia(cur, "gastos") < self.meta["hwm"]:
+                    cur.execute("COMMIT")
+                    self._reconstruir(cur)
+                    return
+                if seq > self.meta["seq"] and not self._aplicar_log(cur):
+                    cur.execute("COMMIT")
+                    self._reconstruir(cur)
+                    return
+                cur.execute(f"SELECT id, {_SQL_DIA}, valor, categoria FROM gastos WHERE id > ? ORDER BY id", (self.meta["hwm"],))
+                mudou = seq > self.meta["seq"]
+                while True:
+                    lote = cur.fetchmany(COLUNAS_LOTE)
+                    if not lote:
+                        break
+                    self._anexar(lote)
+                    mudou = True
+                cur.execute("COMMIT")
+                if mudou:
+                    self.meta["seq"] = seq
+                    self._gravar_meta()
+            finally:
+                conn.close()
+        if self.meta["seq"] - self.meta.get("podado", 0) >= COLUNAS_PODA_LOG:
+            self._podar_log()
+
+    def _aplicar_log(self, cur) -> bool:
+        """Reaplica as linhas citadas no log. False: apareceu id antigo desconhecido (reconstruir)."""
+        cur.execute("SELECT DISTINCT gasto_id FROM gastos_log WHERE seq > ? ORDER BY gasto_id", (self.meta["seq"],))
+        alterados = [r[0] for r in cur.fetchall()]
+        n = self.meta["n"]
+        ids = self.cols["id"][:n]
+        indice = {c: i for i, c in enumerate(self.meta["categorias"])}
+        for i in range(0, len(alterados), 500):
+            parte = alterados[i:i + 500]
+            cur.execute(
+                f"SELECT id, {_SQL_DIA}, valor, categoria FROM gastos WHERE id IN ({','.join('?' * len(parte))})", parte
+            )
+            atuais = {r[0]: r for r in cur.fetchall()}
+            pos = np.searchsorted(ids, parte)
+            for gid, p in zip(parte, pos.tolist()):
+                achou = p < n and ids[p] == gid
+                linha = atuais.get(gid)
+                if not achou:
+                    if linha is not None and gid <= self.meta["hwm"]:
+                        return False
+                    continue  # id novo: entra pela marca d'água
+                if linha is None:
+                    self.cols["categoria"][p] = -1
+                    self.cols["valor"][p] = 0.0
+                    continue
+                cat = linha[3] or ""
+                if cat not in indice:
+                    indice[cat] = len(self.meta["categorias"])
+                    self.meta["categorias"].append(cat)
+                self.cols["data"][p] = linha[1]
+                self.cols["valor"][p] = linha[2] or 0.0
+                self.cols["categoria"][p] = indice[cat]
+        return True
+
+    def _podar_log(self):
+        with self._lock:
+            seq = self.meta["seq"]
+            conn = sqlite3.connect(self.caminho)
+            try:
+                conn.execute("DELETE FROM gastos_log WHERE seq <= ?", (seq,))
+                conn.commit()
+            except sqlite3.Error:
+                return  # banco ocupado: fica para a próxima
+            finally:
+                conn.close()
+            self.meta["podado"] = seq
+            self._gravar_meta()
+
+    def _validas(self, inicio: date, fim: date):
+        """(dia relativo a inicio, valor, categoria) das linhas vivas em [inicio, fim)."""
+        n = self.meta["n"]
+        a = inicio.toordinal() - date(1970, 1, 1).toordinal()
+        b = fim.toordinal() - date(1970, 1, 1).toordinal()
+        dias, cats = self.cols["data"][:n], self.cols["categoria"][:n]
+        m = (dias >= a) & (dias < b) & (cats >= 0)
+        return dias[m] - a, self.cols["valor"][:n][m], cats[m]
+
+    def totais_por_dia(self, inicio: date, fim: date):
+        """(totais, quantidades) por dia de [inicio, fim), em arrays do tamanho do intervalo."""
+        with self._lock:
+            d, v, _ = self._validas(inicio, fim)
+            tamanho = (fim - inicio).days
+            return np.bincount(d, weights=v, minlength=tamanho), np.bincount(d, minlength=tamanho)
+
+    def fracao_ate_dia(self, dia: int, inicio: date, fim: date, excluir=()):
+        """
+        Mediana, entre os meses de [inicio, fim), da fração do gasto do mês feita até o dia `dia`.
+        excluir: pares (categoria, valor) que não contam (os fixos). None com menos de 3 meses.
+        """
+        with self._lock:
+            d, v, c = self._validas(inicio, fim)
+            if excluir:
+                indice = {cat: i for i, cat in enumerate(self.meta["categorias"])}
+                chaves = [(indice[cat] << 40) | round(val * 100) for cat, val in excluir if cat in indice]
+                fixo = np.isin((c.astype(np.int64) << 40) | np.rint(v * 100).astype(np.int64), chaves)
+                d, v = d[~fixo], v[~fixo]
+        datas = (np.datetime64(inicio, "D") + d)
+        meses = datas.astype("datetime64[M]")
+        dia_mes = (datas - meses.astype("datetime64[D]")).astype(np.int32) + 1
+        mes_idx = (meses - np.datetime64(inicio, "M")).astype(np.int64)
+        total = np.bincount(mes_idx, weights=v)
+        ate = np.bincount(mes_idx[dia_mes <= dia], weights=v[dia_mes <= dia], minlength=total.size)
+        ok = total > 0
+        if ok.sum() < 3:
+            return None
+        return float(np.median(ate[ok] / total[ok]))
+
+def _sequencia(cur, tabela: str) -> int:
+    cur.execute("SELECT seq FROM sqlite_sequence WHERE name=?", (tabela,))
+    row = cur.fetchone()
+    return int(row[0]) if row else 0
+
+_colunas = {}
+_colunas_lock = threading.Lock()
+
+def obter_colunas():
+    """Cache colunar do banco ativo, já sincronizado. None sem NumPy ou se o cache falhar."""
+    if not HAS_NUMPY:
+        return None
+    with _colunas_lock:
+        col = _colunas.get(caminho_banco())
+        if col is None:
+            col = _colunas[caminho_banco()] = ColunasGastos(caminho_banco())
+    try:
+        col.sincronizar()
+    except (OSError, ValueError, sqlite3.Error):
+        with _colunas_lock:
+            _colunas.pop(col.caminho, None)
+        return None
+    return col
+
+# ======================
+# PROJEÇÕES (NumPy)
 # ======================
-DB_PATH = "gastos.db"
-
-def conectar():
-    return sqlite3.connect(DB_PATH)
-
-def migrar_banco():
+def carregar_series_mensais(cur, ate_mes: str):
+    """
+    Colunas (arrays) dos meses anteriores a ate_mes, lidas uma vez de saldo_mensal:
+    mes_num (1-12), salario, receitas, gastos e fixos (ocorrências já lançadas no mês).
+    """
+    cur.execute(CONSULTAS["series_mensais"], (ate_mes, ate_mes))
+    m = np.array(cur.fetchall(), dtype=np.float64).reshape(-1, 5)
+    return {
+        "mes_num": m[:, 0].astype(np.int8),
+        "salario": m[:, 1],
+        "receitas": m[:, 2],
+        "gastos": m[:, 3],
+        "fixos": m[:, 4],
+    }
+
+def prever_fim_do_mes(series: dict, hoje: date, gasto_atual: float, fixos_lancados: float, fixos_mes: float,
+                      fracao: float = None):
+    """
+    (p10, p50, p90) do gasto final do mês de `hoje`.
+    Fixos entram pelo valor das ocorrências do mês; o resto (variável) mistura o ritmo
+    atual com a média recente corrigida pela sazonalidade do mês, pesando o ritmo
+    conforme o mês avança. fracao: parte do variável que costuma já ter saído até hoje
+    (sem ela o ritmo é linear nos dias).
+    """
+    dias = calendar.monthrange(hoje.year, hoje.month)[1]
+    peso = hoje.day / dias
+    var_atual = max(0.0, gasto_atual - fixos_lancados)
+    ritmo = var_atual / max(fracao, 0.05) if fracao else var_atual / hoje.day * dias
+
+    variavel = np.clip(series["gastos"] - series["fixos"], 0, None)
+    if variavel.size >= 3 and variavel.mean() > 0:
+        base = variavel[-3:].mean()
+        # índice sazonal só com pelo menos um ano de histórico
+        mesmo_mes = variavel[series["mes_num"] == hoje.month]
+        if variavel.size >= 12 and mesmo_mes.size:
+            base *= mesmo_mes.mean() / variavel.mean()
+        desvio = variavel[-12:].std()
+        var_final = peso * ritmo + (1 - peso) * base
+    else:
+        desvio = 0.0
+        var_final = ritmo
+
+    var_final = max(var_final, var_atual)
+    margem = 1.2816 * desvio * (1 - peso)  # z de 10%/90%
+    meio = var_final + fixos_mes
+    return (float(max(var_atual + fixos_mes, meio - margem)), float(meio), float(meio + margem))
+
+def projetar_poupanca(series: dict, acumulado: float, anos: int = 3, caminhos: int = 5000, seed=None):
+    """
+    Monte Carlo do saldo acumulado: cada caminho soma saldos mensais sorteados da
+    normal dos últimos 24 meses. Retorna [(anos, p10, p50, p90)] para 1..anos.
+    """
+    liquido = (series["salario"] + series["receitas"] - series["gastos"])[-24:]
+    if liquido.size < 3:
+        return []
+    rng = np.random.default_rng(seed)
+    passos = rng.normal(liquido.mean(), liquido.std(ddof=1), size=(caminhos, anos * 12))
+    fim_de_ano = (acumulado + passos.cumsum(axis=1))[:, 11::12]
+    p10, p50, p90 = np.percentile(fim_de_ano, [10, 50, 90], axis=0)
+    return [(i + 1, float(p10[i]), float(p50[i]), float(p90[i])) for i in range(anos)]
+
+def calcular_projecoes(hoje: date, fixos_lancados: float, fixos_mes: float, seed=None) -> dict:
+    """Previsão do mês atual + projeção da poupança. Só leitura: roda em segundo plano."""
+    mes = hoje.strftime("%Y-%m")
     conn = conectar()
     cur = conn.cursor()
+    series = carregar_series_mensais(cur, mes)
+    cur.execute(CONSULTAS["saldo_mes"], (mes,))
+    row = cur.fetchone()
+    cur.execute(CONSULTAS["fixos_valores"])
+    fixos = cur.fetchall()
+    conn.close()
+    gasto_atual = float(row[2]) if row else 0.0
+    acumulado = obter_acumulado(mes)
+
+    # curva típica do mês (últimos 12 meses fechados), varrida no cache colunar
+    fracao = None
+    colunas = obter_colunas()
+    if colunas is not None:
+        inicio_mes = hoje.replace(day=1)
+        inicio = date(inicio_mes.year - 1, inicio_mes.month, 1)
+        fracao = colunas.fracao_ate_dia(hoje.day, inicio, inicio_mes, excluir=fixos)
+    return {
+        "mes": mes,
+        "previsao": prever_fim_do_mes(series, hoje, gasto_atual, fixos_lancados, fixos_mes, fracao),
+        "poupanca": projetar_poupanca(series, acumulado, seed=seed),
+    }
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS gastos (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        categoria TEXT,
-        valor REAL,
-        descricao TEXT,
-        data TEXT
-    )
-    """)
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS config (
-        id INTEGER PRIMARY KEY,
-        salario REAL DEFAULT 0,
-        ultimo_mes TEXT DEFAULT ''
-    )
-    """)
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS fixos (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        categoria TEXT,
-        valor REAL,
-        descricao TEXT,
-        ativo INTEGER DEFAULT 1
-    )
-    """)
+# ======================
+# CACHE (dashboard)
+# ======================
+class CacheMeses:
+    """
+    LRU dos meses vistos no dashboard.
+    - Cada entrada guarda a versão do mês (saldo_mensal.versao).
+    - Qualquer escrita no mês (app, script, outro PC) muda a versão e a entrada é descartada.
+    - Thread-safe: o prefetch grava aqui de outra thread.
+    """
+    def __init__(self, capacidade: int = 24):
+        self.capacidade = capacidade
+        self._dados = OrderedDict()
+        self._carregando = set()
+        self._lock = threading.Lock()
+
+    def obter(self, mes: str):
+        with self._lock:
+            dados = self._dados.get(mes)
+        if dados is None:
+            return None
+        if dados["versao"] != versao_mes(mes):
+            self.invalidar(mes)
+            return None
+        with self._lock:
+            if mes in self._dados:
+                self._dados.move_to_end(mes)
+        return dados
+
+    def guardar(self, dados: dict):
+        with self._lock:
+            self._dados[dados["mes"]] = dados
+            self._dados.move_to_end(dados["mes"])
+            while len(self._dados) > self.capacidade:
+                self._dados.popitem(last=False)
+
+    def invalidar(self, mes: str = None):
+        with self._lock:
+            if mes is None:
+                self._dados.clear()
+            else:
+                self._dados.pop(mes, None)
+
+    def carregar(self, mes: str) -> dict:
+        dados = self.obter(mes)
+        if dados is None:
+            dados = carregar_mes(mes)
+            self.guardar(dados)
+        return dados
+
+    def prefetch(self, meses):
+        """Carrega os meses em segundo plano (QThreadPool), sem travar a UI."""
+        for mes in meses:
+            with self._lock:
+                if mes in self._dados or mes in self._carregando:
+                    continue
+                self._carregando.add(mes)
+            QThreadPool.globalInstance().start(_PrefetchMes(self, mes))
+
+    def _prefetch_concluido(self, mes: str):
+        with self._lock:
+            self._carregando.discard(mes)
+
+class _PrefetchMes(QRunnable):
+    def __init__(self, cache: CacheMeses, mes: str):
+        super().__init__()
+        self.cache = cache
+        self.mes = mes
+        self.caminho = caminho_banco()
 
-    # registra quais fixos já foram aplicados em cada mês (permite reexecutar sem duplicar)
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS fixos_aplicados (
-        mes TEXT NOT NULL,
-        fixo_id INTEGER NOT NULL,
-        PRIMARY KEY (mes, fixo_id)
-    )
-    """)
+    def run(self):
+        _banco_local.caminho = self.caminho
+        try:
+            self.cache.guardar(carregar_mes(self.mes))
+        except sqlite3.Error:
+            pass  # banco ocupado: o mês é lido normalmente quando for aberto
+        finally:
+            _banco_local.caminho = None
+            self.cache._prefetch_concluido(self.mes)
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS resumo (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        mes TEXT,
-        total REAL,
-        saldo REAL
-    )
-    """)
+# ======================
+# TAREFAS EM SEGUNDO PLANO
+# ======================
+class _SinaisTarefa(QObject):
+    concluida = Signal(object)
+    falhou = Signal(object)
 
-    # garante unicidade do mês mesmo em bancos antigos
-    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_resumo_mes ON resumo(mes)")
+class Tarefa(QRunnable):
+    """
+    Roda fn(*args) no QThreadPool e entrega o resultado por sinal (na thread da UI).
+    A função deve abrir a própria conexão com o banco (conectar() usa o perfil
+    que estava ativo quando a tarefa foi criada, mesmo se o usuário trocar no meio).
+    """
+    def __init__(self, fn, *args):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.caminho = caminho_banco()
+        self.sinais = _SinaisTarefa()
 
-    cur.execute("INSERT OR IGNORE INTO config (id, salario, ultimo_mes) VALUES (1, 0, '')")
+    def run(self):
+        _banco_local.caminho = self.caminho
+        try:
+            r = self.fn(*self.args)
+        except Exception as e:
+            self.sinais.falhou.emit(e)
+        else:
+            self.sinais.concluida.emit(r)
+        finally:
+            _banco_local.caminho = None
 
-    # coluna tema (paleta)
-    cur.execute("PRAGMA table_info(config)")
-    cols = [c[1] for c in cur.fetchall()]
-    if "tema" not in cols:
-        cur.execute("ALTER TABLE config ADD COLUMN tema TEXT DEFAULT 'original'")
-        cur.execute("UPDATE config SET tema='original' WHERE tema IS NULL OR tema=''")
+# ======================
+# MANUTENÇÃO
+# ======================
+# operação -> intervalo mínimo entre execuções (None: só quando a condição pede)
+MANUTENCAO_INTERVALOS = {
+    "optimize": timedelta(days=1),
+    "analyze": timedelta(days=7),
+    "auto_vacuum": None,
+    "incremental_vacuum": timedelta(hours=1),
+    "wal_checkpoint": timedelta(hours=1),
+    "anexos": timedelta(days=1),
+}
+VACUUM_PAGINAS = 1024     # páginas devolvidas ao disco por passo
+VACUUM_MIN_LIVRES = 64    # abaixo disso não vale a pena
 
-    conn.commit()
-    conn.close()
+def _pragma(cur, nome: str):
+    return cur.execute(f"PRAGMA {nome}").fetchone()[0]
 
-def obter_salario():
+def manutencoes_pendentes(forcar: bool = False):
+    """Operações que já venceram (ou todas as aplicáveis, com forcar)."""
     conn = conectar()
     cur = conn.cursor()
-    cur.execute("SELECT salario FROM config WHERE id=1")
-    v = cur.fetchone()[0] or 0
+    cur.execute(CONSULTAS["ultimas_manutencoes"])
+    ultimas = {op: datetime.fromisoformat(ini) for op, ini in cur.fetchall()}
+    auto_vacuum = _pragma(cur, "auto_vacuum")
+    livres = _pragma(cur, "freelist_count")
+    wal = _pragma(cur, "journal_mode") == "wal"
     conn.close()
-    return float(v)
 
-def salvar_salario(v: float):
+    aplicaveis = {
+        "optimize": True,
+        "analyze": True,
+        # auto_vacuum só vale depois de um VACUUM: migração única
+        "auto_vacuum": auto_vacuum != 2,
+        "incremental_vacuum": auto_vacuum == 2 and livres >= VACUUM_MIN_LIVRES,
+        "wal_checkpoint": wal,
+        "anexos": os.path.isdir(pasta_anexos()),
+    }
+    agora = datetime.now()
+    pendentes = []
+    for op, intervalo in MANUTENCAO_INTERVALOS.items():
+        if not aplicaveis[op]:
+            continue
+        if forcar or intervalo is None or op not in ultimas or agora - ultimas[op] >= intervalo:
+            pendentes.append(op)
+    return pendentes
+
+def executar_operacao(op: str) -> dict:
+    """Roda uma operação de manutenção e registra em manutencao_log."""
+    inicio = datetime.now()
+    t0 = time.perf_counter()
     conn = conectar()
     cur = conn.cursor()
-    cur.execute("UPDATE config SET salario=? WHERE id=1", (v,))
+    if op == "optimize":
+        cur.execute("PRAGMA optimize")
+        detalhe = ""
+    elif op == "analyze":
+        cur.execute("ANALYZE")
+        detalhe = f"{cur.execute('SELECT COUNT(*) FROM sqlite_stat1').fetchone()[0]} índices"
+    elif op == "auto_vacuum":
+        antes = os.path.getsize(caminho_banco())
+        cur.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        cur.execute("VACUUM")
+        detalhe = f"{antes // 1024} KB -> {os.path.getsize(caminho_banco()) // 1024} KB"
+    elif op == "incremental_vacuum":
+        antes = _pragma(cur, "freelist_count")
+        # via execute() o sqlite3 dá um passo só (1 página); executescript roda até o fim
+        conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGINAS});")
+        detalhe = f"{antes - _pragma(cur, 'freelist_count')} páginas liberadas, {_pragma(cur, 'freelist_count')} livres"
+    elif op == "wal_checkpoint":
+        ocupado, paginas, copiadas = cur.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        detalhe = f"{copiadas}/{paginas} páginas" + (" (ocupado)" if ocupado else "")
+    elif op == "anexos":
+        r = limpar_anexos()
+        detalhe = f"{r['removidos']} comprovante(s) sem gasto, {r['bytes'] // 1024} KB"
+    else:
+        conn.close()
+        raise ValueError(f"operação desconhecida: {op}")
+    duracao = (time.perf_counter() - t0) * 1000
+    cur.execute(
+        "INSERT INTO manutencao_log (operacao, inicio, duracao_ms, detalhe) VALUES (?,?,?,?)",
+        (op, inicio.isoformat(timespec="seconds"), duracao, detalhe)
+    )
     conn.commit()
     conn.close()
+    return {"operacao": op, "duracao_ms": duracao, "detalhe": detalhe}
 
+def executar_manutencao(forcar: bool = False):
+    """Tudo o que estiver pendente, em sequência (usado pela linha de comando)."""
+    return [executar_operacao(op) for op in manutencoes_pendentes(forcar)]
 
-def obter_tema() -> str:
+class AgendadorManutencao(QObject):
+    """
+    Roda uma operação de manutenção por vez, só com o usuário parado:
+    - um filtro de eventos no app marca a última interação (teclado/mouse);
+    - a cada `intervalo_ms`, se passou `ocioso_s` sem interação e não há diálogo aberto
+      nem outra operação rodando, dispara a próxima pendente em segundo plano.
+    """
+    EVENTOS_USUARIO = {
+        QEvent.KeyPress, QEvent.MouseButtonPress, QEvent.MouseButtonDblClick,
+        QEvent.MouseMove, QEvent.Wheel,
+    }
+
+    def __init__(self, janela, ocioso_s: int = 120, intervalo_ms: int = 30000):
+        super().__init__(janela)
+        self.janela = janela
+        self.ocioso_s = ocioso_s
+        self.ultima_interacao = time.monotonic()
+        self.rodando = None
+        QApplication.instance().installEventFilter(self)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(intervalo_ms)
+        self.timer.timeout.connect(self.verificar)
+        self.timer.start()
+
+    def eventFilter(self, obj, event):
+        if event.type() in self.EVENTOS_USUARIO:
+            self.ultima_interacao = time.monotonic()
+        return False
+
+    def ocioso(self) -> bool:
+        return (
+            time.monotonic() - self.ultima_interacao >= self.ocioso_s
+            and QApplication.activeModalWidget() is None
+            and QApplication.mouseButtons() == Qt.NoButton
+        )
+
+    def verificar(self):
+        if self.rodando or getattr(self.janela, "_backup_rodando", False) or not self.ocioso():
+            return
+        pendentes = manutencoes_pendentes()
+        if not pendentes:
+            return
+        self.rodando = pendentes[0]
+        self.janela.iniciar_tarefa(
+            executar_operacao, self.rodando,
+            ao_concluir=self._terminou, ao_falhar=self._terminou,
+        )
+
+    def _terminou(self, _resultado):
+        self.rodando = None
+
+    def fechar(self):
+        self.timer.stop()
+        QApplication.instance().removeEventFilter(self)
+
+# ======================
+# API LOCAL (asyncio, JSON)
+# ======================
+class ErroAPI(Exception):
+    def __init__(self, status: int, mensagem: str):
+        super().__init__(mensagem)
+        self.status = status
+
+_STATUS_HTTP = {
+    200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error",
+}
+
+def _validar_gasto(d) -> tuple:
+    if not isinstance(d, dict):
+        raise ErroAPI(400, "cada gasto deve ser um objeto JSON")
+    try:
+        valor = float(d["valor"])
+        data = date.fromisoformat(str(d["data"])).isoformat()
+    except (KeyError, TypeError, ValueError):
+        raise ErroAPI(400, "gasto precisa de 'valor' numérico e 'data' AAAA-MM-DD")
+    if not math.isfinite(valor):
+        raise ErroAPI(400, "'valor' deve ser um número finito")
+    moeda = str(d.get("moeda") or MOEDA_BASE).upper()
+    return str(d.get("categoria") or "Outros"), valor, str(d.get("descricao") or ""), data, moeda
+
+def _recusar_arquivados(cur, datas):
+    anos = sorted({int(d[:4]) for d in datas})
+    cur.execute(f"SELECT ano FROM arquivos WHERE ano IN ({','.join('?' * len(anos))})", anos)
+    arquivados = [r[0] for r in cur.fetchall()]
+    if arquivados:
+        raise ErroAPI(409, f"{arquivados[0]} está arquivado (só leitura)")
+
+def _sim(v) -> bool:
+    """Interpreta um flag vindo da query (lista do parse_qs) ou do JSON: "0", "false", "não" e vazio são falsos."""
+    if isinstance(v, list):
+        v = v[-1] if v else ""
+    if isinstance(v, str):
+        return v.strip().lower() not in ("", "0", "false", "nao", "não", "no", "off")
+    return bool(v)
+
+def _mes_valido(mes: str) -> str:
+    if not re.fullmatch(r"\d{4}-(0[1-9]|1[0-2])", mes or ""):
+        raise ErroAPI(400, "mês deve ser AAAA-MM")
+    return mes
+
+# --- leituras (rodam no pool, recebem um cursor emprestado) ---
+def _api_gastos_mes(cur, mes: str):
+    anexar_arquivos(cur, [int(mes[:4])])
+    cur.execute(CONSULTAS["gastos_mes_api"], faixa_mes(mes))
+    campos = ("id", "categoria", "valor", "descricao", "data", "moeda", "valor_original")
+    return [dict(zip(campos, r)) for r in cur.fetchall()]
+
+def _api_gasto(cur, gasto_id: int):
+    cur.execute(CONSULTAS["gasto_por_id"], (gasto_id,))
+    r = cur.fetchone()
+    if not r:
+        raise ErroAPI(404, f"gasto {gasto_id} não existe")
+    return dict(zip(("id", "categoria", "valor", "descricao", "data", "moeda", "valor_original"), r))
+
+def _api_mes(cur, mes: str):
+    cur.execute(CONSULTAS["saldo_mes_api"], (mes,))
+    r = cur.fetchone() or (0.0, 0.0, 0.0, None)
+    cur.execute(CONSULTAS["resumo_mes"], (mes,))
+    fechado = cur.fetchone()
+    return {
+        "mes": mes, "salario": r[0], "receitas": r[1], "gastos": r[2],
+        "saldo": r[0] + r[1] - r[2], "acumulado": r[3],
+        "fechado": bool(fechado), "resumo": dict(zip(("total", "saldo"), fechado)) if fechado else None,
+    }
+
+def _api_fixos(cur):
+    cur.execute(CONSULTAS["fixos_api"])
+    campos = ("id", "categoria", "valor", "descricao", "ativo", "frequencia", "inicio", "fim", "parcelas")
+    return [dict(zip(campos, r)) for r in cur.fetchall()]
+
+# --- escritas (rodam sempre na mesma thread: uma de cada vez) ---
+def _api_criar_gastos(itens, forcar: bool = False):
+    """Todos numa transação: ou entram todos (menos duplicados) ou nenhum."""
+    validados = [_validar_gasto(d) for d in itens]
     conn = conectar()
     cur = conn.cursor()
-    cur.execute("SELECT tema FROM config WHERE id=1")
-    row = cur.fetchone()
-    conn.close()
-    return (row[0] if row and row[0] else "original")
+    ids, duplicados = [], []
+    try:
+        if validados:
+            _recusar_arquivados(cur, [v[3] for v in validados])
+        for i, (cat, val, desc, dt, moeda) in enumerate(validados):
+            dup = None if forcar else procurar_duplicado(cur, dt, val, desc)
+            if dup is not None:
+                duplicados.append({"indice": i, "original_id": dup})
+                continue
+            try:
+                ids.append(inserir_gasto(cur, cat, val, desc, dt, moeda=moeda))
+            except ValueError as e:
+                raise ErroAPI(400, f"gasto {i}: {e}")
+        conn.commit()
+    finally:
+        conn.close()
+    return {"ids": ids, "duplicados": duplicados}
 
-def salvar_tema(nome: str):
+def _api_atualizar_gasto(gasto_id: int, d):
+    cat, val, desc, dt, moeda = _validar_gasto(d)
     conn = conectar()
     cur = conn.cursor()
-    cur.execute("UPDATE config SET tema=? WHERE id=1", (nome,))
-    conn.commit()
-    conn.close()
-
-def aplicar_fixos_automaticos():
-    """
-    Aplica gastos fixos no mês atual SEM duplicar.
-    - Pode ser executado quantas vezes quiser.
-    - Se você criar um fixo no meio do mês, ele será aplicado na hora (na próxima execução).
-    """
-    hoje_mes = date.today().strftime("%Y-%m")
+    try:
+        _api_gasto(cur, gasto_id)
+        _recusar_arquivados(cur, [dt])
+        try:
+            atualizar_gasto(cur, gasto_id, cat, val, desc, dt, moeda=moeda)
+        except ValueError as e:
+            raise ErroAPI(400, str(e))
+        conn.commit()
+    finally:
+        conn.close()
+    return {"id": gasto_id}
 
+def _api_remover_gasto(gasto_id: int):
     conn = conectar()
     cur = conn.cursor()
-
-    # garante migração mínima (para bancos antigos)
     try:
-        cur.execute("SELECT ultimo_mes FROM config WHERE id=1")
-        row = cur.fetchone()
-        _ = (row[0] if row else "")
-    except sqlite3.OperationalError:
+        _api_gasto(cur, gasto_id)
+        remover_gasto(cur, gasto_id)
+        conn.commit()
+    finally:
         conn.close()
-        migrar_banco()
-        conn = conectar()
-        cur = conn.cursor()
+    return {"id": gasto_id, "removido": True}
 
-    # pega fixos ativos (com id)
-    cur.execute("SELECT id, categoria, valor, descricao FROM fixos WHERE ativo=1")
-    fixos = cur.fetchall()
+def _api_aplicar_fixos():
+    return {"lancados": aplicar_fixos_automaticos()}
 
-    aplicados = 0
-    for fid, cat, val, desc in fixos:
-        # já aplicado neste mês?
-        cur.execute("SELECT 1 FROM fixos_aplicados WHERE mes=? AND fixo_id=? LIMIT 1", (hoje_mes, fid))
-        if cur.fetchone():
-            continue
+class ServidorAPI:
+    """
+    HTTP/1.1 mínimo sobre asyncio, só em 127.0.0.1.
+    - leituras: pool de conexões em threads (várias ao mesmo tempo);
+    - escritas: um único executor de 1 thread, na ordem de chegada.
+
+    GET    /gastos?mes=AAAA-MM         GET /gastos/{id}
+    POST   /gastos                     POST /gastos/lote   ({"gastos": [...], "forcar": false})
+    PUT    /gastos/{id}                DELETE /gastos/{id}
+    GET    /meses/{mes}                POST /meses/{mes}/fechar
+    GET    /fixos                      POST /fixos/aplicar
+    """
+    MAX_CORPO = 16 * 1024 * 1024
+
+    def __init__(self, host: str = "127.0.0.1", porta: int = 8765, leitores: int = 4):
+        self.host = host
+        self.porta = porta
+        self._conexoes = queue.Queue()
+        for _ in range(leitores):
+            self._conexoes.put(sqlite3.connect(caminho_banco(), check_same_thread=False))
+        self._leitura = ThreadPoolExecutor(leitores, thread_name_prefix="api-leitura")
+        self._escrita = ThreadPoolExecutor(1, thread_name_prefix="api-escrita")
+        self.rotas = [
+            ("GET", r"/gastos", self._get_gastos),
+            ("POST", r"/gastos", self._post_gasto),
+            ("POST", r"/gastos/lote", self._post_lote),
+            ("GET", r"/gastos/(\d+)", self._get_gasto),
+            ("PUT", r"/gastos/(\d+)", self._put_gasto),
+            ("DELETE", r"/gastos/(\d+)", self._delete_gasto),
+            ("GET", r"/meses/([\d-]+)", self._get_mes),
+            ("POST", r"/meses/([\d-]+)/fechar", self._post_fechar),
+            ("GET", r"/fixos", self._get_fixos),
+            ("POST", r"/fixos/aplicar", self._post_aplicar_fixos),
+        ]
+
+    # --- execução ---
+    def _com_conexao(self, fn, args):
+        conn = self._conexoes.get()
+        try:
+            return fn(conn.cursor(), *args)
+        finally:
+            conn.rollback()
+            self._conexoes.put(conn)
+
+    async def ler(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._leitura, self._com_conexao, fn, args)
+
+    async def escrever(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._escrita, lambda: fn(*args))
+
+    # --- rotas ---
+    async def _get_gastos(self, q, corpo):
+        mes = _mes_valido(q.get("mes", [datetime.now().strftime("%Y-%m")])[0])
+        return 200, await self.ler(_api_gastos_mes, mes)
+
+    async def _get_gasto(self, q, corpo, gasto_id):
+        return 200, await self.ler(_api_gasto, int(gasto_id))
+
+    async def _post_gasto(self, q, corpo):
+        r = await self.escrever(_api_criar_gastos, [corpo], _sim(q.get("forcar")))
+        if r["duplicados"]:
+            raise ErroAPI(409, f"possível duplicado do gasto {r['duplicados'][0]['original_id']} (use ?forcar=1)")
+        return 201, {"id": r["ids"][0]}
+
+    async def _post_lote(self, q, corpo):
+        itens = corpo.get("gastos") if isinstance(corpo, dict) else corpo
+        if not isinstance(itens, list):
+            raise ErroAPI(400, "envie uma lista de gastos ou {\"gastos\": [...]}")
+        forcar = _sim(corpo.get("forcar")) if isinstance(corpo, dict) else False
+        return 201, await self.escrever(_api_criar_gastos, itens, forcar)
+
+    async def _put_gasto(self, q, corpo, gasto_id):
+        return 200, await self.escrever(_api_atualizar_gasto, int(gasto_id), corpo)
+
+    async def _delete_gasto(self, q, corpo, gasto_id):
+        return 200, await self.escrever(_api_remover_gasto, int(gasto_id))
+
+    async def _get_mes(self, q, corpo, mes):
+        return 200, await self.ler(_api_mes, _mes_valido(mes))
+
+    async def _post_fechar(self, q, corpo, mes):
+        return 200, await self.escrever(fechar_mes, _mes_valido(mes))
+
+    async def _get_fixos(self, q, corpo):
+        return 200, await self.ler(_api_fixos)
+
+    async def _post_aplicar_fixos(self, q, corpo):
+        return 200, await self.escrever(_api_aplicar_fixos)
+
+    # --- HTTP ---
+    async def _despachar(self, metodo: str, alvo: str, corpo: bytes):
+        url = urlsplit(alvo)
+        caminho = url.path.rstrip("/") or "/"
+        achou = False
+        for m, padrao, fn in self.rotas:
+            casou = re.fullmatch(padrao, caminho)
+            if not casou:
+                continue
+            achou = True
+            if m != metodo:
+                continue
+            try:
+                dados = json.loads(corpo) if corpo else {}
+            except ValueError:
+                raise ErroAPI(400, "corpo não é JSON válido")
+            return await fn(parse_qs(url.query), dados, *casou.groups())
+        raise ErroAPI(405 if achou else 404, "método não permitido" if achou else "rota não encontrada")
 
+    async def _cliente(self, reader, writer):
         try:
-            valor = float(val)
-        except Exception:
-            valor = 0.0
+            while True:
+                try:
+                    cabecalho = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                linhas = cabecalho.decode("latin-1").split("\r\n")
+                try:
+                    metodo, alvo, versao = linhas[0].split(" ", 2)
+                except ValueError:
+                    break
+                headers = {}
+                for linha in linhas[1:]:
+                    if ":" in linha:
+                        k, v = linha.split(":", 1)
+                        headers[k.strip().lower()] = v.strip()
+                tamanho = int(headers.get("content-length") or 0)
+
+                try:
+                    if tamanho > self.MAX_CORPO:
+                        raise ErroAPI(413, "corpo grande demais")
+                    corpo = await reader.readexactly(tamanho) if tamanho else b""
+                    status, resposta = await self._despachar(metodo.upper(), alvo, corpo)
+                except ErroAPI as e:
+                    status, resposta = e.status, {"erro": str(e)}
+                except Exception as e:
+                    status, resposta = 500, {"erro": f"{type(e).__name__}: {e}"}
+
+                dados = json.dumps(resposta, ensure_ascii=False).encode("utf-8")
+                fechar = headers.get("connection", "").lower() == "close" or versao == "HTTP/1.0" or status == 413
+                writer.write(
+                    f"HTTP/1.1 {status} {_STATUS_HTTP.get(status, '')}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(dados)}\r\n"
+                    f"Connection: {'close' if fechar else 'keep-alive'}\r\n\r\n".encode("latin-1") + dados
+                )
+                await writer.drain()
+                if fechar:
+                    break
+        finally:
+            writer.close()
+
+    async def servir(self):
+        servidor = await asyncio.start_server(self._cliente, self.host, self.porta)
+        print(f"API em http://{self.host}:{self.porta} (Ctrl+C para parar)")
+        async with servidor:
+            await servidor.serve_forever()
+
+    def fechar(self):
+        self._leitura.shutdown()
+        self._escrita.shutdown()
+        while not self._conexoes.empty():
+            self._conexoes.get().close()
 
-        # lança como gasto no dia 01 do mês
-        cur.execute(
-            "INSERT INTO gastos (categoria, valor, descricao, data) VALUES (?,?,?,?)",
-            (cat, valor, (desc or ""), f"{hoje_mes}-01")
-        )
-        # marca como aplicado
-        cur.execute("INSERT OR IGNORE INTO fixos_aplicados (mes, fixo_id) VALUES (?,?)", (hoje_mes, fid))
-        aplicados += 1
+# ======================
+# MONITOR (outras instâncias / scripts)
+# ======================
+class MonitorBanco(QObject):
+    """
+    Detecta commits de outras conexões (outra instância do app, scripts...).
+    - PRAGMA data_version numa conexão persistente: custa quase nada e só muda
+      quando OUTRA conexão grava.
+    - Só quando muda, compara assinaturas baratas por área para saber o que atualizar.
+    """
+    alterado = Signal(object)  # set com as áreas: "lancamentos", "resumo", "config"
 
-    # ainda mantemos ultimo_mes só como referência visual (não é mais o "bloqueio")
-    cur.execute("UPDATE config SET ultimo_mes=? WHERE id=1", (hoje_mes,))
+    ASSINATURAS = {
+        "lancamentos": "SELECT COUNT(*), TOTAL(versao) FROM saldo_mensal",
+        "resumo": "SELECT COUNT(*), TOTAL(total), TOTAL(saldo), TOTAL(receitas) FROM resumo",
+        "config": "SELECT salario, tema FROM config WHERE id=1",
+    }
 
-    conn.commit()
-    conn.close()
+    def __init__(self, parent=None, intervalo_ms: int = 1500):
+        super().__init__(parent)
+        self._conn = conectar()
+        self._data_version = None
+        self._assinaturas = {}
+        self.sincronizar()
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(intervalo_ms)
+        self.timer.timeout.connect(self.verificar)
+        self.timer.start()
+
+    def _ler_data_version(self):
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _ler_assinaturas(self) -> dict:
+        return {area: self._conn.execute(sql).fetchone() for area, sql in self.ASSINATURAS.items()}
+
+    def sincronizar(self):
+        """Chamado quando o app acabou de recarregar tudo: o estado atual passa a ser a referência."""
+        try:
+            self._data_version = self._ler_data_version()
+            self._assinaturas = self._ler_assinaturas()
+        except sqlite3.Error:
+            self._data_version = None
+
+    def verificar(self):
+        try:
+            dv = self._ler_data_version()
+            if dv == self._data_version:
+                return
+            novas = self._ler_assinaturas()
+        except sqlite3.Error:
+            return  # banco travado por outro processo: tenta no próximo tick
+        self._data_version = dv
+        areas = {a for a, v in novas.items() if v != self._assinaturas.get(a)}
+        self._assinaturas = novas
+        if areas:
+            self.alterado.emit(areas)
+
+    def fechar(self):
+        self.timer.stop()
+        self._conn.close()
 
 # ======================
 # UI HELPERS
 # ======================
-def money(v: float) -> str:
-    return f"R$ {v:.2f}"
+def money(v: float, moeda: str = MOEDA_BASE) -> str:
+    return f"{MOEDAS.get(moeda, moeda)} {v:.2f}"
+
+def money_gasto(valor: float, moeda: str, original) -> str:
+    """Valor em reais e, se foi cobrado em outra moeda, o original: 'R$ 52.10 (US$ 10.00)'."""
+    if moeda in (None, MOEDA_BASE) or original is None:
+        return money(valor)
+    return f"{money(valor)} ({money(original, moeda)})"
 
 def br_date(iso: str) -> str:
     return datetime.strptime(iso, "%Y-%m-%d").strftime("%d/%m/%Y")
@@ -250,6 +4283,34 @@ def br_date(iso: str) -> str:
 def iso_date(br: str) -> str:
     return datetime.strptime(br, "%d/%m/%Y").date().isoformat()
 
+def data_padrao_mes(mes: str) -> date:
+    """Hoje, se for o mês atual; senão o dia 01 do mês (para lançar em meses passados/futuros)."""
+    hoje = date.today()
+    if hoje.strftime("%Y-%m") == mes:
+        return hoje
+    return date(int(mes[:4]), int(mes[5:7]), 1)
+
+def preencher_tabela(tabela, linhas, celulas) -> int:
+    """
+    Preenche a tabela direto do cursor (ou de qualquer iterável), sem fetchall:
+    `celulas(linha)` devolve os textos de uma linha. As linhas crescem em blocos
+    e a pintura fica suspensa até o fim. -> número de linhas
+    """
+    tabela.setUpdatesEnabled(False)
+    try:
+        tabela.setRowCount(0)
+        n = 0
+        for linha in linhas:
+            if n == tabela.rowCount():
+                tabela.setRowCount(max(64, n * 2))
+            for col, texto in enumerate(celulas(linha)):
+                tabela.setItem(n, col, QTableWidgetItem(texto))
+            n += 1
+        tabela.setRowCount(n)
+    finally:
+        tabela.setUpdatesEnabled(True)
+    return n
+
 def msg_err(parent, title, text):
     QMessageBox.critical(parent, title, text)
 
@@ -303,6 +4364,122 @@ class SidebarButton(QPushButton):
         self.style().unpolish(self)
         self.style().polish(self)
 
+class HeatmapCalendario(QWidget):
+    """
+    Um ano em semanas (colunas) x dias da semana (linhas), pintado direto com QPainter.
+    A cor de cada dia é proporcional ao gasto; clique emite dia_clicado('YYYY-MM-DD').
+    """
+    dia_clicado = Signal(str)
+
+    MARGEM_ESQ = 30
+    MARGEM_TOPO = 18
+    ESPACO = 3
+    DIAS_SEMANA = {0: "Seg", 2: "Qua", 4: "Sex"}
+    MESES = ["Jan", "Fev", "Mar", "Abr", "Mai", "Jun", "Jul", "Ago", "Set", "Out", "Nov", "Dez"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setMouseTracking(True)
+        self.setMinimumHeight(150)
+        self.ano = date.today().year
+        self.dias = {}
+        self.referencia = 1.0
+        self.selecionado = None
+        self.paleta = PALETAS["original"]
+
+    def set_paleta(self, paleta: dict):
+        self.paleta = paleta
+        self.update()
+
+    def set_dados(self, ano: int, dias: dict):
+        self.ano = ano
+        self.dias = dias
+        # referência no percentil 95: um dia atípico não apaga o resto do ano
+        totais = sorted(t for t, _ in dias.values() if t > 0)
+        self.referencia = totais[int(len(totais) * 0.95) - 1 if len(totais) > 1 else 0] if totais else 1.0
+        if self.selecionado and not self.selecionado.startswith(f"{ano:04d}-"):
+            self.selecionado = None
+        self.update()
+
+    def _inicio(self) -> date:
+        jan1 = date(self.ano, 1, 1)
+        return jan1 - timedelta(days=jan1.weekday())
+
+    def _celula(self) -> float:
+        largura = (self.width() - self.MARGEM_ESQ) / 53
+        altura = (self.height() - self.MARGEM_TOPO) / 7
+        return max(4.0, min(largura, altura))
+
+    def _dia_em(self, pos):
+        c = self._celula()
+        col = int((pos.x() - self.MARGEM_ESQ) // c)
+        lin = int((pos.y() - self.MARGEM_TOPO) // c)
+        if pos.x() < self.MARGEM_ESQ or pos.y() < self.MARGEM_TOPO or not (0 <= col < 54 and 0 <= lin < 7):
+            return None
+        d = self._inicio() + timedelta(days=col * 7 + lin)
+        return d if d.year == self.ano else None
+
+    def _cor(self, total: float) -> QColor:
+        t = self.paleta
+        if total <= 0:
+            return QColor(t["BORDER"])
+        # raiz quadrada: diferencia melhor os dias pequenos
+        f = 0.2 + 0.8 * min(1.0, total / self.referencia) ** 0.5
+        a, b = QColor(t["CARD"]), QColor(t["ACCENT"])
+        return QColor(
+            int(a.red() + (b.red() - a.red()) * f),
+            int(a.green() + (b.green() - a.green()) * f),
+            int(a.blue() + (b.blue() - a.blue()) * f),
+        )
+
+    def paintEvent(self, event):
+        t = self.paleta
+        c = self._celula()
+        lado = c - self.ESPACO
+        p = QPainter(self)
+        p.setRenderHint(QPainter.Antialiasing)
+
+        p.setPen(QColor(t["SUB"]))
+        for lin, nome in self.DIAS_SEMANA.items():
+            y = self.MARGEM_TOPO + lin * c
+            p.drawText(0, int(y), self.MARGEM_ESQ - 4, int(lado), Qt.AlignRight | Qt.AlignVCenter, nome)
+
+        inicio = self._inicio()
+        d = date(self.ano, 1, 1)
+        fim = date(self.ano + 1, 1, 1)
+        while d < fim:
+            offset = (d - inicio).days
+            col, lin = offset // 7, offset % 7
+            x = self.MARGEM_ESQ + col * c
+            y = self.MARGEM_TOPO + lin * c
+            if d.day == 1:
+                p.setPen(QColor(t["SUB"]))
+                p.drawText(int(x), 0, 40, self.MARGEM_TOPO - 4, Qt.AlignLeft | Qt.AlignBottom, self.MESES[d.month - 1])
+            iso = d.isoformat()
+            total = self.dias.get(iso, (0.0, 0))[0]
+            p.setPen(QPen(QColor(t["TEXT"]), 2) if iso == self.selecionado else Qt.NoPen)
+            p.setBrush(self._cor(total))
+            p.drawRoundedRect(int(x), int(y), int(lado), int(lado), 2, 2)
+            d += timedelta(days=1)
+        p.end()
+
+    def mouseMoveEvent(self, event):
+        d = self._dia_em(event.position().toPoint())
+        if d is None:
+            QToolTip.hideText()
+            return
+        total, n = self.dias.get(d.isoformat(), (0.0, 0))
+        texto = f"{d:%d/%m/%Y}: {money(total)}" + (f" • {n} gasto(s)" if n else "")
+        QToolTip.showText(event.globalPosition().toPoint(), texto, self)
+
+    def mousePressEvent(self, event):
+        d = self._dia_em(event.position().toPoint())
+        if d is None:
+            return
+        self.selecionado = d.isoformat()
+        self.update()
+        self.dia_clicado.emit(self.selecionado)
+
 class FormDialog(QDialog):
     def __init__(self, title: str, parent=None):
         super().__init__(parent)
@@ -356,6 +4533,25 @@ class DashboardPage(QWidget):
         header.addWidget(self.lbl_today)
         header.addStretch(1)
 
+        # navegação entre meses
+        self.btn_prev = QPushButton("◀")
+        self.btn_prev.setObjectName("BtnGhost")
+        self.btn_prev.setToolTip("Mês anterior")
+        self.lbl_mes = QLabel("—")
+        self.lbl_mes.setObjectName("PanelTitle")
+        self.lbl_mes.setAlignment(Qt.AlignCenter)
+        self.lbl_mes.setMinimumWidth(90)
+        self.btn_next = QPushButton("▶")
+        self.btn_next.setObjectName("BtnGhost")
+        self.btn_next.setToolTip("Próximo mês")
+        self.btn_hoje = QPushButton("Mês atual")
+        self.btn_hoje.setObjectName("BtnGhost")
+        header.addWidget(self.btn_prev)
+        header.addWidget(self.lbl_mes)
+        header.addWidget(self.btn_next)
+        header.addWidget(self.btn_hoje)
+        header.addSpacing(12)
+
         self.btn_new = QPushButton("+ Novo gasto")
         self.btn_new.setObjectName("BtnAccent")
         header.addWidget(self.btn_new)
@@ -369,14 +4565,45 @@ class DashboardPage(QWidget):
 
         self.card_gastos = Card("Gastos do mês")
         self.card_salario = Card("Salário")
+        self.card_receitas = Card("Receitas extras")
         self.card_saldo = Card("Saldo")
+        self.card_acumulado = Card("Saldo acumulado")
 
         cards.addWidget(self.card_gastos, 0, 0)
         cards.addWidget(self.card_salario, 0, 1)
-        cards.addWidget(self.card_saldo, 0, 2)
+        cards.addWidget(self.card_receitas, 0, 2)
+        cards.addWidget(self.card_saldo, 0, 3)
+        cards.addWidget(self.card_acumulado, 0, 4)
+
+        self.card_previsao = Card("Previsão de gastos do mês")
+        self.card_poupanca = Card("Acumulado em 3 anos (projeção)")
+        cards.addWidget(self.card_previsao, 1, 0, 1, 2)
+        cards.addWidget(self.card_poupanca, 1, 2, 1, 3)
 
         root.addLayout(cards)
 
+        # orçamentos do mês (um card por categoria com orçamento)
+        self.panel_orc = QFrame()
+        self.panel_orc.setObjectName("Panel")
+        orc = QVBoxLayout(self.panel_orc)
+        orc.setContentsMargins(12, 12, 12, 12)
+        orc.setSpacing(10)
+        top_orc = QHBoxLayout()
+        t = QLabel("Orçamentos do mês")
+        t.setObjectName("PanelTitle")
+        top_orc.addWidget(t)
+        top_orc.addStretch(1)
+        self.btn_orc = QPushButton("Editar")
+        self.btn_orc.setObjectName("BtnGhost")
+        top_orc.addWidget(self.btn_orc)
+        orc.addLayout(top_orc)
+        self.grid_orc = QGridLayout()
+        self.grid_orc.setHorizontalSpacing(10)
+        orc.addLayout(self.grid_orc)
+        self.cards_orc = []
+        self.panel_orc.hide()
+        root.addWidget(self.panel_orc)
+
         # body
         body = QHBoxLayout()
         body.setSpacing(12)
@@ -398,17 +4625,19 @@ class DashboardPage(QWidget):
         row.addWidget(hint)
         left_l.addLayout(row)
 
-        self.table = QTableWidget(0, 4)
-        self.table.setHorizontalHeaderLabels(["ID", "Categoria", "Valor", "Data"])
+        self.table = QTableWidget(0, 5)
+        self.table.setHorizontalHeaderLabels(["ID", "Categoria", "Valor", "Data", "📎"])
         self.table.verticalHeader().setVisible(False)
         self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.table.setAlternatingRowColors(True)
         self.table.setShowGrid(False)
+        self.table.setIconSize(QSize(24, 24))
         self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeToContents)
         self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
         self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeToContents)
         self.table.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setSectionResizeMode(4, QHeaderView.ResizeToContents)
         left_l.addWidget(self.table)
 
         body.addWidget(left, 3)
@@ -444,10 +4673,70 @@ class DashboardPage(QWidget):
         self.table_resumo.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
         right_l.addWidget(self.table_resumo)
 
+        # anomalias do mês (some quando não há nenhuma)
+        self.box_anom = QFrame()
+        anom = QVBoxLayout(self.box_anom)
+        anom.setContentsMargins(0, 6, 0, 0)
+        anom.setSpacing(8)
+        top_anom = QHBoxLayout()
+        t = QLabel("Anomalias do mês")
+        t.setObjectName("PanelTitle")
+        top_anom.addWidget(t)
+        top_anom.addStretch(1)
+        self.btn_anom_ignorar = QPushButton("Ignorar")
+        self.btn_anom_ignorar.setObjectName("BtnGhost")
+        top_anom.addWidget(self.btn_anom_ignorar)
+        anom.addLayout(top_anom)
+
+        self.table_anom = QTableWidget(0, 3)
+        self.table_anom.setHorizontalHeaderLabels(["Data", "Valor", "Motivo"])
+        self.table_anom.verticalHeader().setVisible(False)
+        self.table_anom.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table_anom.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table_anom.setAlternatingRowColors(True)
+        self.table_anom.setShowGrid(False)
+        self.table_anom.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeToContents)
+        self.table_anom.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeToContents)
+        self.table_anom.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
+        anom.addWidget(self.table_anom)
+        self.box_anom.hide()
+        right_l.addWidget(self.box_anom)
+
         body.addWidget(right, 2)
 
         root.addLayout(body)
 
+    def set_anomalias(self, rows):
+        self.box_anom.setVisible(bool(rows))
+        t = self.table_anom
+        t.setRowCount(len(rows))
+        for i, (gid, dt, cat, val, motivo) in enumerate(rows):
+            item = QTableWidgetItem(br_date(dt))
+            item.setData(Qt.UserRole, gid)
+            t.setItem(i, 0, item)
+            t.setItem(i, 1, QTableWidgetItem(money(float(val))))
+            m = QTableWidgetItem(f"{cat}: {motivo}")
+            m.setToolTip(m.text())
+            t.setItem(i, 2, m)
+
+    def set_orcamentos(self, rows):
+        self.panel_orc.setVisible(bool(rows))
+        while len(self.cards_orc) < len(rows):
+            card = Card("")
+            self.grid_orc.addWidget(card, len(self.cards_orc) // 6, len(self.cards_orc) % 6)
+            self.cards_orc.append(card)
+        for i, card in enumerate(self.cards_orc):
+            card.setVisible(i < len(rows))
+        for card, (cat, limite, gasto) in zip(self.cards_orc, rows):
+            uso = gasto / limite if limite else 0.0
+            card.lbl_title.setText(f"{cat} • {uso:.0%}")
+            restante = limite - gasto
+            if restante >= 0:
+                card.set_value(f"Resta {money(restante)}", positive=True if uso < LIMIARES_ORCAMENTO[0] else None)
+            else:
+                card.set_value(f"Estourou {money(-restante)}", positive=False)
+            card.setToolTip(f"{money(gasto)} de {money(limite)}")
+
 class HistoryPage(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -544,29 +4833,238 @@ class GraphPage(QWidget):
 
         root.addWidget(panel)
 
-    def set_data(self, meses, totais):
-        if not HAS_CHARTS:
-            return
+    def set_data(self, pontos):
+        """`pontos`: iterável de (mes, total), percorrido uma vez (pode ser o cursor)."""
+        if not HAS_CHARTS:
+            return
+
+        self.chart.removeAllSeries()
+
+        barset = QBarSet("Gastos")
+        axisX = QBarCategoryAxis()
+        maximo = 1.0
+        for mes, total in pontos:
+            barset.append(float(total))
+            axisX.append(mes)
+            maximo = max(maximo, float(total))
+
+        series = QBarSeries()
+        series.append(barset)
+        self.chart.addSeries(series)
+
+        axisY = QValueAxis()
+        axisY.setMin(0)
+        axisY.setMax(maximo * 1.2)
+
+        self.chart.setAxisX(axisX, series)
+        self.chart.setAxisY(axisY, series)
+
+
+class ComparacaoPage(QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        root = QVBoxLayout(self)
+        root.setContentsMargins(18, 16, 18, 18)
+        root.setSpacing(12)
+
+        header = QHBoxLayout()
+        title = QLabel("Comparativo")
+        title.setObjectName("H2")
+        header.addWidget(title)
+        header.addStretch(1)
+
+        hint = QLabel("Clique num mês para ver as categorias e as tags.")
+        hint.setObjectName("Subtle")
+        header.addWidget(hint)
+
+        root.addLayout(header)
+
+        body = QHBoxLayout()
+        body.setSpacing(12)
+
+        # mês a mês
+        left = QFrame()
+        left.setObjectName("Panel")
+        l = QVBoxLayout(left)
+        l.setContentsMargins(12, 12, 12, 12)
+        l.setSpacing(10)
+        t = QLabel("Mês a mês")
+        t.setObjectName("PanelTitle")
+        l.addWidget(t)
+
+        self.table_meses = QTableWidget(0, 6)
+        self.table_meses.setHorizontalHeaderLabels(["Mês", "Gastos", "Ano anterior", "Var.", "Média 3m", "Média 12m"])
+        self.table_meses.verticalHeader().setVisible(False)
+        self.table_meses.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table_meses.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table_meses.setAlternatingRowColors(True)
+        self.table_meses.setShowGrid(False)
+        self.table_meses.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table_meses.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeToContents)
+        l.addWidget(self.table_meses)
+        body.addWidget(left, 3)
+
+        # categorias do mês escolhido
+        right = QFrame()
+        right.setObjectName("Panel")
+        r = QVBoxLayout(right)
+        r.setContentsMargins(12, 12, 12, 12)
+        r.setSpacing(10)
+        self.lbl_cat = QLabel("Categorias")
+        self.lbl_cat.setObjectName("PanelTitle")
+        r.addWidget(self.lbl_cat)
+
+        self.table_cat = QTableWidget(0, 6)
+        self.table_cat.setHorizontalHeaderLabels(["Categoria", "Total", "Part.", "Mês ant.", "Tendência", "Ano ant."])
+        self.table_cat.verticalHeader().setVisible(False)
+        self.table_cat.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table_cat.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table_cat.setAlternatingRowColors(True)
+        self.table_cat.setShowGrid(False)
+        self.table_cat.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table_cat.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        r.addWidget(self.table_cat, 3)
+
+        self.lbl_tags = QLabel("Tags")
+        self.lbl_tags.setObjectName("PanelTitle")
+        r.addWidget(self.lbl_tags)
+
+        self.table_tags = QTableWidget(0, 3)
+        self.table_tags.setHorizontalHeaderLabels(["Tag", "Total", "Lançamentos"])
+        self.table_tags.verticalHeader().setVisible(False)
+        self.table_tags.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table_tags.setAlternatingRowColors(True)
+        self.table_tags.setShowGrid(False)
+        self.table_tags.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table_tags.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        r.addWidget(self.table_tags, 2)
+        body.addWidget(right, 3)
+
+        root.addLayout(body)
+
+    @staticmethod
+    def _var(atual, base) -> str:
+        if not base:
+            return "—"
+        return f"{(atual - base) / base:+.0%}"
+
+    def set_meses(self, rows):
+        t = self.table_meses
+        t.setRowCount(0)
+        for mes, gastos, ano_ant, m3, m12 in rows:
+            i = t.rowCount()
+            t.insertRow(i)
+            t.setItem(i, 0, QTableWidgetItem(mes))
+            t.setItem(i, 1, QTableWidgetItem(money(float(gastos))))
+            t.setItem(i, 2, QTableWidgetItem(money(float(ano_ant)) if ano_ant is not None else "—"))
+            t.setItem(i, 3, QTableWidgetItem(self._var(float(gastos), ano_ant)))
+            t.setItem(i, 4, QTableWidgetItem(money(float(m3))))
+            t.setItem(i, 5, QTableWidgetItem(money(float(m12))))
+
+    def set_categorias(self, mes, rows):
+        self.lbl_cat.setText(f"Categorias • {mes}")
+        t = self.table_cat
+        t.setRowCount(0)
+        for cat, total, part, ant, media3, ano_ant in rows:
+            i = t.rowCount()
+            t.insertRow(i)
+            # tendência contra a média dos 3 meses anteriores (±10% conta como estável)
+            if media3:
+                tend = "↑ " if total > media3 * 1.1 else ("↓ " if total < media3 * 0.9 else "→ ")
+                tend += self._var(total, media3)
+            else:
+                tend = "novo"
+            t.setItem(i, 0, QTableWidgetItem(cat or "—"))
+            t.setItem(i, 1, QTableWidgetItem(money(float(total))))
+            t.setItem(i, 2, QTableWidgetItem(f"{part:.0%}" if part is not None else "—"))
+            t.setItem(i, 3, QTableWidgetItem(money(float(ant)) if ant is not None else "—"))
+            t.setItem(i, 4, QTableWidgetItem(tend))
+            t.setItem(i, 5, QTableWidgetItem(money(float(ano_ant)) if ano_ant is not None else "—"))
+
+    def set_tags(self, mes, rows):
+        self.lbl_tags.setText(f"Tags • {mes}")
+        preencher_tabela(self.table_tags, rows, lambda r: (r[0], money(float(r[1])), str(r[2])))
+
+
+class CalendarioPage(QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        root = QVBoxLayout(self)
+        root.setContentsMargins(18, 16, 18, 18)
+        root.setSpacing(12)
+
+        header = QHBoxLayout()
+        title = QLabel("Calendário")
+        title.setObjectName("H2")
+        header.addWidget(title)
+        header.addStretch(1)
+
+        self.btn_prev = QPushButton("◀")
+        self.btn_prev.setObjectName("BtnGhost")
+        self.btn_prev.setCursor(Qt.PointingHandCursor)
+        self.lbl_ano = QLabel("—")
+        self.lbl_ano.setObjectName("PanelTitle")
+        self.btn_next = QPushButton("▶")
+        self.btn_next.setObjectName("BtnGhost")
+        self.btn_next.setCursor(Qt.PointingHandCursor)
+        header.addWidget(self.btn_prev)
+        header.addWidget(self.lbl_ano)
+        header.addWidget(self.btn_next)
 
-        self.chart.removeAllSeries()
+        root.addLayout(header)
 
-        barset = QBarSet("Gastos")
-        for t in totais:
-            barset.append(float(t))
+        panel = QFrame()
+        panel.setObjectName("Panel")
+        p = QVBoxLayout(panel)
+        p.setContentsMargins(12, 12, 12, 12)
+        p.setSpacing(10)
 
-        series = QBarSeries()
-        series.append(barset)
-        self.chart.addSeries(series)
+        self.lbl_resumo = QLabel("—")
+        self.lbl_resumo.setObjectName("Subtle")
+        p.addWidget(self.lbl_resumo)
 
-        axisX = QBarCategoryAxis()
-        axisX.append(meses)
+        self.heatmap = HeatmapCalendario()
+        p.addWidget(self.heatmap)
+        root.addWidget(panel)
 
-        axisY = QValueAxis()
-        axisY.setMin(0)
-        axisY.setMax(max([1.0] + [float(x) for x in totais]) * 1.2)
+        # gastos do dia clicado
+        dia = QFrame()
+        dia.setObjectName("Panel")
+        d = QVBoxLayout(dia)
+        d.setContentsMargins(12, 12, 12, 12)
+        d.setSpacing(10)
+        self.lbl_dia = QLabel("Clique num dia para ver os gastos.")
+        self.lbl_dia.setObjectName("PanelTitle")
+        d.addWidget(self.lbl_dia)
 
-        self.chart.setAxisX(axisX, series)
-        self.chart.setAxisY(axisY, series)
+        self.table = QTableWidget(0, 4)
+        self.table.setHorizontalHeaderLabels(["ID", "Categoria", "Descrição", "Valor"])
+        self.table.verticalHeader().setVisible(False)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setAlternatingRowColors(True)
+        self.table.setShowGrid(False)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
+        d.addWidget(self.table)
+        root.addWidget(dia, 1)
+
+    def set_ano(self, ano: int, dias: dict):
+        self.lbl_ano.setText(str(ano))
+        self.heatmap.set_dados(ano, dias)
+        total = sum(t for t, _ in dias.values())
+        ativos = sum(1 for t, _ in dias.values() if t > 0)
+        self.lbl_resumo.setText(f"{money(total)} em {ativos} dia(s) com gastos")
+
+    def set_dia(self, dia: str, rows):
+        total = sum(float(r[3]) for r in rows)
+        self.lbl_dia.setText(f"{br_date(dia)} • {money(total)}")
+        self.table.setRowCount(len(rows))
+        for i, (gid, cat, desc, val) in enumerate(rows):
+            self.table.setItem(i, 0, QTableWidgetItem(str(gid)))
+            self.table.setItem(i, 1, QTableWidgetItem(cat or "—"))
+            self.table.setItem(i, 2, QTableWidgetItem(desc or ""))
+            self.table.setItem(i, 3, QTableWidgetItem(money(float(val))))
 
 
 class FechamentosPage(QWidget):
@@ -616,9 +5114,11 @@ class FechamentosPage(QWidget):
 
         root.addWidget(panel)
 
-    def set_month_summary(self, mes: str, total: float, salario: float):
-        saldo = salario - total
-        self.lbl_info.setText(f"Mês atual: {mes}  •  Gastos: {money(total)}  •  Saldo: {money(saldo)}")
+    def set_month_summary(self, mes: str, total: float, salario: float, receitas: float = 0.0):
+        saldo = salario + receitas - total
+        self.lbl_info.setText(
+            f"Mês atual: {mes}  •  Gastos: {money(total)}  •  Receitas: {money(receitas)}  •  Saldo: {money(saldo)}"
+        )
 
 
 
@@ -687,9 +5187,12 @@ class SalaryDialog(FormDialog):
         return float(self.input.text().replace(",", "."))
 
 class ExpenseDialog(FormDialog):
-    def __init__(self, parent=None, expense_id=None):
+    def __init__(self, parent=None, expense_id=None, data_padrao=None, miniaturas=None):
         super().__init__("Gasto" if expense_id is None else f"Editar gasto #{expense_id}", parent)
         self.expense_id = expense_id
+        self.miniaturas = miniaturas
+        self.anexos_novos = []       # caminhos escolhidos nesta edição
+        self.anexos_removidos = []   # ids de anexos já gravados
 
         self.cmb_cat = QComboBox()
         self.cmb_cat.addItems(CATEGORIAS)
@@ -697,21 +5200,84 @@ class ExpenseDialog(FormDialog):
         self.inp_val = QLineEdit()
         self.inp_val.setPlaceholderText("Ex: 39,90")
 
+        # em outra moeda o valor vai para reais pela cotação do dia (Câmbio)
+        self.cmb_moeda = QComboBox()
+        conn = conectar()
+        self.cmb_moeda.addItems(moedas_disponiveis(conn.cursor()))
+        conn.close()
+        valor_row = QHBoxLayout()
+        valor_row.addWidget(self.inp_val, 1)
+        valor_row.addWidget(self.cmb_moeda)
+        self.lbl_cambio = QLabel("")
+        self.lbl_cambio.setObjectName("Subtle")
+        self.lbl_cambio.hide()
+
         self.inp_date = QLineEdit()
         self.inp_date.setPlaceholderText("DD/MM/AAAA")
-        self.inp_date.setText(date.today().strftime("%d/%m/%Y"))
+        self.inp_date.setText((data_padrao or date.today()).strftime("%d/%m/%Y"))
 
         self.inp_desc = QLineEdit()
         self.inp_desc.setPlaceholderText("Opcional")
 
+        self.inp_tags = QLineEdit()
+        self.inp_tags.setPlaceholderText("Ex: viagem, casa (separadas por vírgula)")
+
+        # partes do valor em outras categorias; o resto fica na categoria acima
+        self.table_div = QTableWidget(0, 2)
+        self.table_div.setHorizontalHeaderLabels(["Categoria", "Valor (R$)"])
+        self.table_div.verticalHeader().setVisible(False)
+        self.table_div.setShowGrid(False)
+        self.table_div.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table_div.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeToContents)
+        self.table_div.setMaximumHeight(130)
+        self.table_div.hide()
+        self.btn_div = QPushButton("+ Dividir em outra categoria")
+        self.btn_div.setObjectName("BtnGhost")
+        self.btn_div.clicked.connect(lambda: self._add_divisao())
+
+        # comprovantes (fotos/PDF): miniaturas chegam em segundo plano
+        self.lst_anexos = QListWidget()
+        self.lst_anexos.setViewMode(QListWidget.IconMode)
+        self.lst_anexos.setIconSize(QSize(MINIATURA_PX, MINIATURA_PX))
+        self.lst_anexos.setMaximumHeight(MINIATURA_PX + 48)
+        self.lst_anexos.setResizeMode(QListWidget.Adjust)
+        self.lst_anexos.itemDoubleClicked.connect(self._abrir_anexo)
+        self.lst_anexos.hide()
+        self._ouvindo_miniaturas = self.miniaturas is not None
+        if self._ouvindo_miniaturas:
+            self.miniaturas.pronta.connect(self._miniatura_pronta)
+        anexos_row = QHBoxLayout()
+        self.btn_anexar = QPushButton("+ Comprovante…")
+        self.btn_anexar.setObjectName("BtnGhost")
+        self.btn_anexar.clicked.connect(self._escolher_anexos)
+        self.btn_anexo_del = QPushButton("Remover comprovante")
+        self.btn_anexo_del.setObjectName("BtnGhost")
+        self.btn_anexo_del.clicked.connect(self._remover_anexo)
+        self.btn_anexo_del.hide()
+        anexos_row.addWidget(self.btn_anexar)
+        anexos_row.addWidget(self.btn_anexo_del)
+        anexos_row.addStretch(1)
+
+        # sugere a categoria pela descrição até a pessoa escolher uma
+        self._cat_manual = expense_id is not None
+        self.cmb_cat.activated.connect(self._marcar_cat_manual)
+        self.inp_desc.textEdited.connect(self._sugerir_categoria)
+
         self.lay.addWidget(QLabel("Categoria"))
         self.lay.addWidget(self.cmb_cat)
-        self.lay.addWidget(QLabel("Valor (R$)"))
-        self.lay.addWidget(self.inp_val)
+        self.lay.addWidget(QLabel("Valor"))
+        self.lay.addLayout(valor_row)
+        self.lay.addWidget(self.lbl_cambio)
         self.lay.addWidget(QLabel("Data (DD/MM/AAAA)"))
         self.lay.addWidget(self.inp_date)
         self.lay.addWidget(QLabel("Descrição (opcional)"))
         self.lay.addWidget(self.inp_desc)
+        self.lay.addWidget(QLabel("Tags (opcional)"))
+        self.lay.addWidget(self.inp_tags)
+        self.lay.addWidget(self.table_div)
+        self.lay.addWidget(self.btn_div)
+        self.lay.addWidget(self.lst_anexos)
+        self.lay.addLayout(anexos_row)
 
         if self.expense_id is not None:
             self._load()
@@ -721,27 +5287,123 @@ class ExpenseDialog(FormDialog):
             self.btn_del.clicked.connect(self._delete)
             self.actions.insertWidget(0, self.btn_del)
 
+    def _marcar_cat_manual(self, *_):
+        self._cat_manual = True
+
+    def _add_divisao(self, cat: str = None, valor: float = None):
+        """Uma linha de divisão; valor vazio some ao salvar."""
+        t = self.table_div
+        i = t.rowCount()
+        t.insertRow(i)
+        cmb = QComboBox()
+        cmb.addItems(CATEGORIAS)
+        if cat:
+            if cat not in CATEGORIAS:
+                cmb.addItem(cat)
+            cmb.setCurrentText(cat)
+        t.setCellWidget(i, 0, cmb)
+        t.setItem(i, 1, QTableWidgetItem(f"{valor:.2f}".replace(".", ",") if valor else ""))
+        t.show()
+        self.resize(self.width(), max(self.height(), 560))
+
+    def _add_anexo(self, nome: str, hash_: str = None, anexo_id: int = None, caminho: str = None):
+        item = QListWidgetItem(self.style().standardIcon(QStyle.SP_FileIcon), nome)
+        item.setData(Qt.UserRole, (anexo_id, hash_, caminho))
+        item.setToolTip(nome)
+        self.lst_anexos.addItem(item)
+        self.lst_anexos.show()
+        self.btn_anexo_del.show()
+        if hash_:
+            self._miniatura_pronta(hash_)
+
+    def _miniatura_pronta(self, hash_: str):
+        for i in range(self.lst_anexos.count()):
+            item = self.lst_anexos.item(i)
+            if item.data(Qt.UserRole)[1] == hash_:
+                pix = self.miniaturas.obter(hash_) if self.miniaturas is not None else None
+                if pix is not None:
+                    item.setIcon(QIcon(pix))
+
+    def done(self, r):
+        # o cache de miniaturas é da janela: diálogo fechado não fica ouvindo
+        if self.miniaturas is not None and self._ouvindo_miniaturas:
+            self.miniaturas.pronta.disconnect(self._miniatura_pronta)
+            self._ouvindo_miniaturas = False
+        super().done(r)
+
+    def _escolher_anexos(self):
+        caminhos, _ = QFileDialog.getOpenFileNames(self, "Anexar comprovante", "", FILTRO_ANEXOS)
+        for c in caminhos:
+            self.anexos_novos.append(c)
+            self._add_anexo(os.path.basename(c), caminho=c)
+
+    def _remover_anexo(self):
+        item = self.lst_anexos.currentItem()
+        if not item:
+            return
+        anexo_id, _, caminho = item.data(Qt.UserRole)
+        if anexo_id is not None:
+            self.anexos_removidos.append(anexo_id)
+        elif caminho in self.anexos_novos:
+            self.anexos_novos.remove(caminho)
+        self.lst_anexos.takeItem(self.lst_anexos.row(item))
+
+    def _abrir_anexo(self, item):
+        _, hash_, caminho = item.data(Qt.UserRole)
+        try:
+            caminho = caminho or abrir_anexo(hash_, item.text())
+        except OSError as e:
+            msg_err(self, "Comprovante", f"Não foi possível abrir o arquivo.\n\n{e}")
+            return
+        QDesktopServices.openUrl(QUrl.fromLocalFile(caminho))
+
+    def _sugerir_categoria(self, texto: str):
+        if self._cat_manual:
+            return
+        cat, conf = obter_classificador().classificar(texto, CATEGORIAS)
+        if cat and conf >= 0.4:
+            self.cmb_cat.setCurrentText(cat)
+            self.cmb_cat.setToolTip(f"Sugerido pelo histórico ({conf:.0%})")
+
     def _load(self):
         conn = conectar()
         cur = conn.cursor()
-        cur.execute("SELECT categoria, valor, descricao, data FROM gastos WHERE id=?", (self.expense_id,))
+        cur.execute(CONSULTAS["gasto_por_id"], (self.expense_id,))
         row = cur.fetchone()
         conn.close()
         if not row:
             return
-        cat, val, desc, dt = row
+        _, cat, val, desc, dt, _, _ = row
         if cat in CATEGORIAS:
             self.cmb_cat.setCurrentText(cat)
         self.inp_val.setText(f"{float(val):.2f}")
         self.inp_desc.setText(desc or "")
         self.inp_date.setText(br_date(dt))
 
+        conn = conectar()
+        cur = conn.cursor()
+        cur.execute(CONSULTAS["cambio_por_gasto"], (self.expense_id,))
+        moeda, original, taxa = cur.fetchone()
+        if moeda not in (None, MOEDA_BASE) and original is not None:
+            if self.cmb_moeda.findText(moeda) < 0:
+                self.cmb_moeda.addItem(moeda)
+            self.cmb_moeda.setCurrentText(moeda)
+            self.inp_val.setText(f"{float(original):.2f}")
+            self.lbl_cambio.setText(f"Em reais: {money(float(val))} (cotação {taxa:.4f})")
+            self.lbl_cambio.show()
+        for c, v in obter_divisoes(cur, self.expense_id):
+            self._add_divisao(c, v)
+        self.inp_tags.setText(", ".join(obter_tags(cur, self.expense_id)))
+        for anexo_id, hash_, nome, _ in listar_anexos(cur, self.expense_id):
+            self._add_anexo(nome or hash_[:12], hash_=hash_, anexo_id=anexo_id)
+        conn.close()
+
     def _delete(self):
         if not msg_yesno(self, "Confirmar", f"Deletar gasto #{self.expense_id}?"):
             return
         conn = conectar()
         cur = conn.cursor()
-        cur.execute("DELETE FROM gastos WHERE id=?", (self.expense_id,))
+        remover_gasto(cur, self.expense_id)
         conn.commit()
         conn.close()
         self.done(2)
@@ -753,6 +5415,202 @@ class ExpenseDialog(FormDialog):
         desc = self.inp_desc.text().strip()
         return cat, val, desc, dt
 
+    def get_divisoes(self):
+        """[(categoria, valor)] das linhas preenchidas (ValueError se um valor não for número)."""
+        divisoes = []
+        for i in range(self.table_div.rowCount()):
+            item = self.table_div.item(i, 1)
+            texto = (item.text() if item else "").strip()
+            if texto:
+                divisoes.append((self.table_div.cellWidget(i, 0).currentText(), float(texto.replace(",", "."))))
+        return divisoes
+
+    def get_tags(self):
+        return ler_tags(self.inp_tags.text())
+
+    def get_moeda(self):
+        return self.cmb_moeda.currentText()
+
+class OrcamentosDialog(FormDialog):
+    """Limite mensal por categoria. Deixe em branco para não ter orçamento."""
+    def __init__(self, parent=None):
+        super().__init__("Orçamentos", parent)
+        self.resize(460, 420)
+
+        title = QLabel("Orçamento mensal por categoria")
+        title.setObjectName("PanelTitle")
+        desc = QLabel("Você é avisado ao passar de 80% e de 100% do limite.")
+        desc.setObjectName("Subtle")
+        self.lay.addWidget(title)
+        self.lay.addWidget(desc)
+
+        limites = obter_orcamentos()
+        categorias = CATEGORIAS + sorted(c for c in limites if c not in CATEGORIAS)
+
+        self.table = QTableWidget(len(categorias), 2)
+        self.table.setHorizontalHeaderLabels(["Categoria", "Limite (R$)"])
+        self.table.verticalHeader().setVisible(False)
+        self.table.setShowGrid(False)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeToContents)
+        for i, cat in enumerate(categorias):
+            item = QTableWidgetItem(cat)
+            item.setFlags(item.flags() & ~Qt.ItemIsEditable)
+            self.table.setItem(i, 0, item)
+            lim = limites.get(cat)
+            self.table.setItem(i, 1, QTableWidgetItem(f"{lim:.2f}".replace(".", ",") if lim else ""))
+        self.lay.addWidget(self.table)
+
+    def get_payload(self) -> dict:
+        limites = {}
+        for i in range(self.table.rowCount()):
+            texto = (self.table.item(i, 1).text() if self.table.item(i, 1) else "").strip()
+            limites[self.table.item(i, 0).text()] = float(texto.replace(",", ".")) if texto else 0.0
+        return limites
+
+class ArquivoDialog(FormDialog):
+    """Escolhe um ano fechado para mover ao arquivo compactado."""
+    def __init__(self, parent=None):
+        super().__init__("Arquivar ano", parent)
+        self.resize(480, 320)
+        self.btn_ok.setText("Arquivar")
+
+        title = QLabel("Arquivar ano fechado")
+        title.setObjectName("PanelTitle")
+        desc = QLabel(
+            "Os gastos do ano saem do banco principal e vão para um arquivo compactado.\n"
+            "Totais, gráficos e comparativos continuam iguais; os meses ficam só para leitura."
+        )
+        desc.setObjectName("Subtle")
+        desc.setWordWrap(True)
+        self.lay.addWidget(title)
+        self.lay.addWidget(desc)
+
+        self.cmb_ano = QComboBox()
+        for ano, n, total in anos_arquivaveis():
+            self.cmb_ano.addItem(f"{ano} • {n} gasto(s) • {money(total)}", ano)
+        self.lay.addWidget(self.cmb_ano)
+        self.btn_ok.setEnabled(self.cmb_ano.count() > 0)
+        if not self.cmb_ano.count():
+            vazio = QLabel("Nenhum ano pronto: só anos anteriores com todos os meses fechados.")
+            vazio.setObjectName("Subtle")
+            self.lay.addWidget(vazio)
+
+        arquivados = anos_arquivados()
+        if arquivados:
+            lbl = QLabel("Já arquivados: " + ", ".join(f"{a} ({n})" for a, n, _ in arquivados))
+            lbl.setObjectName("Subtle")
+            lbl.setWordWrap(True)
+            self.lay.addWidget(lbl)
+        self.lay.addStretch(1)
+
+    def get_payload(self) -> int:
+        return self.cmb_ano.currentData()
+
+class PerfilDialog(FormDialog):
+    def __init__(self, parent=None):
+        super().__init__("Novo perfil", parent)
+        self.resize(460, 240)
+        self.btn_ok.setText("Criar")
+
+        title = QLabel("Novo perfil")
+        title.setObjectName("PanelTitle")
+        desc = QLabel("Cada perfil tem o próprio banco (gastos, fixos, orçamentos e backups).")
+        desc.setObjectName("Subtle")
+        desc.setWordWrap(True)
+
+        self.input = QLineEdit()
+        self.input.setPlaceholderText("Ex: Casa, Empresa")
+
+        self.lay.addWidget(title)
+        self.lay.addWidget(desc)
+        self.lay.addWidget(self.input)
+        self.lay.addStretch(1)
+
+    def get_value(self) -> str:
+        return self.input.text().strip()
+
+class RelatoriosDialog(FormDialog):
+    def __init__(self, parent=None):
+        super().__init__("Relatórios anuais", parent)
+        self.resize(480, 320)
+        self.btn_ok.setText("Gerar")
+
+        title = QLabel("Relatórios anuais")
+        title.setObjectName("PanelTitle")
+        desc = QLabel("HTML para imprimir, com tabela mês a mês, categorias e gráficos. Anos sem mudança saem do cache.")
+        desc.setObjectName("Subtle")
+        desc.setWordWrap(True)
+        self.lay.addWidget(title)
+        self.lay.addWidget(desc)
+
+        anos = anos_relatorio()
+        linha = QHBoxLayout()
+        self.cmb_de = QComboBox()
+        self.cmb_ate = QComboBox()
+        for ano in anos:
+            self.cmb_de.addItem(str(ano), ano)
+            self.cmb_ate.addItem(str(ano), ano)
+        self.cmb_ate.setCurrentIndex(self.cmb_ate.count() - 1)
+        linha.addWidget(QLabel("De"))
+        linha.addWidget(self.cmb_de, 1)
+        linha.addWidget(QLabel("até"))
+        linha.addWidget(self.cmb_ate, 1)
+        self.lay.addLayout(linha)
+
+        self.chk_xlsx = QCheckBox("Gerar também planilha XLSX")
+        self.chk_xlsx.setEnabled(HAS_XLSX)
+        if not HAS_XLSX:
+            self.chk_xlsx.setToolTip("Instale o openpyxl para gerar XLSX")
+        self.chk_todos = QCheckBox("Todos os perfis")
+        self.lay.addWidget(self.chk_xlsx)
+        self.lay.addWidget(self.chk_todos)
+        self.lay.addStretch(1)
+        self.btn_ok.setEnabled(bool(anos))
+
+    def get_payload(self) -> dict:
+        de, ate = sorted((self.cmb_de.currentData(), self.cmb_ate.currentData()))
+        return {
+            "anos": list(range(de, ate + 1)),
+            "perfis": [slug for slug, _ in listar_perfis()] if self.chk_todos.isChecked() else None,
+            "xlsx": self.chk_xlsx.isChecked(),
+        }
+
+class ConsolidadoDialog(FormDialog):
+    """Todos os perfis lado a lado num mês (consulta única via ATTACH)."""
+    def __init__(self, mes: str, parent=None):
+        super().__init__("Consolidado", parent)
+        self.resize(760, 380)
+        self.btn_ok.setText("Fechar")
+        self.btn_cancel.hide()
+
+        title = QLabel(f"Consolidado • {mes}")
+        title.setObjectName("PanelTitle")
+        desc = QLabel("Salário, receitas e gastos do mês em todos os perfis; acumulado até o mês.")
+        desc.setObjectName("Subtle")
+        self.lay.addWidget(title)
+        self.lay.addWidget(desc)
+
+        linhas = resumo_consolidado(mes)
+        if len(linhas) > 1:
+            somas = [sum(l[i] for l in linhas) for i in range(1, 6)]
+            linhas.append(("Total", *somas))
+
+        self.table = QTableWidget(len(linhas), 6)
+        self.table.setHorizontalHeaderLabels(["Perfil", "Salário", "Receitas", "Gastos", "Saldo", "Acumulado"])
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setAlternatingRowColors(True)
+        self.table.setShowGrid(False)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        for c in range(1, 6):
+            self.table.horizontalHeader().setSectionResizeMode(c, QHeaderView.ResizeToContents)
+        for r, (nome, *valores) in enumerate(linhas):
+            self.table.setItem(r, 0, QTableWidgetItem(nome))
+            for c, v in enumerate(valores, start=1):
+                self.table.setItem(r, c, QTableWidgetItem(money(v)))
+        self.lay.addWidget(self.table)
+
 class FixosDialog(FormDialog):
     """
     Gerenciador de gastos fixos.
@@ -773,7 +5631,7 @@ class FixosDialog(FormDialog):
 
         title = QLabel("Fixos (recorrentes)")
         title.setObjectName("PanelTitle")
-        desc = QLabel("Eles são lançados automaticamente no início de cada mês.")
+        desc = QLabel("Lançados automaticamente nas datas da regra (mensal, semanal, anual ou parcelado).")
         desc.setObjectName("Subtle")
         self.lay.addWidget(title)
         self.lay.addWidget(desc)
@@ -795,6 +5653,20 @@ class FixosDialog(FormDialog):
         self.inp_desc = QLineEdit()
         self.inp_desc.setPlaceholderText("Descrição (opcional)")
 
+        self.cmb_freq = QComboBox()
+        for k, label in FREQUENCIAS.items():
+            self.cmb_freq.addItem(label, k)
+
+        self.inp_inicio = QLineEdit()
+        self.inp_inicio.setPlaceholderText("DD/MM/AAAA")
+        self.inp_inicio.setText(date.today().replace(day=1).strftime("%d/%m/%Y"))
+
+        self.inp_fim = QLineEdit()
+        self.inp_fim.setPlaceholderText("Opcional")
+
+        self.inp_parcelas = QLineEdit()
+        self.inp_parcelas.setPlaceholderText("Ex: 12 (opcional)")
+
         self.btn_add = QPushButton("+ Adicionar fixo")
         self.btn_add.setObjectName("BtnAccent")
         self.btn_add.clicked.connect(self.add_fixo)
@@ -803,15 +5675,23 @@ class FixosDialog(FormDialog):
         f.addWidget(self.cmb_cat, 1, 0)
         f.addWidget(QLabel("Valor (R$)"), 0, 1)
         f.addWidget(self.inp_val, 1, 1)
-        f.addWidget(QLabel("Descrição"), 0, 2)
-        f.addWidget(self.inp_desc, 1, 2)
-        f.addWidget(self.btn_add, 2, 0, 1, 3)
+        f.addWidget(QLabel("Descrição"), 0, 2, 1, 2)
+        f.addWidget(self.inp_desc, 1, 2, 1, 2)
+        f.addWidget(QLabel("Frequência"), 2, 0)
+        f.addWidget(self.cmb_freq, 3, 0)
+        f.addWidget(QLabel("Primeira data"), 2, 1)
+        f.addWidget(self.inp_inicio, 3, 1)
+        f.addWidget(QLabel("Até (DD/MM/AAAA)"), 2, 2)
+        f.addWidget(self.inp_fim, 3, 2)
+        f.addWidget(QLabel("Parcelas"), 2, 3)
+        f.addWidget(self.inp_parcelas, 3, 3)
+        f.addWidget(self.btn_add, 4, 0, 1, 4)
 
         self.lay.addWidget(form)
 
         # Table
-        self.table = QTableWidget(0, 4)
-        self.table.setHorizontalHeaderLabels(["ID", "Categoria", "Valor", "Ativo"])
+        self.table = QTableWidget(0, 5)
+        self.table.setHorizontalHeaderLabels(["ID", "Categoria", "Valor", "Regra", "Ativo"])
         self.table.verticalHeader().setVisible(False)
         self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
@@ -821,6 +5701,7 @@ class FixosDialog(FormDialog):
         self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
         self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeToContents)
         self.table.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setSectionResizeMode(4, QHeaderView.ResizeToContents)
         self.lay.addWidget(self.table)
 
         # Actions row
@@ -838,24 +5719,208 @@ class FixosDialog(FormDialog):
         act.addStretch(1)
         self.lay.addLayout(act)
 
-        self.load_fixos()
+        self.load_fixos()
+
+    def load_fixos(self):
+        conn = conectar()
+        cur = conn.cursor()
+        cur.execute(CONSULTAS["fixos_lista"])
+        preencher_tabela(self.table, cur, lambda r: (
+            str(r[0]), r[1], money(float(r[2])), descrever_regra(r[4], r[5], r[6], r[7]), "Sim" if int(r[3]) == 1 else "Não"
+        ))
+        conn.close()
+
+    def _selected_id(self):
+        r = self.table.currentRow()
+        if r < 0:
+            return None
+        item = self.table.item(r, 0)
+        if not item:
+            return None
+        try:
+            return int(item.text())
+        except Exception:
+            return None
+
+    def add_fixo(self):
+        try:
+            val = float(self.inp_val.text().replace(",", "."))
+        except Exception:
+            msg_err(self, "Erro", "Valor inválido.")
+            return
+
+        try:
+            inicio = iso_date(self.inp_inicio.text())
+            fim = iso_date(self.inp_fim.text()) if self.inp_fim.text().strip() else None
+            parcelas = int(self.inp_parcelas.text()) if self.inp_parcelas.text().strip() else None
+        except Exception:
+            msg_err(self, "Erro", "Datas ou parcelas inválidas.")
+            return
+        if (fim and fim < inicio) or (parcelas is not None and parcelas < 1):
+            msg_err(self, "Erro", "O fim precisa ser depois da primeira data e as parcelas maiores que zero.")
+            return
+
+        cat = self.cmb_cat.currentText()
+        desc = self.inp_desc.text().strip()
+        freq = self.cmb_freq.currentData()
+
+        conn = conectar()
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO fixos (categoria, valor, descricao, ativo, frequencia, inicio, fim, parcelas)
+            VALUES (?,?,?,1,?,?,?,?)
+        """, (cat, val, desc, freq, inicio, fim, parcelas))
+        conn.commit()
+        conn.close()
+
+        # lança o que já venceu sem duplicar
+        aplicar_fixos_automaticos()
+
+        self.inp_val.clear()
+        self.inp_desc.clear()
+        self.inp_fim.clear()
+        self.inp_parcelas.clear()
+        self.load_fixos()
+
+    def toggle_ativo(self):
+        fid = self._selected_id()
+        if fid is None:
+            msg_err(self, "Ativar/Pausar", "Selecione um fixo na lista.")
+            return
+
+        conn = conectar()
+        cur = conn.cursor()
+        cur.execute(CONSULTAS["fixo_ativo"], (fid,))
+        row = cur.fetchone()
+        if not row:
+            conn.close()
+            return
+        atual = int(row[0] or 0)
+        novo = 0 if atual == 1 else 1
+        cur.execute("UPDATE fixos SET ativo=? WHERE id=?", (novo, fid))
+        if novo == 1:
+            # reativado: ignora o que venceu enquanto estava pausado (exceto o mês atual)
+            primeiro = date.today().replace(day=1)
+            cur.execute(
+                "DELETE FROM fixos_ocorrencias WHERE fixo_id=? AND aplicado=0 AND data < ?",
+                (fid, primeiro.isoformat())
+            )
+            cur.execute(
+                "UPDATE fixos SET gerado_ate=MAX(COALESCE(gerado_ate, ''), ?) WHERE id=?",
+                ((primeiro - timedelta(days=1)).isoformat(), fid)
+            )
+        conn.commit()
+        conn.close()
+        self.load_fixos()
+
+    def delete_fixo(self):
+        fid = self._selected_id()
+        if fid is None:
+            msg_err(self, "Deletar", "Selecione um fixo na lista.")
+            return
+        if not msg_yesno(self, "Confirmar", f"Deletar fixo #{fid}?"):
+            return
+        conn = conectar()
+        cur = conn.cursor()
+        cur.execute("DELETE FROM fixos WHERE id=?", (fid,))
+        cur.execute("DELETE FROM fixos_ocorrencias WHERE fixo_id=?", (fid,))
+        conn.commit()
+        conn.close()
+        self.load_fixos()
+
+
+class ReceitasDialog(FormDialog):
+    """
+    Receitas extras do mês atual (freelance, reembolso, venda...).
+    - Adicionar
+    - Deletar
+    O salário continua sendo editado em "Salário".
+    """
+    def __init__(self, parent=None, mes=None):
+        super().__init__("Receitas", parent)
+        self.resize(720, 520)
+
+        self.btn_ok.setText("Fechar")
+        self.btn_ok.clicked.disconnect()
+        self.btn_ok.clicked.connect(self.accept)
+
+        self.btn_cancel.hide()
+
+        self.mes = mes or date.today().strftime("%Y-%m")
+
+        title = QLabel(f"Receitas extras • {self.mes}")
+        title.setObjectName("PanelTitle")
+        desc = QLabel("Entram no saldo do mês junto com o salário.")
+        desc.setObjectName("Subtle")
+        self.lay.addWidget(title)
+        self.lay.addWidget(desc)
+
+        form = QFrame()
+        form.setObjectName("InlineBox")
+        f = QGridLayout(form)
+        f.setContentsMargins(0, 0, 0, 0)
+        f.setHorizontalSpacing(10)
+        f.setVerticalSpacing(8)
+
+        self.cmb_cat = QComboBox()
+        self.cmb_cat.addItems(CATEGORIAS_RECEITA)
+
+        self.inp_val = QLineEdit()
+        self.inp_val.setPlaceholderText("Valor (ex: 350,00)")
+
+        self.inp_date = QLineEdit()
+        self.inp_date.setPlaceholderText("DD/MM/AAAA")
+        self.inp_date.setText(data_padrao_mes(self.mes).strftime("%d/%m/%Y"))
+
+        self.inp_desc = QLineEdit()
+        self.inp_desc.setPlaceholderText("Descrição (opcional)")
+
+        self.btn_add = QPushButton("+ Adicionar receita")
+        self.btn_add.setObjectName("BtnAccent")
+        self.btn_add.clicked.connect(self.add_receita)
+
+        f.addWidget(QLabel("Categoria"), 0, 0)
+        f.addWidget(self.cmb_cat, 1, 0)
+        f.addWidget(QLabel("Valor (R$)"), 0, 1)
+        f.addWidget(self.inp_val, 1, 1)
+        f.addWidget(QLabel("Data"), 0, 2)
+        f.addWidget(self.inp_date, 1, 2)
+        f.addWidget(QLabel("Descrição"), 0, 3)
+        f.addWidget(self.inp_desc, 1, 3)
+        f.addWidget(self.btn_add, 2, 0, 1, 4)
+
+        self.lay.addWidget(form)
+
+        self.table = QTableWidget(0, 4)
+        self.table.setHorizontalHeaderLabels(["ID", "Categoria", "Valor", "Data"])
+        self.table.verticalHeader().setVisible(False)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setAlternatingRowColors(True)
+        self.table.setShowGrid(False)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeToContents)
+        self.lay.addWidget(self.table)
+
+        act = QHBoxLayout()
+        self.btn_del = QPushButton("Deletar")
+        self.btn_del.setObjectName("BtnGhostDanger")
+        self.btn_del.clicked.connect(self.delete_receita)
+        act.addWidget(self.btn_del)
+        act.addStretch(1)
+        self.lay.addLayout(act)
+
+        self.load_receitas()
 
-    def load_fixos(self):
+    def load_receitas(self):
         conn = conectar()
         cur = conn.cursor()
-        cur.execute("SELECT id, categoria, valor, ativo FROM fixos ORDER BY id DESC")
-        rows = cur.fetchall()
+        cur.execute(CONSULTAS["receitas_mes"], faixa_mes(self.mes))
+        preencher_tabela(self.table, cur, lambda r: (str(r[0]), r[1], money(float(r[2])), br_date(r[3])))
         conn.close()
 
-        self.table.setRowCount(0)
-        for fid, cat, val, ativo in rows:
-            r = self.table.rowCount()
-            self.table.insertRow(r)
-            self.table.setItem(r, 0, QTableWidgetItem(str(fid)))
-            self.table.setItem(r, 1, QTableWidgetItem(cat))
-            self.table.setItem(r, 2, QTableWidgetItem(money(float(val))))
-            self.table.setItem(r, 3, QTableWidgetItem("Sim" if int(ativo) == 1 else "Não"))
-
     def _selected_id(self):
         r = self.table.currentRow()
         if r < 0:
@@ -868,11 +5933,12 @@ class FixosDialog(FormDialog):
         except Exception:
             return None
 
-    def add_fixo(self):
+    def add_receita(self):
         try:
             val = float(self.inp_val.text().replace(",", "."))
+            dt = iso_date(self.inp_date.text())
         except Exception:
-            msg_err(self, "Erro", "Valor inválido.")
+            msg_err(self, "Erro", "Valor ou data inválidos.")
             return
 
         cat = self.cmb_cat.currentText()
@@ -880,50 +5946,154 @@ class FixosDialog(FormDialog):
 
         conn = conectar()
         cur = conn.cursor()
-        cur.execute("INSERT INTO fixos (categoria, valor, descricao, ativo) VALUES (?,?,?,1)", (cat, val, desc))
+        cur.execute("INSERT INTO receitas (categoria, valor, descricao, data) VALUES (?,?,?,?)", (cat, val, desc, dt))
         conn.commit()
         conn.close()
 
-        # aplica no mês atual sem duplicar
-        aplicar_fixos_automaticos()
-
         self.inp_val.clear()
         self.inp_desc.clear()
-        self.load_fixos()
+        self.load_receitas()
 
-    def toggle_ativo(self):
-        fid = self._selected_id()
-        if fid is None:
-            msg_err(self, "Ativar/Pausar", "Selecione um fixo na lista.")
+    def delete_receita(self):
+        rid = self._selected_id()
+        if rid is None:
+            msg_err(self, "Deletar", "Selecione uma receita na lista.")
+            return
+        if not msg_yesno(self, "Confirmar", f"Deletar receita #{rid}?"):
             return
+        conn = conectar()
+        cur = conn.cursor()
+        cur.execute("DELETE FROM receitas WHERE id=?", (rid,))
+        conn.commit()
+        conn.close()
+        self.load_receitas()
+
+
+class DuplicadosDialog(FormDialog):
+    """
+    Gastos suspeitos de duplicidade (encontrados na varredura ou em fixos).
+    - Não é duplicado: some da lista e não volta
+    - Deletar gasto: apaga o lançamento repetido
+    """
+    def __init__(self, parent=None):
+        super().__init__("Duplicados", parent)
+        self.resize(820, 520)
+
+        self.btn_ok.setText("Fechar")
+        self.btn_ok.clicked.disconnect()
+        self.btn_ok.clicked.connect(self.accept)
+
+        self.btn_cancel.hide()
+        self._tarefa = None
+
+        title = QLabel("Possíveis duplicados")
+        title.setObjectName("PanelTitle")
+        self.lbl_desc = QLabel("Mesmo valor, datas próximas e descrição parecida.")
+        self.lbl_desc.setObjectName("Subtle")
+        self.lay.addWidget(title)
+        self.lay.addWidget(self.lbl_desc)
+
+        self.table = QTableWidget(0, 6)
+        self.table.setHorizontalHeaderLabels(["ID", "Data", "Valor", "Descrição", "Parecido com", "Motivo"])
+        self.table.verticalHeader().setVisible(False)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setAlternatingRowColors(True)
+        self.table.setShowGrid(False)
+        for i in (0, 1, 2, 4):
+            self.table.horizontalHeader().setSectionResizeMode(i, QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setSectionResizeMode(3, QHeaderView.Stretch)
+        self.table.horizontalHeader().setSectionResizeMode(5, QHeaderView.Stretch)
+        self.lay.addWidget(self.table)
+
+        act = QHBoxLayout()
+        self.btn_scan = QPushButton("Verificar agora")
+        self.btn_scan.setObjectName("BtnGhost")
+        self.btn_scan.clicked.connect(self.verificar)
+
+        self.btn_ignorar = QPushButton("Não é duplicado")
+        self.btn_ignorar.setObjectName("BtnGhost")
+        self.btn_ignorar.clicked.connect(self.ignorar)
 
+        self.btn_del = QPushButton("Deletar gasto")
+        self.btn_del.setObjectName("BtnGhostDanger")
+        self.btn_del.clicked.connect(self.deletar)
+
+        act.addWidget(self.btn_scan)
+        act.addWidget(self.btn_ignorar)
+        act.addWidget(self.btn_del)
+        act.addStretch(1)
+        self.lay.addLayout(act)
+
+        self.load()
+
+    def load(self):
         conn = conectar()
         cur = conn.cursor()
-        cur.execute("SELECT ativo FROM fixos WHERE id=?", (fid,))
-        row = cur.fetchone()
-        if not row:
-            conn.close()
+        cur.execute(CONSULTAS["duplicados_pendentes"])
+        rows = cur.fetchall()
+        conn.close()
+
+        self.table.setRowCount(0)
+        for gid, dt, val, desc, oid, motivo in rows:
+            r = self.table.rowCount()
+            self.table.insertRow(r)
+            self.table.setItem(r, 0, QTableWidgetItem(str(gid)))
+            self.table.setItem(r, 1, QTableWidgetItem(br_date(dt)))
+            self.table.setItem(r, 2, QTableWidgetItem(money(float(val))))
+            self.table.setItem(r, 3, QTableWidgetItem(desc or ""))
+            self.table.setItem(r, 4, QTableWidgetItem(f"#{oid}"))
+            self.table.setItem(r, 5, QTableWidgetItem(motivo or ""))
+
+    def _selected_id(self):
+        r = self.table.currentRow()
+        if r < 0:
+            return None
+        item = self.table.item(r, 0)
+        return int(item.text()) if item else None
+
+    def verificar(self):
+        self.btn_scan.setEnabled(False)
+        self.lbl_desc.setText("Verificando em segundo plano…")
+        self._tarefa = Tarefa(verificar_duplicados)
+        self._tarefa.sinais.concluida.connect(self._verificado)
+        self._tarefa.sinais.falhou.connect(self._verificado)
+        QThreadPool.globalInstance().start(self._tarefa)
+
+    def _verificado(self, r):
+        self.btn_scan.setEnabled(True)
+        if isinstance(r, Exception):
+            self.lbl_desc.setText(f"Falha na verificação: {r}")
+        else:
+            self.lbl_desc.setText(f"Verificação concluída: {r} novo(s) suspeito(s).")
+        self.load()
+
+    def ignorar(self):
+        gid = self._selected_id()
+        if gid is None:
+            msg_err(self, "Duplicados", "Selecione um gasto na lista.")
             return
-        atual = int(row[0] or 0)
-        novo = 0 if atual == 1 else 1
-        cur.execute("UPDATE fixos SET ativo=? WHERE id=?", (novo, fid))
+        conn = conectar()
+        cur = conn.cursor()
+        cur.execute("UPDATE gastos_duplicados SET ignorado=1 WHERE gasto_id=?", (gid,))
         conn.commit()
         conn.close()
-        self.load_fixos()
+        self.load()
 
-    def delete_fixo(self):
-        fid = self._selected_id()
-        if fid is None:
-            msg_err(self, "Deletar", "Selecione um fixo na lista.")
+    def deletar(self):
+        gid = self._selected_id()
+        if gid is None:
+            msg_err(self, "Duplicados", "Selecione um gasto na lista.")
             return
-        if not msg_yesno(self, "Confirmar", f"Deletar fixo #{fid}?"):
+        if not msg_yesno(self, "Confirmar", f"Deletar gasto #{gid}?"):
             return
         conn = conectar()
         cur = conn.cursor()
-        cur.execute("DELETE FROM fixos WHERE id=?", (fid,))
+        remover_gasto(cur, gid)
+        cur.execute("DELETE FROM gastos_duplicados WHERE gasto_id=? OR original_id=?", (gid, gid))
         conn.commit()
         conn.close()
-        self.load_fixos()
+        self.load()
 
 
 # ======================
@@ -933,10 +6103,20 @@ class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
 
-        migrar_banco()
+        self.perfil = ativar_perfil(perfil_ativo())
         aplicar_fixos_automaticos()
         self.theme_key = obter_tema()
 
+        # mês exibido no dashboard + cache dos meses já vistos
+        self.mes_dash = datetime.now().strftime("%Y-%m")
+        self.mes_comp = None
+        self.ano_cal = date.today().year
+        self._projecao_chave = None
+        self._projecoes = None
+        self.cache_meses = CacheMeses()
+        # perfis usados há pouco: (cache dos meses, monitor com a conexão aberta)
+        self._perfis_quentes = OrderedDict()
+
         self.setWindowTitle("Virtum Finance")
         self.resize(1100, 720)
 
@@ -978,17 +6158,26 @@ class MainWindow(QMainWindow):
         s.addWidget(self.lbl_brand)
         s.addWidget(self.lbl_sub)
 
+        self.cmb_perfil = QComboBox()
+        self.cmb_perfil.setToolTip("Perfil (cada um com o próprio banco)")
+        self.cmb_perfil.activated.connect(self.on_perfil_escolhido)
+        s.addWidget(self.cmb_perfil)
+        self.carregar_perfis()
+
         s.addSpacing(4)
 
         self.btn_dash = SidebarButton("🏠", "Dashboard")
         self.btn_graph = SidebarButton("📊", "Gráfico mensal")
+        self.btn_comp = SidebarButton("📈", "Comparativo")
+        self.btn_cal = SidebarButton("🗓", "Calendário")
         self.btn_hist = SidebarButton("🗓️", "Histórico")
         self.btn_salary = SidebarButton("💰", "Salário")
+        self.btn_receitas = SidebarButton("💵", "Receitas")
         self.btn_fixos = SidebarButton("📌", "Fixos")
         self.btn_fech = SidebarButton("📅", "Fechamentos")
         self.btn_theme = SidebarButton("🎨", "Tema")
 
-        for b in [self.btn_dash, self.btn_graph, self.btn_hist, self.btn_salary, self.btn_fixos, self.btn_fech, self.btn_theme]:
+        for b in [self.btn_dash, self.btn_graph, self.btn_comp, self.btn_cal, self.btn_hist, self.btn_salary, self.btn_receitas, self.btn_fixos, self.btn_fech, self.btn_theme]:
             b.clicked.connect(self.on_sidebar_clicked)
             s.addWidget(b)
 
@@ -1008,9 +6197,13 @@ class MainWindow(QMainWindow):
         self.page_hist = HistoryPage()
         self.page_graph = GraphPage()
         self.page_fech = FechamentosPage()
+        self.page_comp = ComparacaoPage()
+        self.page_cal = CalendarioPage()
 
         self.stack.addWidget(self.page_dash)
         self.stack.addWidget(self.page_graph)
+        self.stack.addWidget(self.page_comp)
+        self.stack.addWidget(self.page_cal)
         self.stack.addWidget(self.page_hist)
         self.stack.addWidget(self.page_fech)
 
@@ -1020,10 +6213,22 @@ class MainWindow(QMainWindow):
 
         # actions
         self.page_dash.btn_new.clicked.connect(self.new_expense)
+        self.page_dash.btn_prev.clicked.connect(lambda: self.navegar_mes(-1))
+        self.page_dash.btn_next.clicked.connect(lambda: self.navegar_mes(1))
+        self.page_dash.btn_hoje.clicked.connect(lambda: self.navegar_mes(0))
         self.page_dash.table.cellDoubleClicked.connect(self.edit_selected_expense)
+        self.miniaturas = Miniaturas(self)
+        self.miniaturas.pronta.connect(self.mostrar_miniaturas)
+        self.page_dash.table.verticalScrollBar().valueChanged.connect(self.mostrar_miniaturas)
+        self.page_dash.btn_orc.clicked.connect(self.edit_orcamentos)
+        self.page_dash.btn_anom_ignorar.clicked.connect(self.ignorar_anomalia_selecionada)
         self.page_dash.btn_graph.clicked.connect(self.open_graph)
 
         self.page_hist.btn_delete.clicked.connect(self.delete_selected_closure)
+        self.page_comp.table_meses.cellClicked.connect(self.on_comparativo_mes)
+        self.page_cal.btn_prev.clicked.connect(lambda: self.navegar_ano(-1))
+        self.page_cal.btn_next.clicked.connect(lambda: self.navegar_ano(1))
+        self.page_cal.heatmap.dia_clicado.connect(self.on_calendario_dia)
 
         self.page_fech.btn_close_month.clicked.connect(self.close_month)
         self.page_fech.btn_graph.clicked.connect(self.open_graph)
@@ -1034,6 +6239,14 @@ class MainWindow(QMainWindow):
         act_sal.triggered.connect(self.edit_salary)
         men.addAction(act_sal)
 
+        act_rec = QAction("Receitas", self)
+        act_rec.triggered.connect(self.edit_receitas)
+        men.addAction(act_rec)
+
+        act_orc = QAction("Orçamentos", self)
+        act_orc.triggered.connect(self.edit_orcamentos)
+        men.addAction(act_orc)
+
         act_fix = QAction("Fixos", self)
         act_fix.triggered.connect(self.edit_fixos)
         men.addAction(act_fix)
@@ -1046,6 +6259,34 @@ class MainWindow(QMainWindow):
         act_theme.triggered.connect(self.edit_theme)
         men.addAction(act_theme)
 
+        act_imp = QAction("Importar extrato", self)
+        act_imp.triggered.connect(self.importar_extrato)
+        men.addAction(act_imp)
+
+        act_cambio = QAction("Câmbio", self)
+        act_cambio.triggered.connect(self.importar_cambio)
+        men.addAction(act_cambio)
+
+        act_arq = QAction("Arquivar ano", self)
+        act_arq.triggered.connect(self.arquivar_ano)
+        men.addAction(act_arq)
+
+        self.act_backup = QAction("Backup", self)
+        self.act_backup.triggered.connect(lambda: self.iniciar_backup(manual=True))
+        men.addAction(self.act_backup)
+
+        self.act_dup = QAction("Duplicados", self)
+        self.act_dup.triggered.connect(self.show_duplicados)
+        men.addAction(self.act_dup)
+
+        act_cons = QAction("Consolidado", self)
+        act_cons.triggered.connect(self.show_consolidado)
+        men.addAction(act_cons)
+
+        self.act_rel = QAction("Relatórios", self)
+        self.act_rel.triggered.connect(self.gerar_relatorios)
+        men.addAction(self.act_rel)
+
         # animations (min e max juntos)
         self.anim_group = QParallelAnimationGroup(self)
 
@@ -1061,7 +6302,73 @@ class MainWindow(QMainWindow):
         self.anim_group.addAnimation(self.anim_min)
 
         self.apply_styles()
+        self.monitor = MonitorBanco(self)
+        self.monitor.alterado.connect(self.on_banco_alterado)
+        self._tarefas = set()
         self.refresh_all()
+        # meses que viraram com o app fechado: fecha depois que a janela aparece
+        QTimer.singleShot(0, self.verificar_meses_pendentes)
+
+        # varredura de duplicados e carga do classificador depois que a janela já abriu
+        QTimer.singleShot(3000, lambda: self.iniciar_tarefa(verificar_duplicados, ao_concluir=self._duplicados_verificados))
+        QTimer.singleShot(500, lambda: self.iniciar_tarefa(obter_classificador))
+
+        # backup automático: confere a cada hora se o último já tem mais de um dia
+        self._backup_rodando = False
+        self.timer_backup = QTimer(self)
+        self.timer_backup.setInterval(60 * 60 * 1000)
+        self.timer_backup.timeout.connect(self.iniciar_backup)
+        self.timer_backup.start()
+        QTimer.singleShot(10000, self.iniciar_backup)
+        self._mostrar_ultimo_backup()
+
+        # ANALYZE / optimize / vacuum incremental quando o usuário está parado
+        self.manutencao = AgendadorManutencao(self)
+
+    def iniciar_tarefa(self, fn, *args, ao_concluir=None, ao_falhar=None):
+        """Roda fn(*args) em segundo plano; os callbacks rodam na thread da UI."""
+        tarefa = Tarefa(fn, *args)
+
+        def fim(r, cb):
+            self._tarefas.discard(tarefa)
+            if cb:
+                cb(r)
+
+        tarefa.sinais.concluida.connect(lambda r: fim(r, ao_concluir))
+        tarefa.sinais.falhou.connect(lambda e: fim(e, ao_falhar))
+        self._tarefas.add(tarefa)
+        QThreadPool.globalInstance().start(tarefa)
+        return tarefa
+
+    def iniciar_backup(self, manual: bool = False):
+        if self._backup_rodando or not (manual or backup_vencido()):
+            return
+        self._backup_rodando = True
+        self.act_backup.setText("Backup (copiando…)")
+
+        def ok(r):
+            self._backup_rodando = False
+            self._mostrar_ultimo_backup()
+            if manual:
+                QMessageBox.information(
+                    self, "Backup",
+                    f"Backup verificado e salvo em:\n{r['arquivo']}\n({r['bytes'] / 1024:.0f} KB)"
+                )
+
+        def falhou(e):
+            self._backup_rodando = False
+            self._mostrar_ultimo_backup()
+            msg_err(self, "Backup", f"Não foi possível fazer o backup:\n{e}")
+
+        self.iniciar_tarefa(fazer_backup, ao_concluir=ok, ao_falhar=falhou)
+
+    def _mostrar_ultimo_backup(self):
+        ult = ultimo_backup()
+        self.act_backup.setText(f"Backup ({ult:%d/%m %H:%M})" if ult else "Backup")
+
+    def _duplicados_verificados(self, _novos=None):
+        n = contar_duplicados()
+        self.act_dup.setText(f"Duplicados ({n})" if n else "Duplicados")
 
     def apply_styles(self):
         t = PALETAS.get(getattr(self, "theme_key", "original"), PALETAS["original"])
@@ -1201,6 +6508,8 @@ class MainWindow(QMainWindow):
                 border-radius: 12px;
             }}
         """)
+        # o heatmap pinta com QPainter, fora do QSS
+        self.page_cal.heatmap.set_paleta(t)
 
 
     # ---------- sidebar ----------
@@ -1222,12 +6531,13 @@ class MainWindow(QMainWindow):
         collapsed = self.sidebar_is_collapsed
         self.lbl_brand.setVisible(not collapsed)
         self.lbl_sub.setVisible(not collapsed)
-        for b in [self.btn_dash, self.btn_graph, self.btn_hist, self.btn_salary, self.btn_fixos, self.btn_fech, self.btn_theme, self.btn_help]:
+        self.cmb_perfil.setVisible(not collapsed)
+        for b in [self.btn_dash, self.btn_graph, self.btn_comp, self.btn_cal, self.btn_hist, self.btn_salary, self.btn_receitas, self.btn_fixos, self.btn_fech, self.btn_theme, self.btn_help]:
             b.set_collapsed(collapsed)
 
     def on_sidebar_clicked(self):
         btn = self.sender()
-        for b in [self.btn_dash, self.btn_graph, self.btn_hist, self.btn_salary, self.btn_fixos, self.btn_fech, self.btn_theme]:
+        for b in [self.btn_dash, self.btn_graph, self.btn_comp, self.btn_cal, self.btn_hist, self.btn_salary, self.btn_receitas, self.btn_fixos, self.btn_fech, self.btn_theme]:
             if b is not btn:
                 b.setChecked(False)
 
@@ -1235,12 +6545,22 @@ class MainWindow(QMainWindow):
             self.stack.setCurrentWidget(self.page_dash)
         elif btn is self.btn_graph:
             self.stack.setCurrentWidget(self.page_graph)
+        elif btn is self.btn_comp:
+            self.stack.setCurrentWidget(self.page_comp)
+            self.refresh_comparativo()
+        elif btn is self.btn_cal:
+            self.stack.setCurrentWidget(self.page_cal)
+            self.refresh_calendario()
         elif btn is self.btn_hist:
             self.stack.setCurrentWidget(self.page_hist)
         elif btn is self.btn_salary:
             btn.setChecked(False)
             self.edit_salary()
             return
+        elif btn is self.btn_receitas:
+            btn.setChecked(False)
+            self.edit_receitas()
+            return
         elif btn is self.btn_fixos:
             btn.setChecked(False)
             self.edit_fixos()
@@ -1257,115 +6577,368 @@ class MainWindow(QMainWindow):
     # ---------- data load ----------
     def refresh_all(self):
         aplicar_fixos_automaticos()
+        # nossas próprias escritas já vão aparecer agora; o monitor não precisa repetir
+        self.monitor.sincronizar()
         self.refresh_dashboard()
         self.refresh_history()
         self.refresh_graph()
         self.refresh_fechamentos()
+        self.refresh_comparativo()
+        self.refresh_calendario()
+
+    def carregar_perfis(self):
+        self.cmb_perfil.blockSignals(True)
+        self.cmb_perfil.clear()
+        for slug, nome in listar_perfis():
+            self.cmb_perfil.addItem(nome, slug)
+        self.cmb_perfil.addItem("+ Novo perfil…", None)
+        self.cmb_perfil.setCurrentIndex(max(0, self.cmb_perfil.findData(self.perfil)))
+        self.cmb_perfil.blockSignals(False)
+
+    def on_perfil_escolhido(self, idx: int):
+        slug = self.cmb_perfil.itemData(idx)
+        if slug is None:
+            dlg = PerfilDialog(self)
+            if dlg.exec() != QDialog.Accepted:
+                self.carregar_perfis()
+                return
+            try:
+                slug = criar_perfil(dlg.get_value())
+            except ValueError as e:
+                msg_err(self, "Perfil", str(e))
+                self.carregar_perfis()
+                return
+        self.trocar_perfil(slug)
+        self.carregar_perfis()
+
+    def trocar_perfil(self, slug: str):
+        """
+        Troca o banco ativo. O perfil que sai fica "quente" (cache dos meses e
+        conexão do monitor abertos, só com o timer parado): voltar para ele não relê nada.
+        """
+        if slug == self.perfil:
+            return
+        self.monitor.timer.stop()
+        self._perfis_quentes[self.perfil] = (self.cache_meses, self.monitor)
+        self._perfis_quentes.move_to_end(self.perfil)
+
+        self.perfil = ativar_perfil(slug)
+        quente = self._perfis_quentes.pop(slug, None)
+        if quente:
+            self.cache_meses, self.monitor = quente
+            self.monitor.timer.start()
+        else:
+            self.cache_meses = CacheMeses()
+            self.monitor = MonitorBanco(self)
+            self.monitor.alterado.connect(self.on_banco_alterado)
+        while len(self._perfis_quentes) >= PERFIS_QUENTES:
+            _, (_, monitor) = self._perfis_quentes.popitem(last=False)
+            monitor.fechar()
+            monitor.deleteLater()
+
+        self.mes_comp = None
+        self._projecao_chave = None
+        self._projecoes = None
+        self.theme_key = obter_tema()
+        self.apply_styles()
+        self.apply_sidebar_mode()
+        self.refresh_all()
+        self._mostrar_ultimo_backup()
+        self._duplicados_verificados()
+        self.iniciar_tarefa(obter_classificador)
+        self.verificar_meses_pendentes()
+
+    def verificar_meses_pendentes(self):
+        """
+        Fecha num lote os meses passados que ficaram sem fechamento. Pergunta antes,
+        listando o lote, a menos que config.confirmar_fechamento esteja desligado.
+        """
+        try:
+            pendentes = meses_pendentes()
+        except sqlite3.Error:
+            return
+        if not pendentes:
+            return
+        if confirmar_fechamento():
+            lista = "\n".join(
+                f"{m}: gastos {money(g)} • saldo {money(s + r - g)}" for m, s, r, g in pendentes[:24]
+            )
+            if len(pendentes) > 24:
+                lista += f"\n… e mais {len(pendentes) - 24}"
+            box = QMessageBox(
+                QMessageBox.Question, "Meses sem fechamento",
+                f"{len(pendentes)} mês(es) passado(s) ainda sem fechamento:\n\n{lista}\n\n"
+                "Fechar agora? Os fixos vencidos são lançados antes.",
+                QMessageBox.Yes | QMessageBox.No, self
+            )
+            chk = QCheckBox("Fechar sem perguntar das próximas vezes")
+            box.setCheckBox(chk)
+            if box.exec() != QMessageBox.Yes:
+                return
+            if chk.isChecked():
+                salvar_confirmar_fechamento(False)
+        try:
+            fechados = fechar_meses_pendentes([m for m, *_ in pendentes])
+        except sqlite3.Error as e:
+            msg_err(self, "Fechar meses", f"Não foi possível fechar os meses pendentes.\n\n{e}")
+            return
+        if fechados:
+            self.refresh_all()
+
+    def show_consolidado(self):
+        try:
+            dlg = ConsolidadoDialog(self.mes_dash, self)
+        except sqlite3.Error as e:
+            msg_err(self, "Consolidado", f"Não foi possível ler os perfis.\n\n{e}")
+            return
+        dlg.exec()
+
+    def gerar_relatorios(self):
+        dlg = RelatoriosDialog(self)
+        if dlg.exec() != QDialog.Accepted:
+            return
+        p = dlg.get_payload()
+        self.act_rel.setEnabled(False)
+        self.act_rel.setText("Relatórios (gerando…)")
+
+        def fim():
+            self.act_rel.setEnabled(True)
+            self.act_rel.setText("Relatórios")
+
+        def ok(r):
+            fim()
+            if not r:
+                QMessageBox.information(self, "Relatórios", "Nenhum ano com dados no intervalo.")
+                return
+            novos = sum(1 for x in r if x["gerado"])
+            pastas = sorted({os.path.dirname(x["html"]) for x in r})
+            QMessageBox.information(
+                self, "Relatórios",
+                f"{len(r)} relatório(s): {novos} gerado(s), {len(r) - novos} já em dia.\n\n" + "\n".join(pastas)
+            )
+
+        def falhou(e):
+            fim()
+            msg_err(self, "Relatórios", f"Não foi possível gerar os relatórios.\n\n{e}")
+
+        self.iniciar_tarefa(gerar_relatorios, p["anos"], p["perfis"], p["xlsx"], ao_concluir=ok, ao_falhar=falhou)
+
+    def navegar_mes(self, passo: int):
+        """passo=-1/+1: mês anterior/próximo; 0: volta para o mês atual."""
+        if passo == 0:
+            self.mes_dash = datetime.now().strftime("%Y-%m")
+        else:
+            self.mes_dash = somar_mes(self.mes_dash, passo)
+        self.refresh_dashboard()
+
+    def on_banco_alterado(self, areas):
+        """Outra conexão gravou: atualiza só as telas afetadas."""
+        if "config" in areas:
+            tema = obter_tema()
+            if tema != self.theme_key:
+                self.theme_key = tema
+                self.apply_styles()
+                self.apply_sidebar_mode()
+        if areas & {"lancamentos", "config"}:
+            self.refresh_dashboard()
+        if "lancamentos" in areas:
+            self.refresh_comparativo()
+            self.refresh_calendario()
+        if "resumo" in areas:
+            self.refresh_history()
+            self.refresh_graph()
+        if areas & {"lancamentos", "config", "resumo"}:
+            self.refresh_fechamentos()
 
     def refresh_dashboard(self):
         hoje = datetime.now()
         self.page_dash.lbl_today.setText(f"Hoje: {hoje:%d/%m/%Y} • {hoje.strftime('%Y-%m')}")
 
-        mes = datetime.now().strftime("%Y-%m")
-        conn = conectar()
-        cur = conn.cursor()
-        cur.execute("SELECT id, categoria, valor, data FROM gastos WHERE data LIKE ? ORDER BY data DESC, id DESC", (f"{mes}%",))
-        rows = cur.fetchall()
-        conn.close()
+        mes = self.mes_dash
+        self.page_dash.lbl_mes.setText(mes)
+        self.page_dash.btn_hoje.setEnabled(mes != hoje.strftime("%Y-%m"))
+
+        dados = self.cache_meses.carregar(mes)
+        rows = dados["rows"]
 
-        total = sum(float(r[2]) for r in rows)
-        sal = obter_salario()
-        saldo = sal - total
+        sal, receitas, total = dados["salario"], dados["receitas"], dados["gastos"]
+        saldo = sal + receitas - total
+        acumulado = obter_acumulado(mes)
 
         self.page_dash.card_gastos.set_value(money(total))
         self.page_dash.card_salario.set_value(money(sal))
+        self.page_dash.card_receitas.set_value(money(receitas))
         self.page_dash.card_saldo.set_value(money(saldo), positive=(saldo >= 0))
+        self.page_dash.card_acumulado.set_value(money(acumulado), positive=(acumulado >= 0))
 
         t = self.page_dash.table
-        t.setRowCount(0)
-        for rid, cat, val, dt in rows:
-            rowi = t.rowCount()
-            t.insertRow(rowi)
-            t.setItem(rowi, 0, QTableWidgetItem(str(rid)))
-            t.setItem(rowi, 1, QTableWidgetItem(cat))
-            t.setItem(rowi, 2, QTableWidgetItem(money(float(val))))
-            t.setItem(rowi, 3, QTableWidgetItem(br_date(dt)))
+        preencher_tabela(t, rows, lambda r: (str(r[0]), r[1], money_gasto(float(r[2]), r[5], r[6]), br_date(r[3]), "📎" if r[4] else ""))
+        for i, r in enumerate(rows):
+            if r[4]:
+                t.item(i, 4).setData(Qt.UserRole, r[4])
+        self.mostrar_miniaturas()
+
+        # deixa os vizinhos prontos para a próxima navegação
+        self.cache_meses.prefetch([somar_mes(mes, -1), somar_mes(mes, 1)])
+        self.page_dash.set_orcamentos(orcamentos_mes(mes))
+        self.page_dash.set_anomalias(anomalias_mes(mes))
+        self.atualizar_projecoes()
+
+    def mostrar_miniaturas(self, *_):
+        """Miniaturas só das linhas visíveis; as que faltam chegam depois, por Miniaturas.pronta."""
+        t = self.page_dash.table
+        if not t.rowCount():
+            return
+        primeira = max(t.rowAt(0), 0)
+        ultima = t.rowAt(t.viewport().height() - 1)
+        for i in range(primeira, (ultima if ultima >= 0 else t.rowCount() - 1) + 1):
+            item = t.item(i, 4)
+            hash_ = item.data(Qt.UserRole) if item else None
+            if hash_ and item.icon().isNull():
+                pix = self.miniaturas.obter(hash_)
+                if pix is not None:
+                    item.setIcon(QIcon(pix))
+                    item.setText("")
+
+    def atualizar_projecoes(self):
+        hoje = date.today()
+        mes = hoje.strftime("%Y-%m")
+        if not HAS_NUMPY:
+            for card in (self.page_dash.card_previsao, self.page_dash.card_poupanca):
+                card.set_value("—")
+                card.setToolTip("Instale numpy para ver as projeções.")
+            return
+        chave = (hoje, versao_mes(mes), obter_acumulado(mes))
+        if chave == self._projecao_chave:
+            self._projecoes_prontas(self._projecoes)
+            return
+        self._projecao_chave = chave
+
+        # fixos do mês são expandidos aqui (escrita); a tarefa em si só lê
+        inicio = hoje.replace(day=1)
+        fim = hoje.replace(day=calendar.monthrange(hoje.year, hoje.month)[1])
+        ocorrencias = ocorrencias_periodo(inicio, fim)
+        fixos_mes = sum(float(o[2] or 0) for o in ocorrencias)
+        fixos_lancados = sum(float(o[2] or 0) for o in ocorrencias if o[4])
+        self.iniciar_tarefa(
+            calcular_projecoes, hoje, fixos_lancados, fixos_mes,
+            ao_concluir=self._projecoes_prontas, ao_falhar=lambda e: self._projecoes_falharam(chave, e)
+        )
+
+    def _projecoes_falharam(self, chave, erro):
+        # a chave só valia enquanto a tarefa rodava: sem ela o próximo refresh tenta de novo
+        if self._projecao_chave == chave:
+            self._projecao_chave = None
+        for card in (self.page_dash.card_previsao, self.page_dash.card_poupanca):
+            card.set_value("—")
+            card.setToolTip(f"Não foi possível calcular as projeções: {erro}")
+
+    def _projecoes_prontas(self, r):
+        self._projecoes = r
+        if r is None:
+            return
+        p = self.page_dash
+        if self.mes_dash == r["mes"]:
+            p10, p50, p90 = r["previsao"]
+            p.card_previsao.set_value(money(p50))
+            p.card_previsao.setToolTip(f"Entre {money(p10)} e {money(p90)} (80% de chance)")
+        else:
+            p.card_previsao.set_value("—")
+            p.card_previsao.setToolTip("A previsão é só para o mês atual.")
+        if r["poupanca"]:
+            anos, p10, p50, p90 = r["poupanca"][-1]
+            p.card_poupanca.set_value(money(p50), positive=(p50 >= 0))
+            p.card_poupanca.setToolTip("\n".join(
+                f"{a} ano(s): {money(b)} • {money(c)} • {money(d)} (p10 • mediana • p90)"
+                for a, b, c, d in r["poupanca"]
+            ))
+        else:
+            p.card_poupanca.set_value("—")
+            p.card_poupanca.setToolTip("São necessários pelo menos 3 meses de histórico.")
 
     def refresh_history(self):
+        # tudo direto do cursor: a memória não cresce com os anos de histórico
+        celulas = lambda r: (r[0], money(float(r[1])), money(float(r[2])))
         conn = conectar()
         cur = conn.cursor()
-        cur.execute("SELECT mes, total, saldo FROM resumo ORDER BY mes DESC")
-        rows = cur.fetchall()
+        cur.execute(CONSULTAS["total_fechamentos"])
+        self.page_hist.lbl_sum.setText(f"Somatório: {money(cur.fetchone()[0])}")
+        cur.execute(CONSULTAS["fechamentos_recentes"], (-1,))
+        preencher_tabela(self.page_hist.table, cur, celulas)
+        cur.execute(CONSULTAS["fechamentos_recentes"], (8,))
+        preencher_tabela(self.page_dash.table_resumo, cur, celulas)
         conn.close()
 
-        soma = sum(float(r[1]) for r in rows)
-        self.page_hist.lbl_sum.setText(f"Somatório: {money(soma)}")
-
-        t = self.page_hist.table
-        t.setRowCount(0)
-        for mes, total, saldo in rows:
-            rowi = t.rowCount()
-            t.insertRow(rowi)
-            t.setItem(rowi, 0, QTableWidgetItem(mes))
-            t.setItem(rowi, 1, QTableWidgetItem(money(float(total))))
-            t.setItem(rowi, 2, QTableWidgetItem(money(float(saldo))))
-
-        tr = self.page_dash.table_resumo
-        tr.setRowCount(0)
-        for mes, total, saldo in rows[:8]:
-            rowi = tr.rowCount()
-            tr.insertRow(rowi)
-            tr.setItem(rowi, 0, QTableWidgetItem(mes))
-            tr.setItem(rowi, 1, QTableWidgetItem(money(float(total))))
-            tr.setItem(rowi, 2, QTableWidgetItem(money(float(saldo))))
-
     def refresh_graph(self):
         conn = conectar()
         cur = conn.cursor()
-        cur.execute("SELECT mes, total FROM resumo ORDER BY mes ASC")
-        rows = cur.fetchall()
+        cur.execute(CONSULTAS["fechamentos_grafico"])
+        self.page_graph.set_data(cur)
         conn.close()
 
-        meses = [r[0] for r in rows]
-        totais = [float(r[1]) for r in rows]
-        self.page_graph.set_data(meses, totais)
 
+    def refresh_comparativo(self):
+        # só consulta com a página visível; ao abri-la o botão da sidebar chama de novo
+        if self.stack.currentWidget() is not self.page_comp:
+            return
+        self.page_comp.set_meses(comparativo_mensal())
+        mes = self.mes_comp or self.mes_dash
+        self.page_comp.set_categorias(mes, comparativo_categorias(mes))
+        self.page_comp.set_tags(mes, totais_tags(mes))
+
+    def refresh_calendario(self):
+        if self.stack.currentWidget() is not self.page_cal:
+            return
+        self.page_cal.set_ano(self.ano_cal, gastos_por_dia(self.ano_cal))
+        dia = self.page_cal.heatmap.selecionado
+        if dia:
+            self.page_cal.set_dia(dia, gastos_do_dia(dia))
+
+    def navegar_ano(self, passo: int):
+        self.ano_cal += passo
+        self.refresh_calendario()
+
+    def on_calendario_dia(self, dia: str):
+        self.page_cal.set_dia(dia, gastos_do_dia(dia))
+
+    def on_comparativo_mes(self, row, col):
+        item = self.page_comp.table_meses.item(row, 0)
+        if not item:
+            return
+        self.mes_comp = item.text()
+        self.page_comp.set_categorias(self.mes_comp, comparativo_categorias(self.mes_comp))
+        self.page_comp.set_tags(self.mes_comp, totais_tags(self.mes_comp))
 
     def refresh_fechamentos(self):
         mes = datetime.now().strftime("%Y-%m")
-        conn = conectar()
-        cur = conn.cursor()
-        cur.execute("SELECT SUM(valor) FROM gastos WHERE data LIKE ?", (f"{mes}%",))
-        total_mes = float(cur.fetchone()[0] or 0)
-        conn.close()
-
-        salario = obter_salario()
-        self.page_fech.set_month_summary(mes, total_mes, salario)
+        salario, receitas, total_mes = obter_saldo_mes(mes)
+        self.page_fech.set_month_summary(mes, total_mes, salario, receitas)
 
         conn = conectar()
         cur = conn.cursor()
-        cur.execute("SELECT mes, total, saldo FROM resumo ORDER BY mes DESC LIMIT 24")
-        rows = cur.fetchall()
+        cur.execute(CONSULTAS["fechamentos_recentes"], (24,))
+        preencher_tabela(self.page_fech.table, cur, lambda r: (r[0], money(float(r[1])), money(float(r[2]))))
         conn.close()
 
-        t = self.page_fech.table
-        t.setRowCount(0)
-        for mesx, total, saldo in rows:
-            r = t.rowCount()
-            t.insertRow(r)
-            t.setItem(r, 0, QTableWidgetItem(mesx))
-            t.setItem(r, 1, QTableWidgetItem(money(float(total))))
-            t.setItem(r, 2, QTableWidgetItem(money(float(saldo))))
-
     # ---------- actions ----------
     def show_features(self):
         text = (
             "• Salário: define a base do seu saldo\n"
-            "• Novo gasto: adiciona um gasto no mês atual\n"
+            "• Receitas: lança entradas extras (freelance, reembolso, venda)\n"
+            "• Novo gasto: adiciona um gasto no mês exibido\n"
+            "• ◀ ▶ no dashboard: navega entre os meses\n"
             "• Duplo clique na tabela: edita/deleta gasto\n"
-            "• Fechar mês: salva total e saldo no histórico\n"
+            "• Importar extrato: lê OFX/QIF do banco sem duplicar lançamentos\n"
+            "• Câmbio: gastos em dólar/euro viram reais pela cotação do dia (CSV moeda;data;taxa)\n"
+            "• Fechar mês: salva total e saldo no histórico (meses esquecidos fecham ao abrir o app)\n"
             "• Gráfico mensal: mostra os fechamentos em barras\n"
-            "• Histórico: lista fechamentos e permite apagar"
+            "• Histórico: lista fechamentos e permite apagar\n"
+            "• Comparativo: mês contra o mesmo mês do ano anterior, médias, categorias e tags\n"
+            "• Divisão e tags: um gasto pode ser repartido entre categorias e marcado com tags\n"
+            "• Comprovantes: fotos e PDFs anexados ao gasto (📎 na tabela do mês)\n"
+            "• Calendário: gasto de cada dia do ano; clique num dia para ver os lançamentos\n"
+            "• Perfis: cada um com o próprio banco; troque pela barra lateral\n"
+            "• Consolidado: o mês de todos os perfis lado a lado"
         )
         QMessageBox.information(self, "Funcionalidades", text)
 
@@ -1381,6 +6954,35 @@ class MainWindow(QMainWindow):
             self.refresh_all()
 
 
+    def edit_receitas(self):
+        dlg = ReceitasDialog(self, mes=self.mes_dash)
+        dlg.exec()
+        self.refresh_all()
+
+
+    def edit_orcamentos(self):
+        dlg = OrcamentosDialog(self)
+        if dlg.exec() == QDialog.Accepted:
+            try:
+                limites = dlg.get_payload()
+            except ValueError:
+                msg_err(self, "Erro", "Limite inválido. Use números (ex: 800,00).")
+                return
+            salvar_orcamentos(limites)
+            self.refresh_dashboard()
+
+    def ignorar_anomalia_selecionada(self):
+        t = self.page_dash.table_anom
+        row = t.currentRow()
+        if row < 0:
+            return
+        ignorar_anomalia(t.item(row, 0).data(Qt.UserRole))
+        self.page_dash.set_anomalias(anomalias_mes(self.mes_dash))
+
+    def avisar_orcamento(self, aviso):
+        if aviso:
+            QMessageBox.warning(self, "Orçamento", aviso)
+
     def edit_fixos(self):
         dlg = FixosDialog(self)
         if dlg.exec() == QDialog.Accepted:
@@ -1404,47 +7006,23 @@ class MainWindow(QMainWindow):
         mes = datetime.now().strftime("%Y-%m")
 
         try:
-            conn = conectar()
-            cur = conn.cursor()
-            cur.execute(
-                "SELECT SUM(valor) FROM gastos WHERE data LIKE ?",
-                (f"{mes}%",)
-            )
-            total = float(cur.fetchone()[0] or 0)
-            conn.close()
+            salario, receitas, total = obter_saldo_mes(mes)
         except Exception as e:
             msg_err(self, "Erro", f"Falha ao calcular gastos do mês.\n\n{e}")
             return
 
-        salario = obter_salario()
-        saldo = salario - total
+        saldo = salario + receitas - total
 
         if not msg_yesno(
             self,
             "Fechar mês",
-            f"Mês: {mes}\n\nGastos: {money(total)}\nSaldo: {money(saldo)}\n\nDeseja fechar o mês?"
+            f"Mês: {mes}\n\nGastos: {money(total)}\nReceitas: {money(receitas)}\n"
+            f"Saldo: {money(saldo)}\n\nDeseja fechar o mês?"
         ):
             return
 
         try:
-            conn = conectar()
-            cur = conn.cursor()
-
-            try:
-                cur.execute("""
-                    INSERT INTO resumo (mes, total, saldo)
-                    VALUES (?, ?, ?)
-                    ON CONFLICT(mes)
-                    DO UPDATE SET total=excluded.total, saldo=excluded.saldo
-                """, (mes, total, saldo))
-            except sqlite3.OperationalError:
-                cur.execute(
-                    "INSERT OR REPLACE INTO resumo (mes, total, saldo) VALUES (?, ?, ?)",
-                    (mes, total, saldo)
-                )
-
-            conn.commit()
-            conn.close()
+            fechar_mes(mes)
 
             QMessageBox.information(
                 self,
@@ -1457,50 +7035,204 @@ class MainWindow(QMainWindow):
             msg_err(self, "Erro", f"Não foi possível salvar o fechamento.\n\n{e}")
 
 
+    def _mes_somente_leitura(self) -> bool:
+        if mes_arquivado(self.mes_dash):
+            QMessageBox.information(self, "Mês arquivado", f"{self.mes_dash} está no arquivo e é só para leitura.")
+            return True
+        return False
+
+    def arquivar_ano(self):
+        dlg = ArquivoDialog(self)
+        if dlg.exec() != QDialog.Accepted or dlg.get_payload() is None:
+            return
+        self.setCursor(Qt.BusyCursor)
+
+        def ok(r):
+            self.unsetCursor()
+            self.refresh_all()
+            texto = f"{r['ano']}: {r['movidos']} gasto(s) arquivados ({r['bytes'] / 1024:.0f} KB compactados)."
+            if r["aviso"]:
+                QMessageBox.warning(self, "Arquivo", f"{texto}\n\n{r['aviso']}")
+            else:
+                QMessageBox.information(self, "Arquivo", texto)
+
+        def falhou(e):
+            self.unsetCursor()
+            msg_err(self, "Erro ao arquivar", str(e))
+
+        self.iniciar_tarefa(arquivar_ano, dlg.get_payload(), ao_concluir=ok, ao_falhar=falhou)
+
     def new_expense(self):
-        dlg = ExpenseDialog(self, expense_id=None)
-        if dlg.exec() == QDialog.Accepted:
+        if self._mes_somente_leitura():
+            return
+        dlg = ExpenseDialog(self, expense_id=None, data_padrao=data_padrao_mes(self.mes_dash), miniaturas=self.miniaturas)
+        res = dlg.exec()
+        dlg.deleteLater()  # só sai quando o controle volta ao loop principal: o resto daqui ainda lê o diálogo
+        if res == QDialog.Accepted:
             try:
                 cat, val, desc, dt = dlg.get_payload()
+                divisoes, tags, moeda = dlg.get_divisoes(), dlg.get_tags(), dlg.get_moeda()
             except Exception:
                 msg_err(self, "Erro", "Dados inválidos. Valor e data precisam estar corretos.")
                 return
+            blobs = self._guardar_anexos(dlg)
+            if blobs is None:
+                return
 
             conn = conectar()
             cur = conn.cursor()
-            cur.execute("INSERT INTO gastos (categoria, valor, descricao, data) VALUES (?,?,?,?)", (cat, val, desc, dt))
+            dup = procurar_duplicado(cur, dt, val, desc)
+            if dup is not None and not msg_yesno(
+                self, "Possível duplicado",
+                f"Já existe um gasto igual (#{dup}: {money(val, moeda)} em {br_date(dt)}).\n\nLançar mesmo assim?"
+            ):
+                conn.close()
+                return
+            try:
+                gasto_id = inserir_gasto(cur, cat, val, desc, dt, moeda=moeda)
+            except ValueError as e:
+                conn.close()
+                msg_err(self, "Câmbio", str(e))
+                return
+            try:
+                salvar_divisoes(cur, gasto_id, divisoes)
+            except ValueError as e:
+                conn.rollback()
+                conn.close()
+                msg_err(self, "Divisão inválida", str(e))
+                return
+            salvar_tags(cur, gasto_id, tags)
+            registrar_anexos(cur, gasto_id, blobs)
+            avisos = [verificar_orcamento(cur, c, dt, v) for c, v in partes_gasto(cur, gasto_id).items()]
             conn.commit()
             conn.close()
             self.refresh_all()
+            self.avisar_orcamento("\n".join(a for a in avisos if a))
+
+    def _guardar_anexos(self, dlg):
+        """Copia os comprovantes novos para o repositório antes da transação; None se falhar."""
+        try:
+            return [guardar_blob(c) for c in dlg.anexos_novos]
+        except OSError as e:
+            msg_err(self, "Comprovante", f"Não foi possível guardar o comprovante.\n\n{e}")
+            return None
 
     def edit_selected_expense(self, row, col):
         t = self.page_dash.table
         item = t.item(row, 0)
         if not item:
             return
+        if self._mes_somente_leitura():
+            return
         expense_id = int(item.text())
-        dlg = ExpenseDialog(self, expense_id=expense_id)
+        dlg = ExpenseDialog(self, expense_id=expense_id, miniaturas=self.miniaturas)
         res = dlg.exec()
+        dlg.deleteLater()
         if res == 2:
             self.refresh_all()
             return
         if res == QDialog.Accepted:
             try:
                 cat, val, desc, dt = dlg.get_payload()
+                divisoes, tags, moeda = dlg.get_divisoes(), dlg.get_tags(), dlg.get_moeda()
             except Exception:
                 msg_err(self, "Erro", "Dados inválidos.")
                 return
+            blobs = self._guardar_anexos(dlg)
+            if blobs is None:
+                return
 
             conn = conectar()
             cur = conn.cursor()
-            cur.execute("""
-                UPDATE gastos
-                SET categoria=?, valor=?, descricao=?, data=?
-                WHERE id=?
-            """, (cat, val, desc, dt, expense_id))
+            cur.execute(CONSULTAS["gasto_por_id"], (expense_id,))
+            antigo = cur.fetchone()
+            antes = partes_gasto(cur, expense_id)
+            try:
+                atualizar_gasto(cur, expense_id, cat, val, desc, dt, moeda=moeda, divisoes=divisoes)
+            except ValueError as e:
+                conn.close()
+                msg_err(self, "Gasto inválido", str(e))
+                return
+            try:
+                salvar_divisoes(cur, expense_id, divisoes)
+            except ValueError as e:
+                conn.rollback()
+                conn.close()
+                msg_err(self, "Divisão inválida", str(e))
+                return
+            salvar_tags(cur, expense_id, tags)
+            registrar_anexos(cur, expense_id, blobs)
+            for anexo_id in dlg.anexos_removidos:
+                remover_anexo(cur, anexo_id)
+            # o que entrou a mais em cada categoria do mês de destino
+            mesmo_mes = antigo and (antigo[4] or "")[:7] == dt[:7]
+            avisos = [
+                verificar_orcamento(cur, c, dt, v - antes.get(c, 0.0) if mesmo_mes else v)
+                for c, v in partes_gasto(cur, expense_id).items()
+            ]
             conn.commit()
             conn.close()
             self.refresh_all()
+            self.avisar_orcamento("\n".join(a for a in avisos if a))
+
+    def importar_extrato(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Importar extrato", "", "Extratos (*.ofx *.qfx *.qif);;Todos os arquivos (*)"
+        )
+        if not path:
+            return
+        self.setCursor(Qt.BusyCursor)
+
+        def ok(cont):
+            self.unsetCursor()
+            QMessageBox.information(
+                self, "Importação concluída",
+                f"Gastos: {cont['gastos']}\nReceitas: {cont['receitas']}\n"
+                f"Já existiam (ignorados): {cont['duplicados']}\n"
+                f"Créditos de cartão ignorados: {cont['ignorados']}"
+                + (f"\nEm ano arquivado (ignorados): {cont['arquivados']}" if cont["arquivados"] else "")
+                + (f"\nSem cotação (importe em Câmbio e reimporte): {cont['sem_cotacao']}" if cont["sem_cotacao"] else "")
+            )
+            self._duplicados_verificados()
+            self.refresh_all()
+
+        def falha(e):
+            self.unsetCursor()
+            msg_err(self, "Erro", f"Não foi possível importar o extrato.\n\n{e}")
+            self.refresh_all()
+
+        self.iniciar_tarefa(importar_extrato, path, ao_concluir=ok, ao_falhar=falha)
+
+    def importar_cambio(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Importar cotações", "", "Cotações (*.csv *.txt);;Todos os arquivos (*)"
+        )
+        if not path:
+            return
+        self.setCursor(Qt.BusyCursor)
+
+        def ok(r):
+            self.unsetCursor()
+            QMessageBox.information(
+                self, "Câmbio",
+                f"Cotações: {r['cotacoes']} ({', '.join(r['moedas']) or '-'})\n"
+                f"Linhas ignoradas: {r['ignoradas']}\n"
+                f"Gastos reconvertidos: {r['reconvertidos']}\n\n"
+                "Meses fechados mantêm a cotação do fechamento."
+            )
+            self.refresh_all()
+
+        def falha(e):
+            self.unsetCursor()
+            msg_err(self, "Erro", f"Não foi possível importar as cotações.\n\n{e}")
+
+        self.iniciar_tarefa(importar_cambio, path, ao_concluir=ok, ao_falhar=falha)
+
+    def show_duplicados(self):
+        dlg = DuplicadosDialog(self)
+        dlg.exec()
+        self._duplicados_verificados()
+        self.refresh_all()
 
     def open_graph(self):
         self.btn_graph.setChecked(True)
@@ -1517,12 +7249,17 @@ class MainWindow(QMainWindow):
             msg_err(self, "Apagar", "Selecione um mês no histórico.")
             return
         mes = t.item(row, 0).text()
-        if not msg_yesno(self, "Confirmar", f"Apagar fechamento de {mes}? Isso remove do gráfico também."):
+        if not msg_yesno(
+            self, "Confirmar",
+            f"Apagar fechamento de {mes}? Isso remove do gráfico também.\n\n"
+            "O mês não volta a ser fechado automaticamente ao abrir o app."
+        ):
             return
 
         conn = conectar()
         cur = conn.cursor()
         cur.execute("DELETE FROM resumo WHERE mes=?", (mes,))
+        cur.execute("INSERT OR IGNORE INTO fechamentos_apagados (mes) VALUES (?)", (mes,))
         conn.commit()
         conn.close()
         self.refresh_all()
@@ -1531,10 +7268,68 @@ class MainWindow(QMainWindow):
 # RUN
 # ======================
 def main():
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="Virtum Finance")
+    parser.add_argument("--manutencao", action="store_true",
+                        help="roda a manutenção pendente do banco (ANALYZE, optimize, vacuum...) e sai")
+    parser.add_argument("--forcar", action="store_true", help="com --manutencao: roda tudo, vencido ou não")
+    parser.add_argument("--api", action="store_true", help="sobe a API JSON local (sem janela)")
+    parser.add_argument("--porta", type=int, default=8765, help="porta da API (padrão 8765)")
+    parser.add_argument("--perfil", help="perfil a abrir (padrão: o último usado)")
+    parser.add_argument("--relatorios", nargs="?", const="", metavar="ANOS",
+                        help="gera os relatórios anuais e sai (ex: 2016-2025 ou 2024; vazio: todos)")
+    parser.add_argument("--xlsx", action="store_true", help="com --relatorios: gera também XLSX")
+    parser.add_argument("--cambio", metavar="CSV",
+                        help="importa cotações (moeda;data;taxa), reconverte os meses abertos e sai")
+    args, resto = parser.parse_known_args()
+
+    try:
+        ativar_perfil(args.perfil)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.api:
+        aplicar_fixos_automaticos()
+        obter_classificador()  # o primeiro treino não pode cair dentro de um POST
+        servidor = ServidorAPI(porta=args.porta)
+        try:
+            asyncio.run(servidor.servir())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            servidor.fechar()
+        return
+
+    if args.relatorios is not None:
+        anos = None
+        if args.relatorios:
+            de, _, ate = args.relatorios.partition("-")
+            anos = list(range(int(de), int(ate or de) + 1))
+        inicio = time.perf_counter()
+        r = gerar_relatorios(anos, xlsx=args.xlsx)
+        for x in r:
+            print(f"{x['ano']}  {'gerado' if x['gerado'] else 'cache '}  {x['html']}")
+        print(f"{len(r)} relatório(s) em {time.perf_counter() - inicio:.1f} s")
+        return
+
+    if args.cambio:
+        r = importar_cambio(args.cambio)
+        print(f"{r['cotacoes']} cotação(ões) de {', '.join(r['moedas']) or '-'}; "
+              f"{r['ignoradas']} linha(s) ignorada(s); {r['reconvertidos']} gasto(s) reconvertido(s)")
+        return
+
+    if args.manutencao:
+        feitas = executar_manutencao(forcar=args.forcar)
+        for r in feitas:
+            print(f"{r['operacao']:<20} {r['duracao_ms']:8.1f} ms  {r['detalhe']}")
+        if not feitas:
+            print("Nada pendente.")
+        return
+
+    app = QApplication([sys.argv[0]] + resto)
     w = MainWindow()
     w.show()
     sys.exit(app.exec())
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # executável empacotado: os processos dos relatórios
     main()
@@ -0,0 +1,90 @@
+"""Banco grande e realista compartilhado pelas suítes de planos e de memória."""
+import random
+import sqlite3
+from datetime import date
+
+import virtum_finance as vf
+
+LINHAS = 200_000   # gastos do banco padrão (10 anos, ~55 por dia; 200 mil divisões)
+LOJAS = ["Mercado Bom Preço", "Posto Shell", "Farmácia Pague Menos", "Padaria São João", "Uber",
+         "iFood", "Cinema", "Conta de luz", "Netflix", "Drogasil", "Açougue", "Estacionamento"]
+
+
+def criar_banco_teste(caminho: str, linhas: int = LINHAS, seed: int = 42, anos=(2016, 2025)):
+    """
+    Os gastos entram direto na tabela e a migração monta agregados, índices e
+    triggers como num banco antigo de verdade.
+    `anos`: primeiro e último ano com lançamentos; todos os meses ficam fechados.
+    """
+    rnd = random.Random(seed)
+    primeiro, ultimo = anos
+    inicio = date(primeiro, 1, 1).toordinal()
+    dias = date(ultimo + 1, 1, 1).toordinal() - inicio
+    conn = sqlite3.connect(caminho)
+    conn.execute("""
+    CREATE TABLE gastos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        categoria TEXT,
+        valor REAL,
+        descricao TEXT,
+        data TEXT
+    )
+    """)
+    conn.executemany(
+        "INSERT INTO gastos (categoria, valor, descricao, data) VALUES (?, ?, ?, ?)",
+        (
+            (rnd.choice(vf.CATEGORIAS), round(rnd.lognormvariate(3.5, 0.9), 2), rnd.choice(LOJAS),
+             date.fromordinal(inicio + rnd.randrange(dias)).isoformat())
+            for _ in range(linhas)
+        )
+    )
+    conn.commit()
+    conn.close()
+
+    vf._banco_local.caminho = caminho
+    try:
+        vf.migrar_banco()
+        conn = vf.conectar()
+        cur = conn.cursor()
+        cur.executemany(
+            "INSERT INTO receitas (categoria, valor, descricao, data) VALUES (?, ?, ?, ?)",
+            [(rnd.choice(vf.CATEGORIAS_RECEITA), round(rnd.uniform(50, 2000), 2), "extra",
+              date.fromordinal(inicio + rnd.randrange(dias)).isoformat()) for _ in range(linhas // 200)]
+        )
+        cur.executemany(
+            "INSERT INTO fixos (categoria, valor, descricao, ativo, frequencia, inicio) VALUES (?, ?, ?, 1, ?, ?)",
+            [(rnd.choice(vf.CATEGORIAS), round(rnd.uniform(20, 500), 2), f"fixo {i}", rnd.choice(["mensal", "semanal"]),
+              f"{primeiro}-01-01") for i in range(20)]
+        )
+        vf.expandir_ocorrencias(cur, date(ultimo, 12, 31))
+        cur.execute("UPDATE fixos_ocorrencias SET aplicado=1 WHERE data < ?", (f"{ultimo}-12-01",))
+        cur.executemany("INSERT INTO orcamentos (categoria, limite) VALUES (?, 800)", [(c,) for c in vf.CATEGORIAS])
+        cur.execute("INSERT INTO gastos_anomalias (gasto_id, motivo) SELECT id, 'teste' FROM gastos WHERE valor > 400")
+        # ~300 suspeitos de duplicidade, um décimo já ignorado
+        cur.execute("""
+            INSERT INTO gastos_duplicados (gasto_id, original_id, motivo, ignorado)
+            SELECT id, id - 1, 'teste', id % 7000 = 0 FROM gastos WHERE id % 700 = 0
+        """)
+        # metade dos gastos dividida em duas partes; um terço com tag (30 tags)
+        cur.executemany(
+            "INSERT INTO gastos_divisoes (gasto_id, categoria, valor, data) SELECT id, ?, ROUND(valor / 4, 2), data FROM gastos WHERE id=?",
+            [(rnd.choice(vf.CATEGORIAS), gid) for gid in range(2, linhas + 1, 2) for _ in range(2)]
+        )
+        cur.executemany("INSERT INTO tags (nome) VALUES (?)", [(f"tag {i}",) for i in range(30)])
+        cur.execute("INSERT INTO gastos_tags (gasto_id, tag_id, data, valor) SELECT id, 1 + id * 7 % 30, data, valor FROM gastos WHERE id % 3 = 0")
+        # 2% em dólar/euro, com cotação diária das duas moedas
+        cur.executemany(
+            "INSERT INTO cambio (moeda, data, taxa) VALUES (?, ?, ?)",
+            [(m, date.fromordinal(inicio + d).isoformat(), round(base + rnd.uniform(-0.5, 0.5), 4))
+             for m, base in (("USD", 5.0), ("EUR", 5.5)) for d in range(dias)]
+        )
+        cur.execute("""
+            UPDATE gastos SET moeda = CASE WHEN id % 100 = 0 THEN 'EUR' ELSE 'USD' END,
+                              valor_original = ROUND(valor / 5, 2), taxa = 5
+            WHERE id % 50 = 0
+        """)
+        cur.execute("INSERT INTO resumo (mes, total, saldo) SELECT mes, gastos, salario + receitas - gastos FROM saldo_mensal")
+        conn.commit()
+        conn.close()
+    finally:
+        vf._banco_local.caminho = None
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# nenhuma janela é mostrada; precisa valer antes de o PySide6 ser importado
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
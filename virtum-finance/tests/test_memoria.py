@@ -0,0 +1,128 @@
+"""
+Pico de memória Python (tracemalloc) dos caminhos pesados com históricos crescentes:
+atualizar a tela, gerar o relatório do último ano, fazer backup e importar um extrato
+(que cresce junto com o histórico). Falha se o pico passar do orçamento ou crescer
+com o histórico.
+"""
+import gc
+import os
+import random
+import tracemalloc
+from datetime import date
+
+import pytest
+from PySide6.QtCore import QThreadPool
+from PySide6.QtWidgets import QApplication
+
+import virtum_finance as vf
+from banco_teste import LOJAS, criar_banco_teste
+
+ANOS = (1, 3, 9)        # tamanhos do histórico nos bancos de teste
+LINHAS_ANO = 12_000     # gastos por ano (~33 por dia)
+OFX_ANO = 2_000         # transações do extrato importado, por ano de histórico
+FOLGA = 1.25            # pico do maior banco <= pico do menor x folga (+ FOLGA_KB)
+FOLGA_KB = 64
+
+# caminho -> orçamento absoluto do pico em KB
+ORCAMENTO_KB = {
+    "atualizar tela": 2048,
+    "relatório anual": 1024,
+    "backup": 512,
+    "importar extrato": 4096,
+}
+
+
+def extrato_teste(caminho: str, n: int, ultimo_ano: int, seed: int = 7):
+    """OFX de conta corrente com `n` transações do último ano do banco de teste."""
+    rnd = random.Random(seed)
+    inicio = date(ultimo_ano, 1, 1).toordinal()
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write("OFXHEADER:100\nDATA:OFXSGML\nVERSION:102\nENCODING:UTF-8\n\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS>"
+                "<BANKACCTFROM><ACCTID>12345</BANKACCTFROM><BANKTRANLIST>\n")
+        for i in range(n):
+            dia = date.fromordinal(inicio + rnd.randrange(365)).strftime("%Y%m%d")
+            valor = -round(rnd.lognormvariate(3.5, 0.9), 2) if rnd.random() < 0.9 else round(rnd.uniform(50, 2000), 2)
+            f.write(f"<STMTTRN><TRNTYPE>OTHER<DTPOSTED>{dia}<TRNAMT>{valor:.2f}<FITID>T{i}"
+                    f"<NAME>{rnd.choice(LOJAS)}</STMTTRN>\n")
+        f.write("</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n")
+
+
+def pico_kb(fn, *args) -> float:
+    """Pico de memória Python (KB) alocada durante fn(*args), acima do que já existia."""
+    QThreadPool.globalInstance().waitForDone()  # tarefa de fundo pendente não entra na conta
+    gc.collect()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    fn(*args)
+    QThreadPool.globalInstance().waitForDone()
+    return (tracemalloc.get_traced_memory()[1] - base) / 1024
+
+
+@pytest.fixture(scope="module")
+def picos(tmp_path_factory):
+    """{caminho: {anos de histórico: KB}}, medido uma vez para o módulo todo."""
+    pasta = tmp_path_factory.mktemp("memoria")
+    app = QApplication.instance() or QApplication(["virtum_finance"])
+    ultimo = date.today().year - 1
+    medidos = {nome: {} for nome in ORCAMENTO_KB}
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("VIRTUM_DADOS", str(pasta))
+        mp.setattr(vf, "DB_PATH", vf.DB_PATH)
+        mp.setattr(vf, "_perfil_ativo", vf._perfil_ativo)
+        os.makedirs(vf.pasta_perfis(), exist_ok=True)
+        tracemalloc.start()
+        try:
+            for n in ANOS:
+                slug = f"teste-{n}"
+                caminho = vf.caminho_perfil(slug)
+                criar_banco_teste(caminho, linhas=n * LINHAS_ANO, anos=(ultimo - n + 1, ultimo))
+                vf.ativar_perfil(slug)
+                vf.salvar_confirmar_fechamento(False)  # meses do ano corrente fecham sem modal
+                vf.obter_classificador()
+                extrato = str(pasta / f"{slug}.ofx")
+                extrato_teste(extrato, n * OFX_ANO, ultimo)
+
+                w = vf.MainWindow()
+                w.mes_dash = w.mes_comp = f"{ultimo}-12"
+                w.ano_cal = ultimo
+
+                def atualizar_tela():
+                    # mês fora do cache e as páginas que só consultam quando visíveis
+                    w.cache_meses.invalidar()
+                    for pagina in (w.page_comp, w.page_cal, w.page_dash):
+                        w.stack.setCurrentWidget(pagina)
+                        w.refresh_all()
+
+                atualizar_tela()  # aquece o classificador, fontes e estilos do Qt
+                medidos["atualizar tela"][n] = pico_kb(atualizar_tela)
+                w.monitor.fechar()
+                w.close()
+                w.deleteLater()
+                app.processEvents()
+
+                conn = vf.conectar_leitura(caminho)
+                chave = vf.chave_relatorio(conn.cursor(), ultimo, slug)
+                conn.close()
+                vf.gerar_relatorio_ano(caminho, slug, ultimo, chave, vf.HAS_XLSX)
+                medidos["relatório anual"][n] = pico_kb(vf.gerar_relatorio_ano, caminho, slug, ultimo, chave, vf.HAS_XLSX)
+                vf.fazer_backup(manter=1, pausa=0)
+                medidos["backup"][n] = pico_kb(vf.fazer_backup, 1, 256, 0)
+                medidos["importar extrato"][n] = pico_kb(vf.importar_extrato, extrato)
+        finally:
+            QThreadPool.globalInstance().waitForDone()
+            tracemalloc.stop()
+    return medidos
+
+
+@pytest.mark.parametrize("caminho", list(ORCAMENTO_KB))
+def test_pico_dentro_do_orcamento(picos, caminho):
+    orcamento = ORCAMENTO_KB[caminho]
+    acima = {n: round(kb) for n, kb in picos[caminho].items() if kb > orcamento}
+    assert not acima, f"pico acima de {orcamento} KB: {acima}"
+
+
+@pytest.mark.parametrize("caminho", list(ORCAMENTO_KB))
+def test_pico_nao_cresce_com_historico(picos, caminho):
+    menor, maior = picos[caminho][min(ANOS)], picos[caminho][max(ANOS)]
+    assert maior <= menor * FOLGA + FOLGA_KB, \
+        f"{menor:.0f} KB com {min(ANOS)} ano(s), {maior:.0f} KB com {max(ANOS)}"
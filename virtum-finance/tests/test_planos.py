@@ -0,0 +1,126 @@
+"""
+Para cada consulta de CONSULTAS, num banco grande de teste: EXPLAIN QUERY PLAN
+(nenhum SCAN fora dos permitidos) e o melhor de REPETICOES execuções contra o orçamento.
+"""
+import re
+import sqlite3
+import time
+
+import pytest
+
+from banco_teste import LINHAS, criar_banco_teste
+from virtum_finance import CONSULTAS, anexar_arquivos
+
+REPETICOES = 5
+_RE_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)(?:\w+\.)?(\w+)")
+
+# consulta -> (parâmetros no banco de teste, orçamento em ms, tabelas/apelidos que podem ser varridos)
+# Só tabelas pequenas podem aparecer como SCAN; gastos, receitas e ocorrências nunca.
+PLANOS = {
+    "saldo_mes": (("2021-06",), 1, ()),
+    "versao_mes": (("2021-06",), 1, ()),
+    "gastos_mes": (("2021-06-01", "2021-07-01"), 15, ()),
+    "gastos_mes_api": (("2021-06-01", "2021-07-01"), 15, ()),
+    "gastos_por_dia": (("2021-01-01", "2022-01-01"), 40, ()),
+    "gastos_do_dia": (("2021-06-15",), 2, ()),
+    "soma_do_dia": (("2021-06-15",), 1, ()),
+    "gasto_por_id": ((LINHAS // 2,), 1, ()),
+    "classificacao_por_id": ((LINHAS // 2,), 1, ()),
+    "cambio_por_gasto": ((LINHAS // 2,), 1, ()),
+    "taxa_em": (("USD", "2021-06-15"), 1, ()),
+    "taxa_fechada": (("2021-06", "USD", "2021-06-15"), 1, ()),
+    "a_reconverter": (("USD", "2021-01-01"), 30, ("resumo",)),
+    "duplicado_por_impressao": ((123456789, None), 1, ()),
+    "meses_pendentes": (("2026-01", "2026-01"), 5, ("resumo", "saldo_mensal", "seq", "m", "config", "fechamentos_apagados")),
+    "receitas_mes": (("2021-06-01", "2021-07-01"), 2, ()),
+    "anomalias_mes": (("2021-06-01", "2021-07-01"), 10, ("a",)),
+    "orcamentos_mes": (("2021-06",), 2, ("o",)),
+    "orcamento_categoria": (("2021-06-10", "Alimentação"), 1, ()),
+    "ocorrencias_periodo": (("2021-06-01", "2021-06-30"), 2, ("f",)),
+    "anexos_por_gasto": ((LINHAS // 2,), 1, ()),
+    "divisoes_por_gasto": ((LINHAS // 2,), 1, ()),
+    "tags_por_gasto": ((LINHAS // 2,), 1, ()),
+    "totais_tags": (("2021-06-01", "2021-07-01"), 5, ("t",)),
+    "anos_arquivaveis": (("2026-01",), 30, ("anos",)),
+    "anos_arquivados": ((), 1, ("arquivos",)),
+    "ano_arquivado": ((2021,), 1, ()),
+    "config_salario": ((), 1, ()),
+    "config_tema": ((), 1, ()),
+    "config_confirmar_fechamento": ((), 1, ()),
+    "saldo_mes_api": (("2021-06",), 1, ()),
+    "acumulado_ate": (("2021-06",), 1, ()),
+    "resumo_mes": (("2021-06",), 1, ()),
+    "total_fechamentos": ((), 1, ("resumo",)),
+    "fechamentos_recentes": ((-1,), 2, ("resumo",)),
+    "fechamentos_grafico": ((), 2, ("resumo",)),
+    "saldo_consolidado": (("main", "2021-06", "2021-06"), 1, ()),
+    "comparativo_mensal": ((12,), 5, ("saldo_mensal",)),
+    "comparativo_categorias": (("2020-06", "2021-06", "2021-06"), 3, ()),
+    "anos_com_saldo": ((), 1, ("saldo_mensal",)),
+    "saldo_mensal_periodo": (("2021-01", "2022-01"), 1, ()),
+    "categoria_mensal_periodo": (("2021-01", "2022-01"), 1, ()),
+    "categorias_periodo": (("2021-01", "2022-01"), 1, ()),
+    "series_mensais": (("2026-01", "2026-01"), 20, ("f", "fx")),
+    "fixos_lista": ((), 1, ("fixos",)),
+    "fixos_api": ((), 1, ("fixos",)),
+    "fixo_ativo": ((1,), 1, ()),
+    "fixos_valores": ((), 1, ("fixos",)),
+    "fixos_a_expandir": (("2026-12-31",), 1, ("fixos",)),
+    "duplicados_pendentes": ((), 3, ("d",)),
+    "contar_duplicados": ((), 1, ("d",)),
+    "sem_impressao": ((500,), 3, ()),
+    "primeiro_com_impressao": ((123456789, LINHAS // 2), 1, ()),
+    "maior_id_gastos": ((), 1, ()),
+    "maior_id_receitas": ((), 1, ()),
+    "importado_por_impressao": ((123456789, LINHAS), 1, ()),
+    "gasto_por_fitid": (("T1",), 1, ()),
+    "receita_importada": (("2021-06-01", 100.0, "extra", LINHAS), 1, ()),
+    "valor_data_por_id": ((LINHAS // 2,), 1, ()),
+    "total_divisoes": ((LINHAS // 2,), 1, ()),
+    "partes_gasto": ((LINHAS // 2, LINHAS // 2), 1, ()),
+    "estatisticas_categoria": (("Alimentação",), 1, ()),
+    "orcamentos": ((), 1, ("orcamentos",)),
+    "anexo_por_hash": (("0" * 64,), 1, ()),
+    "moedas_com_cotacao": ((), 1, ("m",)),
+    "ultimas_manutencoes": ((), 1, ("manutencao_log",)),
+}
+
+
+def sql(nome: str) -> str:
+    """A consulta como o app roda; as de banco anexado ({banco}) vão contra o principal."""
+    return CONSULTAS[nome].format(banco="main") if "{banco}" in CONSULTAS[nome] else CONSULTAS[nome]
+
+
+@pytest.fixture(scope="module")
+def cur(tmp_path_factory):
+    caminho = str(tmp_path_factory.mktemp("planos") / "planos.db")
+    criar_banco_teste(caminho)
+    conn = sqlite3.connect(caminho)
+    cursor = conn.cursor()
+    anexar_arquivos(cursor, [])  # cria a view gastos_historico
+    yield cursor
+    conn.close()
+
+
+def test_toda_consulta_tem_plano():
+    assert sorted(set(CONSULTAS) - set(PLANOS)) == []
+    assert sorted(set(PLANOS) - set(CONSULTAS)) == []
+
+
+@pytest.mark.parametrize("nome", sorted(set(CONSULTAS) & set(PLANOS)))
+def test_plano_sem_varredura(cur, nome):
+    params, _, varre = PLANOS[nome]
+    plano = [r[3] for r in cur.execute("EXPLAIN QUERY PLAN " + sql(nome), params)]
+    varreduras = [p for p in plano if (m := _RE_SCAN.match(p)) and m.group(1) not in varre]
+    assert not varreduras, "\n".join(plano)
+
+
+@pytest.mark.parametrize("nome", sorted(set(CONSULTAS) & set(PLANOS)))
+def test_tempo_no_orcamento(cur, nome):
+    params, orcamento, _ = PLANOS[nome]
+    melhor = float("inf")
+    for _ in range(REPETICOES):
+        inicio = time.perf_counter()
+        cur.execute(sql(nome), params).fetchall()
+        melhor = min(melhor, (time.perf_counter() - inicio) * 1000)
+    assert melhor <= orcamento, f"{melhor:.2f} ms > orçamento de {orcamento} ms"